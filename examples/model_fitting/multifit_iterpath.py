@@ -0,0 +1,56 @@
+"""Compares the iteration paths, the warm starts and the pyramid strategy
+of multifit on a synthetic map of Gaussians whose centre varies smoothly.
+
+For each option it prints the time, the number of function evaluations
+per spectrum of the map and the fraction of diverged fits.
+
+"""
+
+import time
+
+import numpy as np
+
+# Generate the data: a 32x32 map of Gaussians with smoothly varying 
+# centre and some poissonian noise
+shape = (32, 32)
+x = np.arange(512.)
+iy, ix = np.indices(shape)
+centres = 128 + 256. * ix / shape[1] + 32 * np.sin(iy / 5.)
+data = 100 * np.exp(-(x - centres[..., np.newaxis]) ** 2 / (2 * 8. ** 2))
+s = signals.Spectrum({'data' : np.random.poisson(data).astype('float')})
+
+for iterpath, warm_start, strategy in (
+        ('flyback', None, 'pixelwise'),
+        ('serpentine', None, 'pixelwise'),
+        ('hilbert', None, 'pixelwise'),
+        ('spiral', None, 'pixelwise'),
+        ('serpentine', 'mean', 'pixelwise'),
+        ('hilbert', 'median', 'pixelwise'),
+        ('flyback', None, 'pyramid'),
+        ('serpentine', None, 'pyramid')):
+    m = create_model(s)
+    g = components.Gaussian()
+    m.append(g)
+    # First guess from the maximum of the first spectrum of the path
+    first = tuple([size // 2 for size in shape]) if iterpath == 'spiral' \
+        else (0, 0)
+    g.centre.value = x[s.data[first].argmax()]
+    g.sigma.value = 8
+    g.A.value = s.data[first].max() * g.sigma.value * np.sqrt(2 * np.pi)
+
+    # Count the function evaluations of each fit
+    nfev = []
+    fit = m.fit
+    def counting_fit(**kwargs):
+        fit(**kwargs)
+        nfev.append(m.fit_output[2]['nfev'])
+    m.fit = counting_fit
+
+    t0 = time.time()
+    m.multifit(fitter='leastsq', iterpath=iterpath, warm_start=warm_start,
+               strategy=strategy)
+    diverged = np.abs(g.centre.map['values'] - centres) > 8
+    # The nfev of the coarse levels of the pyramid are included
+    print("%-10s %-6s %-9s time: %5.2f s  nfev: %5.1f  diverged: %4.1f %%" % 
+          (iterpath, warm_start, strategy, time.time() - t0, 
+           np.sum(nfev) / float(np.prod(shape)), 100. * diverged.mean()))
@@ -17,6 +17,7 @@
 # along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+from contextlib import contextmanager
 
 import numpy as np
 
@@ -27,6 +28,99 @@ from hyperspy.misc.utils import (incremental_filename,
 from hyperspy.exceptions import NavigationDimensionError
 
 
+class NotificationBatch(object):
+    """Defer the functions connected to parameters and components.
+
+    While a batch is active the functions connected to the objects in
+    the batch are not called when their value changes. Instead they are
+    queued, and each of them is called once when the batch is flushed.
+    Use `batch_notifications` to create batches.
+
+    """
+    def __init__(self):
+        # List of [function, owners] in the order in which they were
+        # queued. A list is used because bound methods of unhashable
+        # objects, e.g. Model, cannot be dictionary keys.
+        self.pending = []
+
+    def add(self, f, owner=None):
+        """Queue the function f connected to owner."""
+        for pending_f, owners in self.pending:
+            if pending_f == f:
+                break
+        else:
+            owners = []
+            self.pending.append([f, owners])
+        if owner is not None and owner not in owners:
+            owners.append(owner)
+
+    def flush(self):
+        """Call each queued function once, in the order in which they
+        were queued. As when the notifications are not batched, a
+        function that raises an exception is disconnected.
+
+        """
+        while self.pending:
+            f, owners = self.pending.pop(0)
+            try:
+                f()
+            except:
+                for owner in owners:
+                    owner.disconnect(f)
+
+
+@contextmanager
+def batch_notifications(objects):
+    """Context manager that batches the notifications of the given
+    parameters and components. See `NotificationBatch`.
+
+    Batches can be nested. A nested batch passes the functions that it
+    queued to the enclosing batches, so they are only called once, when
+    the outermost batch ends.
+
+    Yields
+    ------
+    NotificationBatch instance
+
+    """
+    objects = list(objects)
+    batch = NotificationBatch()
+    previous_batches = [obj._notification_batch for obj in objects]
+    for obj in objects:
+        obj._notification_batch = batch
+    try:
+        yield batch
+    finally:
+        for obj, previous_batch in zip(objects, previous_batches):
+            obj._notification_batch = previous_batch
+        enclosing = dict((id(obj), previous_batch) for obj, previous_batch
+                         in zip(objects, previous_batches)
+                         if previous_batch is not None)
+        pending = []
+        for f, owners in batch.pending:
+            batches = [enclosing[id(owner)] for owner in owners
+                       if id(owner) in enclosing]
+            if not batches:
+                pending.append([f, owners])
+                continue
+            for owner in owners:
+                enclosing.get(id(owner), batches[0]).add(f, owner)
+        batch.pending = pending
+        batch.flush()
+
+
+def _notify(obj):
+    """Call or, if in a batch, queue the functions connected to obj."""
+    for f in list(obj.connected_functions):
+        if obj._notification_batch is not None:
+            obj._notification_batch.add(f, obj)
+        else:
+            try:
+                f()
+            except:
+                obj.disconnect(f)
+
+
 class Parameter(object):
     """Model parameter
     
@@ -80,6 +174,10 @@ class Parameter(object):
     _axes_manager = None
     __ext_bounded = False
     __ext_force_positive = False
+    # (vector, index) when the value is stored in the free parameters
+    # vector of a model during fitting. See Model._set_p0
+    _vector = None
+    _notification_batch = None
 
     def __init__(self):
         self._twins = set()
@@ -120,6 +218,8 @@ class Parameter(object):
             
     def _getvalue(self):
         if self.twin is None:
+            if self._vector is not None:
+                return self._get_value_from_vector()
             return self.__value
         else:
             return self.twin_function(self.twin.value)
@@ -137,7 +237,8 @@ class Parameter(object):
             raise ValueError(
                     "The lenght of the parameter must be ", 
                     self._number_of_elements)
-        old_value = self.__value
+        old_value = (self._get_value_from_vector() 
+                     if self._vector is not None else self.__value)
                         
         if self.twin is not None:
             if self.twin_inverse_function is not None:
@@ -166,13 +267,36 @@ class Parameter(object):
         if (self._number_of_elements != 1 and 
             not isinstance(self.__value, tuple)):
                 self.__value = tuple(self.__value)
+        if self._vector is not None:
+            vector, index = self._vector
+            vector[index:index + self._number_of_elements] = self.__value
         if old_value != self.__value:
-            for f in self.connected_functions:
-                try:
-                    f()
-                except:
-                    self.disconnect(f)
+            _notify(self)
     value = property(_getvalue, _setvalue)
+
+    def _get_value_from_vector(self):
+        vector, index = self._vector
+        if self._number_of_elements == 1:
+            return vector[index]
+        else:
+            return tuple(vector[index:index + self._number_of_elements])
+
+    def _bind_to_vector(self, vector, index):
+        """Store the value in `vector` starting at `index`.
+
+        While bound, reading and setting the value reads and writes the
+        vector, so the value can be set without calling the setter by
+        writing to the vector directly.
+
+        """
+        value = self.value
+        self._vector = (vector, index)
+        vector[index:index + self._number_of_elements] = value
+
+    def _unbind_from_vector(self):
+        if self._vector is not None:
+            self.__value = self._get_value_from_vector()
+            self._vector = None
     
     # Fix the parameter when coupled
     def _getfree(self):
@@ -253,6 +377,7 @@ class Parameter(object):
         if arg <= 1:
             raise ValueError("Please provide an integer number equal "
                              "or greater to 1")
+        self._unbind_from_vector()
         self._bounds = ((self.bmin, self.bmax),) * arg
         self.__number_of_elements = arg
 
@@ -432,6 +557,7 @@ class Parameter(object):
                     
 class Component(object):
     __axes_manager = None
+    _notification_batch = None
     def __init__(self, parameter_name_list):
         self.connected_functions = list()
         self.parameters = []
@@ -466,13 +592,23 @@ class Component(object):
         return self.__active
     def _set_active(self, arg):
         self.__active = arg
-        for f in self.connected_functions:
-            try:
-                f()
-            except:
-                self.disconnect(f)
+        _notify(self)
     active = property(_get_active, _set_active)
 
+    def batch_notifications(self):
+        """Context manager that defers the functions connected to the
+        component and its parameters until it ends, calling each of
+        them only once.
+
+        Examples
+        --------
+        >>> with g.batch_notifications():
+        ...     g.A.value = 2
+        ...     g.centre.value = 3
+
+        """
+        return batch_notifications([self] + list(self.parameters))
+
     def init_parameters(self, parameter_name_list):
         for name in parameter_name_list:
             parameter = Parameter()
@@ -527,14 +663,16 @@ class Component(object):
         else:
             parameters = self.parameters
         i=0
-        for parameter in parameters:
-            lenght = parameter._number_of_elements
-            parameter.value = (p[i] if lenght == 1 else p[i:i + lenght])
-            if p_std is not None:
-                parameter.std = (p_std[i] if lenght == 1 else 
-                tuple(p_std[i:i+lenght]))
-            
-            i += lenght           
+        with self.batch_notifications():
+            for parameter in parameters:
+                lenght = parameter._number_of_elements
+                parameter.value = (p[i] if lenght == 1 
+                                   else p[i:i + lenght])
+                if p_std is not None:
+                    parameter.std = (p_std[i] if lenght == 1 else 
+                    tuple(p_std[i:i+lenght]))
+                
+                i += lenght           
                 
     def _create_arrays(self):
         for parameter in self.parameters:
@@ -29,7 +29,6 @@ from hyperspy import drawing
 from hyperspy.misc.interactive_ns import interactive_ns
 from hyperspy.exceptions import SignalOutputDimensionError
 from hyperspy.gui import messages
-from hyperspy.misc.progressbar import progressbar
 from hyperspy.misc.tv_denoise import _tv_denoise_1d
 from hyperspy.drawing.utils import does_figure_object_exists
 from hyperspy.gui.mpl_traits_editor import MPLFigureEditor
@@ -399,33 +398,28 @@ class Smoothing(t.HasTraits):
             self.smooth_diff_line.set_properties()
         self.update_lines()
             
+    def model2plot(self, axes_manager = None):
+        return self.function(self.signal())
+            
     def diff_model2plot(self, axes_manager = None):
-        smoothed = np.diff(self.model2plot(axes_manager),
-            self.differential_order)
-        return smoothed
+        return self.diff_function(self.signal())
+        
+    def diff_function(self, data):
+        return np.diff(self.function(data), self.differential_order)
         
     def apply(self):
         self.signal._plot.auto_update_plot = False
-        maxval = self.signal.axes_manager.navigation_size
-        if maxval > 0:
-            pbar=progressbar(
-            maxval=maxval)
-        up_to = None
         if self.differential_order == 0:
-            f = self.model2plot
+            self.signal.map(self.function, inplace=True)
         else:
-            f = self.diff_model2plot
-            if self.crop_diff_axis is True:
-                up_to = -self.differential_order
-        i = 0
-        for spectrum in self.signal:
-            spectrum.data[:] = f()
-            i += 1
-            if maxval > 0:
-                pbar.update(i)
-        if maxval > 0:
-            pbar.finish()
-        if self.differential_order > 0:
+            size = self.signal.axes_manager.signal_axes[0].size
+            if len(self.diff_model2plot()) == size:
+                self.signal.map(self.diff_function, inplace=True)
+            else:
+                # np.diff returns differential_order channels less
+                differentiated = self.signal.map(self.diff_function)
+                self.signal.data[..., :size - self.differential_order] = \
+                    differentiated.data
             self.signal.axes_manager.signal_axes[0].offset = \
                 self.smooth_diff_line.axis[0]
             self.signal.crop_in_pixels(-1,0,-self.differential_order)
@@ -464,13 +458,13 @@ class SmoothingSavitzkyGolay(Smoothing):
     def _differential_order(self, old, new):
         self.update_lines()
         
-    def diff_model2plot(self, axes_manager = None):
-        smoothed = utils.sg(self.signal(), self.number_of_points, 
+    def diff_function(self, data):
+        smoothed = utils.sg(data, self.number_of_points, 
                             self.polynomial_order, self.differential_order)
         return smoothed
                                         
-    def model2plot(self, axes_manager = None):
-        smoothed = utils.sg(self.signal(), self.number_of_points, 
+    def function(self, data):
+        smoothed = utils.sg(data, self.number_of_points, 
                             self.polynomial_order, 0)
         return smoothed
             
@@ -495,8 +489,8 @@ class SmoothingLowess(Smoothing):
     def _number_of_iterations_changed(self, old, new):
         self.update_lines()
             
-    def model2plot(self, axes_manager = None):
-        smoothed = utils.lowess(self.axis, self.signal(), 
+    def function(self, data):
+        smoothed = utils.lowess(self.axis, data, 
                                 self.smoothing_parameter, 
                                 self.number_of_iterations)
                             
@@ -521,8 +515,8 @@ class SmoothingTV(Smoothing):
     def _number_of_iterations_changed(self, old, new):
         self.update_lines()
             
-    def model2plot(self, axes_manager = None):
-        smoothed = _tv_denoise_1d(self.signal(), 
+    def function(self, data):
+        smoothed = _tv_denoise_1d(data, 
                                 weight = self.smoothing_parameter,)
         return smoothed
         
@@ -550,10 +544,10 @@ class ButterworthFilter(Smoothing):
     def _order_changed(self, old, new):
         self.update_lines()
             
-    def model2plot(self, axes_manager = None):
+    def function(self, data):
         b, a = sp.signal.butter(self.order, self.cutoff_frequency_ratio,
                                 self.type)
-        smoothed = sp.signal.filtfilt(b, a, self.signal())
+        smoothed = sp.signal.filtfilt(b, a, data)
         return smoothed
 
         
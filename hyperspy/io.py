@@ -18,22 +18,25 @@
 
 import os
 import glob
+import copy
 import tempfile
 import os.path as path
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
 from hyperspy import messages
 import hyperspy.defaults_parser
 from hyperspy.io_plugins import (msa, digital_micrograph, fei, mrc,
-    ripple, tiff)
+    ripple, tiff, hsr)
 from hyperspy.gui.tools import Load
 from hyperspy.misc.utils import (ensure_directory, DictionaryBrowser, 
     strlist2enumeration)
 from hyperspy.misc.natsort import natsorted
+from hyperspy.misc import progressbar
 import hyperspy.misc.utils_varia
 
-io_plugins = [msa, digital_micrograph, fei, mrc, ripple, tiff]
+io_plugins = [msa, digital_micrograph, fei, mrc, ripple, tiff, hsr]
 
 #try:
 #    from hyperspy.io_plugins import fits
@@ -71,7 +74,8 @@ for plugin in io_plugins:
             plugin.file_extensions[plugin.default_extension])
 
 def load(filenames=None, record_by=None, signal_type=None, 
-         stack=False, mmap=False, mmap_dir=None, **kwds):
+         stack=False, mmap=False, mmap_dir=None, parallel=False,
+         max_workers=None, stack_metadata='first', **kwds):
     """
     Load potentially multiple supported file into an hyperspy structure
     Supported formats: HDF5, msa, Gatan dm3, Ripple (rpl+raw)
@@ -120,6 +124,26 @@ def load(filenames=None, record_by=None, signal_type=None,
         If mmap_dir is not None, and stack and mmap are True, the memory
         mapped file will be created in the given directory,
         otherwise the default directory is used.
+    parallel : bool
+        If True and multiple filenames are passed in, the files are
+        read concurrently by a pool of threads. When stacking, each
+        thread copies the data of its file directly into the stack.
+        Default is False.
+    max_workers : {None, int}
+        The number of threads. If None, the number of CPUs is used.
+    stack_metadata : {'first', 'all'}
+        If 'first' (default) and stack is True, the full original
+        parameters of the first file are stored as the original
+        parameters of the stack and, for each of the other files,
+        only its file name and the mapped parameters that differ from
+        the ones of the first file are stored in
+        `original_parameters.stack_elements`. For the formats that can
+        read the data alone (MSA) the parameters of the other files
+        are not parsed and only their file name is stored. If 'all', 
+        the original
+        parameters of every file are also stored; identical
+        parameters are only stored once and the following files
+        refer to the first stack element that has them.
         
     Returns
     -------
@@ -143,6 +167,10 @@ def load(filenames=None, record_by=None, signal_type=None,
     
     >>>d = load('file*.dm3')
 
+    Stacking a time series of files using 4 threads:
+
+    >>> d = load('frame*.dm3', stack=True, max_workers=4)
+
     """
     
     kwds['record_by'] = record_by
@@ -173,69 +201,30 @@ def load(filenames=None, record_by=None, signal_type=None,
         if len(filenames) > 1:
             messages.information('Loading individual files')
         if stack is True:
-            original_shape = None
-            for i, filename in enumerate(filenames):
-                obj = load_single_file(filename, output_level=0,
-                    signal_type=signal_type, **kwds)
-                if original_shape is None:
-                    original_shape = obj.data.shape
-                    record_by = obj.mapped_parameters.record_by
-                    stack_shape = tuple([len(filenames),]) + original_shape
-                    tempf = None
-                    if mmap is False:
-                        data = np.empty(stack_shape,
-                                           dtype=obj.data.dtype)
-                    else:
-                        #filename = os.path.join(tempfile.mkdtemp(),
-                                             #'newfile.dat')
-                        tempf = tempfile.NamedTemporaryFile(
-                                                        dir=mmap_dir)
-                        data = np.memmap(tempf,
-                                         dtype=obj.data.dtype,
-                                         mode = 'w+',
-                                         shape=stack_shape,)
-                    signal = type(obj)(
-                        {'data' : data})
-                    # Store the temporary file in the signal class to
-                    # avoid its deletion when garbage collecting
-                    if tempf is not None:
-                        signal._data_temporary_file = tempf
-                    signal.axes_manager.axes[1:] = obj.axes_manager.axes
-                    signal.axes_manager._set_axes_index_in_array_from_position()
-                    eaxis = signal.axes_manager.axes[0]
-                    eaxis.name = 'stack_element'
-                    eaxis.navigate = True
-                    signal.mapped_parameters = obj.mapped_parameters
-                    # Get the title from the folder name
-                    signal.mapped_parameters.title = \
-                    os.path.split(
-                        os.path.split(
-                            os.path.abspath(filenames[0])
-                                     )[0]
-                                  )[1]
-                    signal.original_parameters = DictionaryBrowser({})
-                    signal.original_parameters.add_node('stack_elements')
-                if obj.data.shape != original_shape:
-                    raise IOError(
-                "Only files with data of the same shape can be stacked")
-                
-                signal.data[i,...] = obj.data
-                signal.original_parameters.stack_elements.add_node(
-                    'element%i' % i)
-                node = signal.original_parameters.stack_elements[
-                    'element%i' % i]
-                node.original_parameters = \
-                    obj.original_parameters.as_dictionary()
-                node.mapped_parameters = \
-                    obj.mapped_parameters.as_dictionary()
-                del obj
+            signal = _load_stack(filenames, signal_type=signal_type,
+                                 mmap=mmap, mmap_dir=mmap_dir,
+                                 parallel=parallel,
+                                 max_workers=max_workers,
+                                 stack_metadata=stack_metadata, **kwds)
             messages.information('Individual files loaded correctly')
             signal.print_summary()
             objects = [signal,]
         else:
-            objects=[load_single_file(filename, output_level=0,
-                     signal_type=signal_type, **kwds) 
-                for filename in filenames]
+            if parallel is True and len(filenames) > 1:
+                pool = ThreadPool(max_workers)
+                try:
+                    objects = pool.map(
+                        lambda filename: load_single_file(
+                            filename, output_level=0,
+                            signal_type=signal_type, **kwds),
+                        filenames)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                objects=[load_single_file(filename, output_level=0,
+                         signal_type=signal_type, **kwds) 
+                    for filename in filenames]
             
         if hyperspy.defaults_parser.preferences.General.plot_on_load:
             for obj in objects:
@@ -245,6 +234,156 @@ def load(filenames=None, record_by=None, signal_type=None,
     return objects
 
 
+def _values_are_equal(value1, value2):
+    try:
+        equal = value1 == value2
+        if isinstance(equal, np.ndarray):
+            return np.array_equal(value1, value2)
+        return bool(equal)
+    except ValueError:
+        return False
+
+def _get_dictionary_difference(dictionary, reference):
+    """Return a dictionary with the items of `dictionary` that are not
+    in `reference` or that have a different value.
+
+    """
+    difference = {}
+    for key, value in dictionary.iteritems():
+        if key not in reference:
+            difference[key] = value
+        elif isinstance(value, dict) and isinstance(reference[key], dict):
+            subdifference = _get_dictionary_difference(value,
+                                                       reference[key])
+            if subdifference:
+                difference[key] = subdifference
+        elif not _values_are_equal(value, reference[key]):
+            difference[key] = value
+    return difference
+
+def _load_stack(filenames, signal_type=None, mmap=False, mmap_dir=None,
+                parallel=False, max_workers=None, stack_metadata='first',
+                **kwds):
+    """Load the files and stack them along a new navigation axis.
+
+    See `load` for the description of the parameters.
+
+    """
+    if stack_metadata not in ('first', 'all'):
+        raise ValueError(
+            "stack_metadata must be 'first' or 'all', not %s" %
+            str(stack_metadata))
+    # The first file determines the shape, dtype and class of the stack
+    obj = load_single_file(filenames[0], output_level=0,
+                           signal_type=signal_type, **kwds)
+    original_shape = obj.data.shape
+    stack_shape = tuple([len(filenames),]) + original_shape
+    tempf = None
+    if mmap is False:
+        data = np.empty(stack_shape, dtype=obj.data.dtype)
+    else:
+        tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+        data = np.memmap(tempf,
+                         dtype=obj.data.dtype,
+                         mode = 'w+',
+                         shape=stack_shape,)
+    data[0, ...] = obj.data
+    signal = type(obj)({'data' : data})
+    # Store the temporary file in the signal class to
+    # avoid its deletion when garbage collecting
+    if tempf is not None:
+        signal._data_temporary_file = tempf
+    signal.axes_manager.axes[1:] = obj.axes_manager.axes
+    signal.axes_manager._set_axes_index_in_array_from_position()
+    eaxis = signal.axes_manager.axes[0]
+    eaxis.name = 'stack_element'
+    eaxis.navigate = True
+    # The mapped parameters of the other files are compared with the
+    # ones of the first file before its title is replaced
+    first_mapped_parameters = obj.mapped_parameters.as_dictionary()
+    signal.mapped_parameters = obj.mapped_parameters
+    # Get the title from the folder name
+    signal.mapped_parameters.title = os.path.split(
+        os.path.split(os.path.abspath(filenames[0]))[0])[1]
+    first_original_parameters = obj.original_parameters.as_dictionary()
+    signal.original_parameters = DictionaryBrowser(
+        first_original_parameters)
+    del obj
+    # If all the files are read by a plugin that can read the data alone
+    # the parameters are only parsed for the first file
+    readers = set([_get_reader(filename) for filename in filenames])
+    data_reader = None
+    if stack_metadata == 'first' and len(readers) == 1:
+        data_reader = getattr(readers.pop(), 'file_data_reader', None)
+
+    def read_element(i):
+        if data_reader is not None:
+            element_data = data_reader(filenames[i], **kwds)
+            if element_data.shape != original_shape:
+                raise IOError(
+                    "Only files with data of the same shape can be stacked")
+            data[i, ...] = element_data
+            return i, {}, None
+        obj = load_single_file(filenames[i], output_level=0,
+                               signal_type=signal_type, **kwds)
+        if obj.data.shape != original_shape:
+            raise IOError(
+                "Only files with data of the same shape can be stacked")
+        # The copy is done in the thread to read and copy concurrently
+        data[i, ...] = obj.data
+        mapped_parameters = _get_dictionary_difference(
+            obj.mapped_parameters.as_dictionary(),
+            first_mapped_parameters)
+        if stack_metadata == 'all':
+            original_parameters = obj.original_parameters.as_dictionary()
+        else:
+            original_parameters = None
+        return i, mapped_parameters, original_parameters
+
+    elements = [(0, {}, first_original_parameters if
+                 stack_metadata == 'all' else None)]
+    pbar = progressbar.progressbar(maxval=len(filenames))
+    pbar.update(1)
+    if parallel is True and len(filenames) > 2:
+        pool = ThreadPool(max_workers)
+        try:
+            for element in pool.imap(read_element,
+                                     xrange(1, len(filenames))):
+                elements.append(element)
+                pbar.update(len(elements))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for i in xrange(1, len(filenames)):
+            elements.append(read_element(i))
+            pbar.update(len(elements))
+    pbar.finish()
+
+    signal.original_parameters.add_node('stack_elements')
+    stack_elements = signal.original_parameters.stack_elements
+    unique_original_parameters = []
+    for i, mapped_parameters, original_parameters in elements:
+        node_name = 'element%i' % i
+        stack_elements.add_node(node_name)
+        node = stack_elements[node_name]
+        node.original_filename = os.path.split(filenames[i])[1]
+        if mapped_parameters:
+            node.mapped_parameters = mapped_parameters
+        if original_parameters is not None:
+            for j, unique in unique_original_parameters:
+                if not _get_dictionary_difference(original_parameters,
+                                                  unique) and \
+                    not _get_dictionary_difference(unique,
+                                                   original_parameters):
+                    node.original_parameters_as_in = 'element%i' % j
+                    break
+            else:
+                unique_original_parameters.append(
+                    (i, original_parameters))
+                node.original_parameters = original_parameters
+    return signal
+
 def load_single_file(filename, record_by=None, output_level=2, 
     signal_type=None, **kwds):
     """
@@ -334,6 +473,185 @@ def load_with_reader(filename, reader, record_by=None,
         messages.information('%s correctly loaded' % filename)
     return objects
 
+# Cache of the records returned by scan, keyed by the absolute path of
+# the file. Each item is a (mtime, size, records) tuple.
+_scan_cache = {}
+
+def _get_reader(filename):
+    """Return the io plugin that reads the file or None if the extension
+    is not supported.
+
+    """
+    extension = os.path.splitext(filename)[1][1:].lower()
+    for plugin in io_plugins:
+        if extension in [ext.lower() for ext in plugin.file_extensions]:
+            return plugin
+    return None
+
+def _file_data_dict2record(file_data_dict, filename, reader, index,
+                           record_by=None):
+    """Convert a dictionary as returned by the file readers into a scan
+    record without keeping any reference to the data.
+
+    """
+    mapped_parameters = file_data_dict['mapped_parameters']
+    if record_by is not None:
+        mapped_parameters['record_by'] = record_by
+    record = {
+        'filename' : filename,
+        'index' : index,
+        'format' : reader.format_name,
+        'axes' : file_data_dict['axes'],
+        'mapped_parameters' : mapped_parameters,
+        'record_by' : mapped_parameters.get('record_by'),
+        'signal_type' : mapped_parameters.get('signal_type', ''),
+        'title' : mapped_parameters.get('title', ''),
+        'data_offset' : file_data_dict.get('data_offset'),
+        'data_size' : file_data_dict.get('data_size'),
+        }
+    if 'data' in file_data_dict:
+        data = file_data_dict['data']
+        record['shape'] = data.shape
+        record['dtype'] = data.dtype
+        if isinstance(data, np.memmap):
+            # The offset of the mapping is the position of the data
+            # in the file
+            record['data_offset'] = data.offset
+            record['data_size'] = data.nbytes
+    else:
+        record['shape'] = tuple(file_data_dict['shape'])
+        record['dtype'] = np.dtype(file_data_dict['dtype'])
+    return record
+
+def scan_single_file(filename, record_by=None, cache=True, **kwds):
+    """Read the metadata of the experiments stored in a file without
+    reading the data.
+
+    See `scan` for the description of the parameters and the records.
+
+    Returns
+    -------
+    list of records, one per experiment in the file.
+
+    """
+    abspath = os.path.abspath(filename)
+    stat = os.stat(abspath)
+    if cache is True and abspath in _scan_cache:
+        mtime, size, records = _scan_cache[abspath]
+        if mtime == stat.st_mtime and size == stat.st_size:
+            return copy.deepcopy(records)
+    reader = _get_reader(filename)
+    if reader is None:
+        raise IOError('File type not supported')
+    # The plugins that cannot read the header only fall back to
+    # reading the full file
+    header_reader = getattr(reader, 'file_header_reader',
+                            reader.file_reader)
+    if header_reader is reader.file_reader:
+        kwds['output_level'] = 0
+    file_data_list = header_reader(filename, record_by=record_by, **kwds)
+    records = [_file_data_dict2record(file_data_dict, filename, reader,
+                                      index, record_by=record_by)
+               for index, file_data_dict in enumerate(file_data_list)]
+    del file_data_list
+    if cache is True:
+        _scan_cache[abspath] = (stat.st_mtime, stat.st_size,
+                                copy.deepcopy(records))
+    return records
+
+def _get_scan_filenames(paths):
+    """Expand the patterns and the directories in `paths`."""
+    if isinstance(paths, basestring):
+        paths = [paths,]
+    filenames = []
+    for path_ in paths:
+        if os.path.isdir(path_):
+            for dirpath, dirnames, files in os.walk(path_):
+                dirnames[:] = natsorted(dirnames)
+                filenames.extend([os.path.join(dirpath, f)
+                                  for f in natsorted(files)
+                                  if _get_reader(f) is not None])
+        elif os.path.isfile(path_):
+            filenames.append(path_)
+        else:
+            filenames.extend(natsorted([f for f in glob.glob(path_)
+                                        if os.path.isfile(f)]))
+    return filenames
+
+def scan(paths, workers=None, record_by=None, cache=True, **kwds):
+    """Read the metadata of multiple files without reading the data.
+
+    The files are read by the header reader of their io plugin, which
+    only parses the information needed to define the shape, type, axes
+    and mapped parameters of the data. The formats that can memory-map
+    the data (DM3, FEI, Ripple, MRC, HSR) or that store it in a
+    dataset (HDF5) also give its position and size in bytes in the
+    file. The formats without a header reader (TIFF, images, NetCDF)
+    are fully read.
+
+    Parameters
+    ----------
+    paths : str or list of str
+        File names, shell-style wildcard patterns and directories. The
+        directories are scanned recursively for files with a supported
+        extension.
+    workers : {None, int}
+        The number of threads that read the files concurrently. If 
+        None, the number of CPUs is used.
+    record_by : {None, 'spectrum', 'image'}
+        If not None, override the record_by defined in the files.
+    cache : bool
+        If True the records are stored in memory and returned without
+        reading the file again in the following scans unless the 
+        modification time or the size of the file have changed.
+
+    Any extra keyword is passed to the header readers.
+
+    Returns
+    -------
+    A list of dictionaries, one per experiment, in file name order with
+    the keys:
+        filename, index : the file and the position of the 
+            experiment in it.
+        format : the name of the file format.
+        shape, dtype : of the data.
+        axes : list of the axes dictionaries.
+        record_by, signal_type, title
+        mapped_parameters : dictionary.
+        data_offset, data_size : position and size in bytes of the 
+            data in the file or None if unknown.
+    When a file cannot be read, its record only contains the `filename`
+    and an `error` message.
+
+    Examples
+    --------
+    >>> records = scan('session/', workers=8)
+    >>> [r['filename'] for r in records if r.get('shape') == (64, 64, 1024)]
+
+    """
+    filenames = _get_scan_filenames(paths)
+
+    def scan_file(filename):
+        try:
+            return scan_single_file(filename, record_by=record_by,
+                                    cache=cache, **kwds)
+        except Exception, e:
+            return [{'filename' : filename, 'error' : str(e)},]
+
+    if workers != 1 and len(filenames) > 1:
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(scan_file, filenames)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [scan_file(filename) for filename in filenames]
+    records = []
+    for file_records in results:
+        records.extend(file_records)
+    return records
+
 def save(filename, signal, overwrite=None, **kwds):
     extension = os.path.splitext(filename)[1][1:]
     if extension == '':
@@ -184,6 +184,7 @@ from __future__ import division
 import os
 import mmap
 import re
+import struct
 from types import StringType
 import numpy as np
 
@@ -191,9 +192,9 @@ from hyperspy.axes import DataAxis
 from hyperspy.misc.utils_readfile import *
 from hyperspy.exceptions import *
 import hyperspy.misc.utils
+from hyperspy.misc.utils import LazyNode
 from hyperspy.misc.utils_varia import overwrite, swapelem
 from hyperspy.misc.utils_varia import DictBrowser, fsdict
-from hyperspy.misc.dm3reader import parseDM3
 
 
 # Plugin characteristics
@@ -218,6 +219,11 @@ orsay_pattern = re.compile('\.spim$')
 # root_pattern = re.compile('^\w{1,}\.')
 image_tags_pattern = re.compile('.*ImageTags\.')
 document_tags_pattern = re.compile('.*DocumentTags\.')
+# The tags read by DM3ImageFile in header_only mode
+header_tag_pattern = re.compile(
+    '\.ImageData\.(Calibrations|ImageTags\.Name$)|'
+    '\.Orsay\.spim\.detectors\.eels\.|'
+    '\.(Format|Signal)$')
 
 ####
 
@@ -237,9 +243,22 @@ def read_infoarray(f):
     """Read the infoarray from file f and return it.
     """
     infoarray_size = read_long(f, 'big')
-    infoarray = [read_long(f, 'big') for index in xrange(infoarray_size)]
-    infoarray = tuple(infoarray)
-    return infoarray
+    return struct.unpack('>%il' % infoarray_size, 
+                         f.read(4 * infoarray_size))
+
+_endian_prefix = {'big' : '>', 'little' : '<'}
+
+def _struct_format(iarray, endian):
+    """Return the struct module format of the struct defined by the 
+    infoarray iarray and the size in bytes of each field.
+    """
+    field_type =  [iarray[i] for i in xrange(4, len(iarray), 2)]
+    for dtype in field_type:
+        if dtype not in _simple_type:
+            raise DM3DataTypeError(dtype)
+    fmt = ''.join([_data_type[dtype][2] for dtype in field_type])
+    field_bytes = [_data_type[dtype][1] for dtype in field_type]
+    return _endian_prefix[endian] + fmt, field_bytes
 
 def _infoarray_databytes(iarray):
     """Read the info array iarray and return the number of bytes
@@ -279,13 +298,7 @@ def read_string(f, iarray, endian):
         if iarray[0] != 18:
             print('File address:', f.tell())
             raise DM3DataTypeError(iarray[0])
-        data = ''
-        if endian == 'little':
-            s = L_char
-        elif endian == 'big':
-            s = B_char
-        for char in xrange(iarray[1]):
-            data += s.unpack(f.read(1))[0]
+        data = f.read(iarray[1])
         #~ if '\x00' in data:      # it's a Unicode string (TagData)
             #~ uenc = 'utf_16_'+endian[0]+'e'
             #~ data = unicode(data, uenc, 'replace')
@@ -316,19 +329,13 @@ def read_struct(f, iarray, endian):
         # n_fields = iarray[2]
         # field_name_length = [iarray[i] for i in xrange(3, len(iarray), 2)]
         # field_name_length always 0?
-        field_type =  [iarray[i] for i in xrange(4, len(iarray), 2)]
-        # field_ctype = [_data_type[iarray[i]][2] for i in xrange(4, len(iarray), 2)]
+        fmt, field_bytes = _struct_format(iarray, endian)
+        address = f.tell()
+        field_value = struct.unpack(fmt, f.read(sum(field_bytes)))
         field_addr = []
-        # field_bytes = [_data_type[i][1] for i in field_type]
-        field_value = []
-        for dtype in field_type:
-            if dtype in _simple_type:
-                field_addr.append(f.tell())
-                read_data = _data_type[dtype][0]
-                data = read_data(f, endian)
-                field_value.append(data)
-            else:
-                raise DM3DataTypeError(dtype)    
+        for nbytes in field_bytes:
+            field_addr.append(address)
+            address += nbytes
         return zip(field_addr, field_value)
     
 def read_array(f, iarray, endian):
@@ -346,17 +353,36 @@ def read_array(f, iarray, endian):
         arraysize = iarray[-1]
         if arraysize == 0:
             return None
-        eltype = _data_type[iarray[1]][0] # same for all elements
         if len(iarray) > 3:  # complex type
             subiarray = iarray[1:-1]
-            data = [eltype(f, subiarray, endian)
-                    for element in xrange(arraysize)]
+            if subiarray[0] == 15: # array of structs
+                # Decode all the structs at once
+                fmt, field_bytes = _struct_format(subiarray, endian)
+                nfields = len(field_bytes)
+                struct_bytes = sum(field_bytes)
+                address = f.tell()
+                values = struct.unpack(
+                    fmt[0] + fmt[1:] * arraysize, 
+                    f.read(struct_bytes * arraysize))
+                offsets = np.cumsum([0,] + field_bytes[:-1])
+                data = [zip((address + i * struct_bytes + offsets).tolist(),
+                            values[i * nfields:(i + 1) * nfields]) 
+                        for i in xrange(arraysize)]
+            else:
+                eltype = _data_type[iarray[1]][0] # same for all elements
+                data = [eltype(f, subiarray, endian)
+                        for element in xrange(arraysize)]
         else: # simple type
-            data = [eltype(f, endian) for element in xrange(arraysize)]
+            dtype = np.dtype(_endian_prefix[endian] + 
+                             _numpy_type[iarray[1]])
+            data = np.frombuffer(f.read(dtype.itemsize * arraysize), 
+                                 dtype=dtype)
             if iarray[1] == 4: # it's actually a string
                 # disregard values that are not characters:
-                data = [chr(i) for i in data if i in xrange(256)]
-                data = reduce(lambda x, y: x + y, data)
+                data = data[data < 256].astype('uint8').tostring()
+            else:
+                # Native byte order
+                data = data.astype(dtype.newbyteorder('='))
         return data
     
 # _data_type dictionary.
@@ -378,9 +404,78 @@ _data_type = {
     20 : (read_array, None, 'array'),  # 0x14
     }
                           
+# numpy data types of the simple types
+_numpy_type = {
+    2 : 'i2',
+    3 : 'i4',
+    4 : 'u2',
+    5 : 'u4',
+    6 : 'f4',
+    7 : 'f8',
+    8 : 'u1',
+    9 : 'i1',
+    10 : 'i1',
+    }
+
 _complex_type = (15, 18, 20)
 _simple_type =  (2, 3, 4, 5, 6, 7, 8, 9, 10)
 
+def iter_tags(dictionary, path=''):
+    """Iterate over the (tag path, value) pairs of the nested 
+    dictionary of tags returned by open_dm3.
+    """
+    for key, item in dictionary.iteritems():
+        tag_path = path + '.' + key if path else key
+        if isinstance(item, dict):
+            for tag in iter_tags(item, tag_path):
+                yield tag
+        else:
+            # item is a (file address, value) tuple
+            yield tag_path, item[1]
+
+def read_indexed_tags(filename, index, endian):
+    """Read the tags of the DM3 file from the index filled by open_dm3.
+
+    Returns a dictionary with the same keys and values as parseDM3: 
+    structs are not stored, arrays of less than 256 unicode characters
+    are read as strings and, for the rest of the arrays, the size and
+    offset of the data are stored instead of the data.
+    
+    As the index contains the file address of the data of every tag,
+    only the data of the tags is read.
+    """
+    tags = {}
+    with open(filename, 'rb') as dm3file:
+        fmap = mmap.mmap(dm3file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for key, (address, iarray) in index.iteritems():
+                fmap.seek(address)
+                if iarray[0] in (9, 10): # chars
+                    value = fmap.read(1)
+                elif iarray[0] in _simple_type:
+                    value = _data_type[iarray[0]][0](fmap, endian)
+                    if iarray[0] == 8:
+                        value = bool(value)
+                elif iarray[0] == 18:
+                    value = fmap.read(iarray[1])
+                elif iarray[0] == 20:
+                    nbytes = _infoarray_databytes(iarray)
+                    if (len(iarray) == 3 and iarray[1] == 4 and 
+                        iarray[2] < 256 and 
+                        not key.endswith('ImageData.Data')):
+                        value = fmap.read(nbytes)
+                    else:
+                        tags[key + '.Size'] = nbytes
+                        tags[key + '.Offset'] = address
+                        continue
+                else: # structs
+                    continue
+                tags[key] = hyperspy.misc.utils.ensure_unicode(value, 
+                                                               'utf16')
+        finally:
+            fmap.close()
+    return tags
+
 def parse_tag_group(f, endian='big'):
     """Parse the root TagGroup of the given DM3 file f.
     Returns the tuple (is_sorted, is_open, n_tags).
@@ -399,20 +494,14 @@ def parse_tag_entry(f, endian='big'):
     tag_id = read_byte(f, endian)
     tag_name_length = read_short(f, endian)
     str_infoarray = (18, tag_name_length)
-    tag_name_arr = read_string(f, str_infoarray, endian)
-    if len(tag_name_arr):
-        tag_name = reduce(lambda x, y: x + y, tag_name_arr)
-    else:
-        tag_name = ''
+    tag_name = read_string(f, str_infoarray, endian)
     return tag_id, tag_name_length, tag_name
 
 def parse_tag_type(f):
     """Parse a tag type of the given DM3 file f.
     Returns the tuple infoArray.
     """
-    str_infoarray = (18, 4)
-    delim = read_string(f, str_infoarray, 'big')
-    delimiter = reduce(lambda x, y: x + y, delim)
+    delimiter = f.read(4)
     if delimiter != '%%%%':
         print('Wrong delimiter: "%s".' % str(delimiter))
         print('File address:', f.tell())
@@ -492,7 +581,8 @@ def parse_header(f, data_dict, endian='big', debug=0):
     return bool(is_little_endian[1])
 
 def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
-             skip=0, debug=0,depth=1):
+             skip=0, debug=0,depth=1, index=None, index_path='root',
+             header_only=False):
     """Recursively scan the ntags TagEntrys in DM3 file f
     with a given endianness (byte order) looking for
     TagTypes (data) or TagGroups (groups).
@@ -502,6 +592,11 @@ def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
     '.' as separator.
     e.g. key = 'root.dir0.dir1.dir2.value0'
     If skip != 0 the data reading is actually skipped.
+    If header_only is True only the data of the tags needed by
+    DM3ImageFile is read.
+    If index is a dictionary, the file address and infoarray of the
+    data of every tag is stored in it with the key that parseDM3 uses
+    for the tag (see read_indexed_tags).
     If debug > 0, 3, 5, 10 useful debug information is printed on screen.
     """
     depth+=1
@@ -511,6 +606,8 @@ def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
             print('Crawling at address:', f.tell())
 
         tag_id, tag_name_length, tag_name = parse_tag_entry(f)
+        # parseDM3 labels the unnamed tags with their position
+        tag_index_path = index_path + '.' + (tag_name or unicode(tag))
 
         if debug > 5 and debug < 10:
             print('Tag name:', tag_name)
@@ -526,6 +623,8 @@ def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
                 print('Crawling at address:', f.tell())
 
             infoarray = parse_tag_type(f)
+            if index is not None:
+                index[tag_index_path] = (f.tell(), infoarray)
 
             if debug > 5 and debug < 10:
                 print('Infoarray:', infoarray)
@@ -551,8 +650,9 @@ def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
                 # don't read the data now          
                 data_dict[data_key] = parse_image_data(f, infoarray)
             else:
-                data_dict[data_key] = parse_tag_data(f, infoarray,
-                                                       endian, skip)
+                data_dict[data_key] = parse_tag_data(
+                    f, infoarray, endian, skip or (header_only and 
+                        not header_tag_pattern.search(data_key)))
 
             if debug > 10:
                 try:
@@ -610,15 +710,21 @@ def crawl_dm3(f, data_dict, endian, ntags, group_name='root',
                 print('Crawling at address:', f.tell())
             ntags = parse_tag_group(f)[2]
             crawl_dm3(f, data_dict, endian, ntags, group_name,
-                      skip, debug, depth) # recursion
+                      skip, debug, depth, index, tag_index_path,
+                      header_only) # recursion
         else:
             print('File address:', f.tell())
             raise DM3TagIDError(tag_id)
 
-def open_dm3(fname, skip=0, debug=0, log=''):
+def open_dm3(fname, skip=0, debug=0, log='', header_only=False, 
+             index=None):
     """Open a DM3 file given its name and return the dictionary data_dict
     containint the parsed information.
     If skip != 0 the data is actually skipped.
+    If header_only is True only the data of the tags needed by 
+    DM3ImageFile is read.
+    If index is a dictionary, it is filled with the file address and 
+    infoarray of the data of every tag. See read_indexed_tags.
     Optionally, a debug value debug > 0 may be given.
     If log='filename' is specified, the keys, file address and
     (part of) the data parsed in data_dict are written in the log file.
@@ -640,7 +746,8 @@ def open_dm3(fname, skip=0, debug=0, log=''):
             print('Total tags in root group:', rntags)
         rname = 'DM3'
         crawl_dm3(fmap, data_dict, fendian, rntags, group_name=rname,
-                  skip=skip, debug=debug)
+                  skip=skip, debug=debug, index=index, 
+                  header_only=header_only)
 #         if platform.system() in ('Linux', 'Unix'):
 #             try:
 #                 fmap.flush()
@@ -742,8 +849,11 @@ class DM3ImageFile(object):
     scale = ['Scale',]          # in brightdir + 'Group[X]
 
     def __init__(self, fname, data_id=1, order = None, SI = None, 
-                 record_by = None, output_level=1):
+                 record_by = None, output_level=1, lazy=False,
+                 header_only=False):
         self.filename = fname
+        self.lazy = lazy
+        self.header_only = header_only
         self.info = '' # should be a dictionary with the microscope info
         self.mode = ''
         self.record_by = record_by
@@ -762,7 +872,11 @@ class DM3ImageFile(object):
         return message
 
     def open(self):        
-        self.data_dict = open_dm3(self.filename)
+        # The file address of the data of every tag
+        self.tags_index = {}
+        self.data_dict = open_dm3(self.filename, 
+                                  header_only=self.header_only,
+                                  index=self.tags_index)
         byte_order = self.data_dict.ls(DM3ImageFile.endian)[1][1]
         if byte_order == 1:
             self.byte_order = 'little'
@@ -820,13 +934,21 @@ class DM3ImageFile(object):
         except:
             self.vsm = None
             
-        self.old_code_tags = parseDM3(self.filename)
         self.SI_format = None
         self.signal = ""
-        for tag, value in self.old_code_tags.iteritems():
-            if 'Format' in tag and 'Spectrum image' in str(value):
+        if self.header_only is True:
+            # The original parameters are read when accessed. The 
+            # tags are searched in the tags tree instead
+            self.old_code_tags = None
+            tags = iter_tags(self.data_dict.home)
+        else:
+            self.old_code_tags = read_indexed_tags(
+                self.filename, self.tags_index, self.endian)
+            tags = self.old_code_tags.iteritems()
+        for tag, value in tags:
+            if 'Format' in tag and 'Spectrum image' in unicode(value):
                 self.SI_format = value
-            if 'Signal' in tag and 'EELS' in str(value):
+            if 'Signal' in tag and 'EELS' in unicode(value):
                 self.signal = value
                 
 #        try:
@@ -1006,22 +1128,28 @@ class DM3ImageFile(object):
         elif ('rgb' in self.imdtype):
             return self.read_rgb()
         else:
+            # The data is memory-mapped and the axes reordering is 
+            # performed as a strided view. If not lazy, the view is 
+            # copied to memory only once at the end
             data = read_data_array(self.filename, self.imbytes,
-                                   self.byte_offset, self.imdtype)
+                                   self.byte_offset, self.imdtype,
+                                   copy=False)
             imsize = self.imsize.tolist()
             if self.order == 'F':
                 if self.record_by == 'spectrum':
                     swapelem(imsize, 0, 1)
                     data = data.reshape(imsize, order = self.order)
-                    data = np.swapaxes(data, 0, 1).copy()
+                    data = np.swapaxes(data, 0, 1)
                 elif self.record_by == 'image':
                     data = data.reshape(imsize, order = 'C')
             elif self.order == 'C':
                 if self.record_by == 'spectrum':
                     data = data.reshape(np.roll(self.imsize,1), order = self.order)
-                    data = np.rollaxis(data, 0, self.dim).copy()
+                    data = np.rollaxis(data, 0, self.dim)
                 elif self.record_by == 'image':
                     data = data.reshape(self.imsize, order = self.order)                    
+            if self.lazy is False:
+                data = np.array(data, order='C')
             return data
             
     def read_rgb(self):
@@ -1115,8 +1243,15 @@ class DM3ImageFile(object):
 
         return data
 
+def _tags2dictionary(tags):
+    original_parameters = {}
+    for tag in tags.iteritems():
+        node_valve(tag[0].split('.'), tag[1], original_parameters)
+    return original_parameters
+
 def file_reader(filename, record_by=None, order = None, data_id=1, 
-                dump = False, output_level=1):
+                dump = False, output_level=1, lazy=False, 
+                header_only=False):
     """Reads a DM3 file and loads the data into the appropriate class.
     data_id can be specified to load a given image within a DM3 file that
     contains more than one dataset.
@@ -1129,10 +1264,24 @@ def file_reader(filename, record_by=None, order = None, data_id=1,
         One of 'C' or 'F'
     dump: Bool
         If True it dumps the tags into a txt file
+    lazy: Bool
+        If True the data is not read into memory but it is returned
+        as a read-only memory-mapped view of the file, what makes 
+        the loading time independent of the size of the data. For 
+        spectrum images the view is not contiguous in memory what 
+        can make some operations slow. Use the `make_data_contiguous`
+        Signal method to get a contiguous copy stored in a 
+        memory-mapped temporary file, optionally in the background.
+        RGB and packed complex data is always read into memory.
+    header_only: Bool
+        If True only the tags needed to define the mapped parameters 
+        and the axes are read on loading. The original_parameters are
+        read when they are accessed for the first time.
     """
          
     dm3 = DM3ImageFile(filename, data_id, order = order, record_by = record_by,
-                       output_level=output_level)
+                       output_level=output_level, lazy=lazy,
+                       header_only=header_only)
     
     if dump is True:
         import codecs
@@ -1208,9 +1357,15 @@ def file_reader(filename, record_by=None, order = None, data_id=1,
     mapped_parameters['original_filename'] = os.path.split(filename)[1]
     mapped_parameters['record_by'] = dm3.record_by
     mapped_parameters['signal_type'] = dm3.signal
-    original_parameters = {}
-    for tag in dm3.old_code_tags.items():
-        node_valve(tag[0].split('.'), tag[1], original_parameters)
+    if dm3.old_code_tags is None:
+        # The tags are all in the root node. Only the data of the tags
+        # is read, seeking it with the index built when opening the file
+        tags_index, endian = dm3.tags_index, dm3.endian
+        original_parameters = {'root' : LazyNode(
+            lambda: _tags2dictionary(read_indexed_tags(
+                filename, tags_index, endian))['root'])}
+    else:
+        original_parameters = _tags2dictionary(dm3.old_code_tags)
     dictionary = {
         'data' : data,
         'axes' : axes,
@@ -1219,3 +1374,11 @@ def file_reader(filename, record_by=None, order = None, data_id=1,
         }
     
     return [dictionary, ]
+
+def file_header_reader(filename, record_by=None, data_id=1, **kwds):
+    """Read the axes and mapped parameters of a DM3 file without 
+    reading the data or the original parameters. See `io.scan`.
+    
+    """
+    return file_reader(filename, record_by=record_by, data_id=data_id,
+                       output_level=0, lazy=True, header_only=True)
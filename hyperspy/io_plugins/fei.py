@@ -192,7 +192,7 @@ def guess_record_by(record_by_id):
     else:
         return 'image'
         
-def emi_reader(filename, dump_xml = False, **kwds):
+def emi_reader(filename, dump_xml = False, lazy=False, **kwds):
     # TODO: recover the tags from the emi file. It is easy: just look for 
     # <ObjectInfo> and </ObjectInfo>. It is standard xml :)
     objects = get_xml_info_from_emi(filename)
@@ -211,7 +211,7 @@ def emi_reader(filename, dump_xml = False, **kwds):
     for f in ser_files:
         print "Opening ", f
         try:
-            sers.append(ser_reader(f, objects))
+            sers.append(ser_reader(f, objects, lazy=lazy))
         except:
             "The file could not be read. This version of Hyperspy cannot read "
             "single spectra stored in FEI's format. If you think that this file"
@@ -225,8 +225,32 @@ def file_reader(filename, *args, **kwds):
         return [ser_reader(filename, *args, **kwds),]
     elif ext in emi_extensions:
         return emi_reader(filename, *args, **kwds)
+
+def file_header_reader(filename, *args, **kwds):
+    """Read the axes and parameters of a SER or EMI file mapping the
+    data instead of reading it. See `io.scan`.
+    
+    """
+    kwds['lazy'] = True
+    return file_reader(filename, *args, **kwds)
             
-def load_ser_file(filename, print_info = False):
+def load_ser_file(filename, print_info = False, lazy=False):
+    """Read the header and the data elements of a SER file.
+
+    Parameters
+    ----------
+    filename : str
+    print_info : bool
+    lazy : bool
+        If True the data elements are returned as a read-only 
+        numpy memmap structured array and they are only read from the
+        disk when accessed.
+
+    Returns
+    -------
+    header, data : structured arrays
+
+    """
     print "Opening the file: ", filename
     file = open(filename,'rb')
     header = np.fromfile(file, dtype = np.dtype(get_header_dtype_list(file)), 
@@ -245,9 +269,19 @@ def load_ser_file(filename, print_info = False):
     data_dtype_list = get_data_dtype_list(file, data_offsets, 
     guess_record_by(header['DataTypeID']))
     tag_dtype_list =  get_data_tag_dtype_list(header['TagTypeID'])
-    file.seek(data_offsets)
-    data = np.fromfile(file, dtype=np.dtype(data_dtype_list + tag_dtype_list), 
-    count = header["TotalNumberElements"])
+    data_dtype = np.dtype(data_dtype_list + tag_dtype_list)
+    if lazy is True:
+        # If the acquisition was interrupted the file may contain less 
+        # elements than declared in the header
+        file_size = os.fstat(file.fileno()).st_size
+        count = min(int(header["TotalNumberElements"][0]),
+                    (file_size - int(data_offsets)) // data_dtype.itemsize)
+        data = np.memmap(file, dtype=data_dtype, mode='r', 
+                         offset=int(data_offsets), shape=(count,))
+    else:
+        file.seek(data_offsets)
+        data = np.fromfile(file, dtype=data_dtype, 
+        count = header["TotalNumberElements"])
     if print_info is True:
         print "\n"
         print "Data info:"
@@ -269,12 +303,19 @@ def get_xml_info_from_emi(emi_file):
         objects.append(tx[i_start:i_end + 13]) 
     return objects[:-1]
     
-def ser_reader(filename, objects = None, *args, **kwds):
+def ser_reader(filename, objects = None, lazy=False, *args, **kwds):
     """Reads the information from the file and returns it in the Hyperspy 
-    required format"""
+    required format.
+    
+    If lazy is True the data is a read-only strided view of the file 
+    that is only read when accessed, e.g. accessing a subset of the 
+    frames only reads those frames. The per-frame tags (time, position) 
+    are always read into memory.
+    
+    """
     # Determine if it is an emi or a ser file.
     
-    header, data = load_ser_file(filename)
+    header, data = load_ser_file(filename, lazy=lazy)
     record_by = guess_record_by(header['DataTypeID'])
     axes = []
     ndim = int(header['NumberDimensions'])
@@ -386,15 +427,19 @@ def ser_reader(filename, objects = None, *args, **kwds):
         print("OrderedDict is not available, using a standard dictionary.\n")
         original_parameters = {}
     header_parameters = sarray2dict(header)
-    sarray2dict(data, header_parameters)
+    # Copy the per-frame tags. The Array field is not stored to save 
+    # memory avoiding duplication (and to avoid reading it if lazy)
+    for name in data.dtype.names:
+        if name != 'Array':
+            value = np.array(data[name])
+            header_parameters[name] = value[0] if len(value) == 1 \
+            else value
     if objects is not None:
         i = 0
         for obj in objects:
             original_parameters['emi_xml%i' % i] = xmlreader.readConfig(obj)
             
     
-    # We remove the Array key to save memory avoiding duplication
-    del header_parameters['Array']
     original_parameters['ser_header_parameters'] = header_parameters
     dictionary = {
     'data' : dc,
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU General Public License
 # along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+
 import h5py
 
 import numpy as np
@@ -66,8 +68,69 @@ writes = True
 
 not_valid_format = 'The file is not a valid Hyperspy hdf5 file'
 
-def file_reader(filename, record_by, mode = 'r', driver = 'core', 
-                backing_store = False, **kwds):
+# The learning results arrays that are stored in datasets chunked by
+# column and read lazily
+lazy_learning_results = ('factors', 'loadings', 'bss_factors',
+                         'bss_loadings')
+
+class LearningResultsDataset(object):
+    """Reference to a two dimensional array of the learning results
+    stored in a Hyperspy HDF5 file.
+
+    The data is only read when `read` is called and only the requested
+    columns are read from the file.
+
+    Parameters
+    ----------
+    filename : str
+    path : str
+        The path of the dataset in the file.
+    ncolumns : None or int
+        If not None, only the first `ncolumns` columns of the dataset
+        are considered part of the array.
+
+    """
+    def __init__(self, filename, path, ncolumns=None):
+        self.filename = os.path.abspath(filename)
+        self.path = path
+        self.ncolumns = ncolumns
+
+    def __repr__(self):
+        return "<LearningResultsDataset %s:%s, shape: %s>" % (
+            self.filename, self.path, str(self.shape))
+
+    @property
+    def shape(self):
+        with h5py.File(self.filename, mode='r') as f:
+            shape = f[self.path].shape
+        if self.ncolumns is not None:
+            shape = (shape[0], min(shape[1], self.ncolumns))
+        return shape
+
+    @property
+    def dtype(self):
+        with h5py.File(self.filename, mode='r') as f:
+            return f[self.path].dtype
+
+    def crop(self, n):
+        """Returns a reference to the first `n` columns."""
+        if self.ncolumns is not None:
+            n = min(n, self.ncolumns)
+        return LearningResultsDataset(self.filename, self.path, n)
+
+    def read(self, ncolumns=None, start=0):
+        """Read the columns from `start` to `ncolumns`, by default
+        all of them.
+
+        """
+        if self.ncolumns is not None:
+            ncolumns = self.ncolumns if ncolumns is None else \
+                min(ncolumns, self.ncolumns)
+        with h5py.File(self.filename, mode='r') as f:
+            return f[self.path][:, start:ncolumns]
+
+def file_reader(filename, record_by, mode = 'r', driver = None, 
+                backing_store = False, load_data=True, **kwds):
     with h5py.File(filename, mode=mode, driver=driver) as f:
         # If the file has been created with Hyperspy it should cointain a
         # folder Experiments.
@@ -83,7 +146,7 @@ def file_reader(filename, record_by, mode = 'r', driver = 'core',
             # Parse the file
             for experiment in experiments:
                 exg = f['Experiments'][experiment]
-                exp=hdfgroup2signaldict(exg)
+                exp=hdfgroup2signaldict(exg, load_data=load_data)
                 exp_dict_list.append(exp)
         else:
             # Eventually there will be the possibility of loading the
@@ -91,11 +154,29 @@ def file_reader(filename, record_by, mode = 'r', driver = 'core',
             raise IOError('This is not a Hyperspy HDF5')
         return exp_dict_list
 
-def hdfgroup2signaldict(group):
+def file_header_reader(filename, **kwds):
+    """Read the axes and parameters of the experiments in the file
+    without reading the data. See `io.scan`.
+
+    """
+    return file_reader(filename, record_by=None, driver=None,
+                       load_data=False)
+
+def hdfgroup2signaldict(group, load_data=True):
     exp = {}
-    exp['data'] = group['data'][:]
+    if load_data is True:
+        exp['data'] = group['data'][:]
+        shape = exp['data'].shape
+    else:
+        dataset = group['data']
+        shape = dataset.shape
+        exp['shape'] = shape
+        exp['dtype'] = dataset.dtype
+        # The offset is only defined for contiguous datasets
+        exp['data_offset'] = dataset.id.get_offset()
+        exp['data_size'] = dataset.id.get_storage_size()
     axes = []
-    for i in xrange(len(exp['data'].shape)):
+    for i in xrange(len(shape)):
         try:
             axes.append(dict(group['axis-%i' % i].attrs))
         except KeyError:
@@ -105,25 +186,15 @@ def hdfgroup2signaldict(group):
             axis[key] = ensure_unicode(item)
     exp['mapped_parameters'] = hdfgroup2dict(
         group['mapped_parameters'], {})
-    exp['original_parameters'] = hdfgroup2dict(
-        group['original_parameters'], {})
     exp['axes'] = axes
     exp['attributes']={}
-    if 'learning_results' in group.keys():
-        exp['attributes']['learning_results'] = \
-            hdfgroup2dict(group['learning_results'],{})
-    if 'peak_learning_results' in group.keys():
-        exp['attributes']['peak_learning_results'] = \
-            hdfgroup2dict(group['peak_learning_results'],{})
-        
-    # Load the decomposition results written with the old name,
-    # mva_results
-    if 'mva_results' in group.keys():
-        exp['attributes']['learning_results'] = hdfgroup2dict(
-            group['mva_results'],{})
-    if 'peak_mva_results' in group.keys():
-        exp['attributes']['peak_learning_results']=hdfgroup2dict(
-            group['peak_mva_results'],{})
+    if load_data is True:
+        exp['original_parameters'] = hdfgroup2dict(
+            group['original_parameters'], {})
+        exp['attributes'] = hdfgroup2attributes(group)
+    else:
+        # Only the header is required
+        exp['original_parameters'] = {}
     # Replace the old signal and name keys with their current names
     if 'signal' in exp['mapped_parameters']:
         exp['mapped_parameters']['signal_type'] = \
@@ -143,6 +214,29 @@ def hdfgroup2signaldict(group):
         
     return exp
 
+def hdfgroup2attributes(group):
+    attributes = {}
+    # The factors and loadings are not read, they are stored as
+    # references to the datasets and read on demand
+    if 'learning_results' in group.keys():
+        attributes['learning_results'] = \
+            hdfgroup2dict(group['learning_results'],{},
+                          lazy_keys=lazy_learning_results)
+    if 'peak_learning_results' in group.keys():
+        attributes['peak_learning_results'] = \
+            hdfgroup2dict(group['peak_learning_results'],{},
+                          lazy_keys=lazy_learning_results)
+        
+    # Load the decomposition results written with the old name,
+    # mva_results
+    if 'mva_results' in group.keys():
+        attributes['learning_results'] = hdfgroup2dict(
+            group['mva_results'],{})
+    if 'peak_mva_results' in group.keys():
+        attributes['peak_learning_results']=hdfgroup2dict(
+            group['peak_mva_results'],{})
+    return attributes
+
 def dict2hdfgroup(dictionary, group, compression = None):
     from hyperspy.misc.utils import DictionaryBrowser
     from hyperspy.signal import Signal
@@ -179,7 +273,7 @@ def dict2hdfgroup(dictionary, group, compression = None):
                 "information in the file")
                 print('%s : %s' % (key, value))
             
-def hdfgroup2dict(group, dictionary = {}):
+def hdfgroup2dict(group, dictionary = {}, lazy_keys=()):
     for key, value in group.attrs.iteritems():
         if type(value) is np.string_:
             if value == '_None_':
@@ -203,6 +297,10 @@ def hdfgroup2dict(group, dictionary = {}):
         for key in group.keys():
             if key.startswith('_sig_'):
                 dictionary[key[5:]] = hdfgroup2signaldict(group[key])
+            elif key in lazy_keys and isinstance(group[key],
+                    h5py.Dataset) and len(group[key].shape) == 2:
+                dictionary[key] = LearningResultsDataset(
+                    group.file.filename, group[key].name)
             elif isinstance(group[key],h5py.Dataset):
                 dictionary[key]=np.array(group[key])
             else:
@@ -228,15 +326,67 @@ def write_signal(signal,group, compression='gzip'):
     dict2hdfgroup(signal.original_parameters.as_dictionary(), 
                   original_par, compression = compression)
     learning_results = group.create_group('learning_results')
-    dict2hdfgroup(signal.learning_results.__dict__, 
-                  learning_results, compression = compression)
+    write_learning_results(signal.learning_results, 
+                           learning_results, compression = compression)
     if hasattr(signal,'peak_learning_results'):
         peak_learning_results = group.create_group(
             'peak_learning_results')
-        dict2hdfgroup(signal.peak_learning_results.__dict__, 
+        write_learning_results(signal.peak_learning_results, 
                   peak_learning_results, compression = compression)
+
+def write_learning_results(learning_results, group, compression='gzip',
+                           block_size=2**26):
+    """Write the learning results in the group.
+
+    The factors and loadings are stored in datasets chunked by column
+    so that the first components can be read without reading the whole
+    arrays. The arrays that have not been read from their file yet are
+    copied in blocks of about `block_size` bytes.
+
+    """
+    dictionary = learning_results._get_dictionary()
+    arrays = {}
+    for key in lazy_learning_results:
+        if dictionary.get(key) is not None:
+            arrays[key] = dictionary.pop(key)
+    dict2hdfgroup(dictionary, group, compression = compression)
+    for key, array in arrays.iteritems():
+        shape = array.shape
+        if len(shape) != 2 or 0 in shape:
+            dict2hdfgroup({key : np.asarray(array)}, group,
+                          compression = compression)
+            continue
+        dataset = group.create_dataset(key,
+                                       shape=shape,
+                                       dtype=array.dtype,
+                                       chunks=(min(shape[0], 2**16), 1),
+                                       compression=compression)
+        if isinstance(array, np.ndarray):
+            dataset[:] = array
+        else:
+            step = max(1, block_size // (shape[0] *
+                                         array.dtype.itemsize))
+            for start in xrange(0, shape[1], step):
+                stop = min(start + step, shape[1])
+                dataset[:, start:stop] = array.read(stop, start)
+
+def read_lazy_learning_results(signal, filename):
+    """Read the learning results arrays stored in `filename` that
+    have not been read yet, so that the file can be overwritten.
+
+    """
+    filename = os.path.abspath(filename)
+    for attribute in ('learning_results', 'peak_learning_results'):
+        learning_results = getattr(signal, attribute, None)
+        if learning_results is None:
+            continue
+        for key, value in learning_results._get_dictionary().iteritems():
+            if learning_results.is_lazy(key) and \
+                    value.filename == filename:
+                getattr(learning_results, key)
                                     
 def file_writer(filename, signal, compression = 'gzip', *args, **kwds):
+    read_lazy_learning_results(signal, filename)
     with h5py.File(filename, mode = 'w') as f:
         exps = f.create_group('Experiments')
         group_name = signal.mapped_parameters.title if \
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+
+import numpy as np
+
+from hyperspy import Release
+
+# Plugin characteristics
+# ----------------------
+format_name = 'HSR'
+description = ('Hyperspy raw format: the data is stored uncompressed in '
+               'a raw file that is memory-mapped on loading. The '
+               'axes and parameters are stored in a JSON file and the '
+               'arrays in a npz file with the same name.')
+full_suport = False
+# Recognised file extension
+file_extensions = ['hsr', 'HSR']
+default_extension = 0
+# Writing capabilities
+writes = True
+
+# -----------------------
+# File format description
+# -----------------------
+# A signal saved as name.hsr is stored in the following files:
+#
+# name.hsr : the data as a raw C-ordered array starting at the first
+#   byte of the file, and therefore aligned to the page size.
+# name.hsr.json : a JSON dictionary with the keys
+#    'format_version'
+#    'dtype': the data type string of the data e.g. '<f8'
+#    'shape'
+#    'offset': the position in bytes of the data in the raw file
+#    'axes': a list of the axes dictionaries
+#    'mapped_parameters', 'original_parameters', 'learning_results'
+# name.hsr.npz : the arrays contained in the parameters and learning
+#   results. In the JSON file they are replaced by a dictionary
+#   {'__array__' : key} where key is the name of the array in the npz
+#   file.
+# name.hsr.model.npz : optional, the parameters maps of a model as
+#   written by Model.save_parameters2file.
+
+format_version = 1
+
+
+class _Encoder(object):
+    """Convert a dictionary to a JSON compatible dictionary storing the
+    arrays in a dictionary.
+
+    """
+    def __init__(self):
+        self.arrays = {}
+
+    def encode(self, value, path):
+        if isinstance(value, dict):
+            encoded = {}
+            for key, item in value.iteritems():
+                item = self.encode(item, path + '.' + unicode(key))
+                if item is not NotImplemented:
+                    encoded[key] = item
+            return encoded
+        elif isinstance(value, np.ndarray):
+            key = 'array%i' % len(self.arrays)
+            self.arrays[key] = value
+            return {'__array__' : key}
+        elif isinstance(value, np.generic):
+            return value.item()
+        elif isinstance(value, tuple):
+            encoded = self.encode(list(value), path)
+            if encoded is NotImplemented:
+                return NotImplemented
+            return {'__tuple__' : encoded}
+        elif isinstance(value, list):
+            encoded = [self.encode(item, path) for item in value]
+            if NotImplemented in encoded:
+                return NotImplemented
+            return encoded
+        elif isinstance(value, str):
+            return value.decode('utf8', 'ignore')
+        elif value is None or isinstance(value, (bool, int, long, float,
+                                                 unicode)):
+            return value
+        else:
+            print("The HSR writer could not write the following "
+                  "information in the file")
+            print('%s : %s' % (path[1:], value))
+            return NotImplemented
+
+
+def _decode(value, arrays):
+    if isinstance(value, dict):
+        if '__array__' in value:
+            return arrays[value['__array__']]
+        elif '__tuple__' in value:
+            return tuple(_decode(value['__tuple__'], arrays))
+        return dict([(key, _decode(item, arrays))
+                     for key, item in value.iteritems()])
+    elif isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    else:
+        return value
+
+
+def _get_filenames(filename):
+    return filename + '.json', filename + '.npz', filename + '.model.npz'
+
+
+def file_reader(filename, record_by=None, mmap_mode='c', **kwds):
+    """Read a HSR file.
+
+    Parameters
+    ----------
+    filename : str
+    record_by : {None, 'spectrum', 'image'}
+    mmap_mode : {'c', 'r', 'r+', None}
+        The data is memory-mapped using the given mode (see
+        numpy.memmap). The default, 'c' (copy-on-write), does not
+        modify the file when the data is modified. If 'r+' the
+        changes are written to the file. If None, the data is read
+        into memory.
+
+    """
+    header_filename, arrays_filename, _ = _get_filenames(filename)
+    with open(header_filename, 'r') as f:
+        header = json.load(f)
+    if header['format_version'] > format_version:
+        raise IOError('The file was written by a newer version of '
+                      'Hyperspy that uses the version %i of the HSR '
+                      'format' % header['format_version'])
+    if os.path.exists(arrays_filename):
+        with np.load(arrays_filename) as f:
+            arrays = dict([(key, f[key]) for key in f.files])
+    else:
+        arrays = {}
+    shape = tuple(header['shape'])
+    dtype = np.dtype(str(header['dtype']))
+    if mmap_mode is None:
+        with open(filename, 'rb') as f:
+            f.seek(header['offset'])
+            data = np.fromfile(f, dtype=dtype,
+                               count=int(np.prod(shape))).reshape(shape)
+    elif 0 in shape:
+        data = np.empty(shape, dtype=dtype)
+    else:
+        data = np.memmap(filename, dtype=dtype, mode=mmap_mode,
+                         offset=header['offset'], shape=shape)
+    mapped_parameters = _decode(header['mapped_parameters'], arrays)
+    if record_by is not None:
+        mapped_parameters['record_by'] = record_by
+    mapped_parameters['original_filename'] = os.path.split(filename)[1]
+    return [{'data' : data,
+             'axes' : _decode(header['axes'], arrays),
+             'mapped_parameters' : mapped_parameters,
+             'original_parameters' : _decode(
+                 header['original_parameters'], arrays),
+             'attributes' : {'learning_results' : _decode(
+                 header['learning_results'], arrays)},
+             }]
+
+
+def file_header_reader(filename, record_by=None, **kwds):
+    """Read the header of a HSR file mapping the data read-only.
+    See `io.scan`.
+
+    """
+    return file_reader(filename, record_by=record_by, mmap_mode='r')
+
+
+def _write_data(f, data, chunk_size=2**26):
+    """Write the data in C order without copying it all at once."""
+    if data.flags['C_CONTIGUOUS'] or data.size == 0:
+        data.tofile(f)
+        return
+    # Write the rows of the first axis in chunks of up to chunk_size
+    # bytes
+    nbytes = max(data[0].nbytes, 1)
+    step = max(1, chunk_size // nbytes)
+    for i in xrange(0, data.shape[0], step):
+        np.ascontiguousarray(data[i:i + step]).tofile(f)
+
+
+def file_writer(filename, signal, model=None, **kwds):
+    """Write the signal in the HSR format.
+
+    Parameters
+    ----------
+    filename : str
+    signal : Signal
+    model : {None, Model}
+        If not None, the parameters maps of the model are stored in
+        the file `filename` + '.model.npz'. They can be loaded with
+        Model.load_parameters_from_file.
+
+    """
+    header_filename, arrays_filename, model_filename = \
+        _get_filenames(filename)
+    data = signal.data
+    # If the data is memory-mapped from the same file writing it would
+    # corrupt it
+    same_file = (isinstance(data, np.memmap) and
+                 data.filename is not None and
+                 os.path.exists(filename) and
+                 os.path.samefile(data.filename, filename))
+    if same_file and data.mode == 'r+' and data.offset == 0 and \
+            data.flags['C_CONTIGUOUS']:
+        data.flush()
+    else:
+        # Writing to a temporary file and renaming it keeps valid the
+        # memory maps of the old file
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            _write_data(f, data)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+
+    encoder = _Encoder()
+    learning_results = signal.learning_results._get_dictionary()
+    # The arrays of the learning results that are stored in a file and
+    # have not been read yet are file references
+    for key, value in learning_results.iteritems():
+        if hasattr(value, 'read') and not isinstance(value, np.ndarray):
+            learning_results[key] = value.read()
+    mapped_parameters = signal.mapped_parameters.as_dictionary()
+    if 'original_filename' in mapped_parameters:
+        del mapped_parameters['original_filename']
+    header = {
+        'format_version' : format_version,
+        'hyperspy_version' : Release.version,
+        'dtype' : data.dtype.str,
+        'shape' : list(data.shape),
+        'offset' : 0,
+        'axes' : encoder.encode(
+            signal.axes_manager._get_axes_dicts(), ''),
+        'mapped_parameters' : encoder.encode(mapped_parameters, ''),
+        'original_parameters' : encoder.encode(
+            signal.original_parameters.as_dictionary(), ''),
+        'learning_results' : encoder.encode(learning_results, ''),
+    }
+    with open(header_filename, 'w') as f:
+        json.dump(header, f, indent=1, sort_keys=True)
+    if encoder.arrays:
+        np.savez(arrays_filename, **encoder.arrays)
+    elif os.path.exists(arrays_filename):
+        os.remove(arrays_filename)
+    if model is not None:
+        model.save_parameters2file(model_filename)
@@ -24,7 +24,9 @@ import os
 
 import numpy as np
 
-from hyperspy.misc.utils import sarray2dict
+from hyperspy.misc.utils import sarray2dict, LazyNode
+from hyperspy.misc import progressbar
+from hyperspy import Release
 
 
 # Plugin characteristics
@@ -37,7 +39,14 @@ file_extensions = ['mrc', 'MRC', 'ALI', 'ali']
 default_extension = 0
 
 # Writing capabilities
-writes = False
+writes = [(2,0), (2,1)]
+
+# Size in bytes of the FEI extended header: 1024 records of 128 bytes
+fei_header_size = 128 * 1024
+
+# The length units that are converted when writing, in meters
+length_units = {'m' : 1., 'um' : 1e-6, u'\xb5m' : 1e-6, 'nm' : 1e-9,
+                u'\xc5' : 1e-10, 'A' : 1e-10}
 
 def get_std_dtype_list(endianess = '<'):
     end = endianess
@@ -120,55 +129,112 @@ def get_data_type(index, endianess = '<'):
     end + 'f4',         # 2 = Image     float
     (end + 'i2', 2),    # 3 = Complex   short*2
     end + 'c8',         # 4 = Complex   float*2
+    None,               # 5 = Not used
+    end + 'u2',         # 6 = Image     unsigned short integer (16 bits)
     ]
     return data_type[index]
+
+def get_mode(dtype):
+    """Return the MRC mode and the dtype in which data of the given dtype
+    is written.
+
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'c':
+        return 4, np.dtype('c8')
+    elif dtype.kind in 'iub' and dtype.itemsize == 1 or \
+            dtype.kind == 'i' and dtype.itemsize == 2:
+        return 1, np.dtype('i2')
+    elif dtype.kind == 'u' and dtype.itemsize == 2:
+        return 6, np.dtype('u2')
+    elif dtype.kind in 'iuf':
+        return 2, np.dtype('f4')
+    else:
+        raise IOError('The MRC format does not support writting data of '
+                      '%s type' % dtype.name)
+                        
+def read_fei_header(filename, endianess = '<', count = 1024):
+    """Read the FEI extended header of a MRC file.
+
+    Parameters
+    ----------
+    filename : str
+    endianess : {'<', '>'}
+    count : int
+        The number of records (one per image) to read.
+
+    Returns
+    -------
+    A dictionary of arrays, one per field of the records.
+
+    """
+    with open(filename, 'rb') as f:
+        f.seek(1024)
+        fei_header = np.fromfile(f, dtype = get_fei_dtype_list(endianess),
+                                 count = count)
+    fei_dict = sarray2dict(fei_header,)
+    del fei_dict['empty']
+    return fei_dict
                         
 def file_reader(filename, endianess = '<', **kwds):
+    """Read a MRC file. The data is memory-mapped and the FEI extended
+    header, if any, is only read when it is accessed in the 
+    original_parameters.
+
+    """
     mapped_parameters={}
-    dtype_list = get_std_dtype_list(endianess) + get_fei_dtype_list(endianess)
     f = open(filename, 'rb')
     std_header = np.fromfile(f, dtype = get_std_dtype_list(endianess), 
     count = 1)
     fei_header = None
     if std_header['NEXT'] / 1024 == 128:
         print "It seems to contain an extended FEI header"
+        # Only the first record is needed to define the axes
         fei_header = np.fromfile(f, dtype = get_fei_dtype_list(endianess), 
-                                 count = 1024)    
-    if f.tell() == 1024 + std_header['NEXT']:
-        print "The FEI header was correctly loaded"
-    else:
-        print "There was a problem reading the extended header"
-        f.seek(1024 + std_header['NEXT'])
-        fei_header = None
-    NX, NY, NZ = std_header['NX'], std_header['NY'], std_header['NZ']    
+                                 count = 1)
+        if fei_header.size != 1:
+            print "There was a problem reading the extended header"
+            fei_header = None
+    f.seek(1024 + int(std_header['NEXT']))
+    NX, NY, NZ = [int(std_header[key]) for key in ('NX', 'NY', 'NZ')]
     data = np.memmap(f, mode = 'c', offset = f.tell(), 
-                     dtype = get_data_type(std_header['MODE'], endianess)
-                     ).squeeze().reshape((NX, NY, NZ), order = 'F').T
+                     dtype = get_data_type(int(std_header['MODE']), endianess),
+                     shape = NX * NY * NZ
+                     ).reshape((NX, NY, NZ), order = 'F').T
+    f.close()
                      
     original_parameters = { 'std_header' : sarray2dict(std_header)}
     if fei_header is not None:
-        fei_dict = sarray2dict(fei_header,)
-        del fei_dict['empty']
-        original_parameters['fei_header'] = fei_dict
+        original_parameters['fei_header'] = LazyNode(
+            lambda: read_fei_header(filename, endianess))
         
     dim = len(data.shape)
     if fei_header is None:
         # The scale is in Amstrongs, we convert it to nm
-        scales = [   10 * float(std_header['Zlen']/std_header['MZ'])
+        scales = [   float(std_header['Zlen']/std_header['MZ']) / 10
                         if float(std_header['MZ']) != 0 else 1,
-                     10 *  float(std_header['Ylen']/std_header['MY'])
+                     float(std_header['Ylen']/std_header['MY']) / 10
                         if float(std_header['MY']) != 0 else 1,
-                     10 *  float(std_header['Xlen']/std_header['MX'])
+                     float(std_header['Xlen']/std_header['MX']) / 10
                      if float(std_header['MX']) != 0 else 1,]
-        offsets = [   10 * float(std_header['ZORIGIN']),
-                      10 * float(std_header['YORIGIN']),
-                      10 * float(std_header['XORIGIN']),]
+        offsets = [   float(std_header['ZORIGIN']) / 10,
+                      float(std_header['YORIGIN']) / 10,
+                      float(std_header['XORIGIN']) / 10,]
         
-    else:
+    elif fei_header['pixel_size'][0] != 0:
         # FEI does not use the standard header to store the scale
         # It does store the spatial scale in pixel_size, one per angle in meters
         scales = [1, ] + [fei_header['pixel_size'][0] * 10**9,] * 2 
         offsets = [0,] * 3
+    else:
+        # The pixel size is not defined, use the scale of the standard
+        # header
+        scales = [1,] + [float(std_header[length]/std_header[size]) / 10
+                         if float(std_header[size]) != 0 else 1
+                         for length, size in (('Ylen', 'MY'), 
+                                              ('Xlen', 'MX'))]
+        offsets = [0, float(std_header['YORIGIN']) / 10,
+                   float(std_header['XORIGIN']) / 10]
     
     units = ['undefined', 'nm', 'nm']
     names = ['z', 'y', 'x']
@@ -192,3 +258,119 @@ def file_reader(filename, endianess = '<', **kwds):
                       'original_parameters' : original_parameters,}
     
     return [dictionary,]
+
+def file_header_reader(filename, endianess = '<', **kwds):
+    """Read the headers of a MRC file. The data is memory-mapped, not
+    read. See `io.scan`.
+
+    """
+    return file_reader(filename, endianess=endianess)
+
+def _get_fei_header(signal, nimages, endianess):
+    """Create the FEI extended header from the original FEI header of
+    the signal, if any, and its calibration.
+
+    """
+    fei_header = np.zeros(1024, dtype = get_fei_dtype_list(endianess))
+    if signal.original_parameters.has_item('fei_header'):
+        original = signal.original_parameters.fei_header.as_dictionary()
+        for key, value in original.iteritems():
+            if key in fei_header.dtype.names:
+                value = np.asarray(value).ravel()[:1024]
+                fei_header[key][:len(value)] = value
+    image_axis = signal.axes_manager.signal_axes[0]
+    if image_axis.units in length_units:
+        fei_header['pixel_size'][:nimages] = (
+            image_axis.scale * length_units[image_axis.units])
+    if signal.axes_manager.navigation_dimension == 1:
+        tilt_axis = signal.axes_manager.navigation_axes[0]
+        if tilt_axis.units in ('deg', 'degree', 'degrees', u'\xb0'):
+            fei_header['a_tilt'][:nimages] = tilt_axis.axis
+    return fei_header
+
+def file_writer(filename, signal, extended_header=None, 
+                chunk_size=2**26, **kwds):
+    """Write a image or a stack of images in the MRC format.
+
+    The data is written in chunks, what permits writing memory-mapped
+    data larger than the available memory. The scales and offsets of
+    the axes in m, um, nm or Amstrongs are converted to the units of
+    the format. Those of the other axes are written as if they were in 
+    nm. Integer data of 8 and 16 
+    bits is written as 16-bit integers, complex data as complex64 and
+    the rest as float32.
+
+    Parameters
+    ----------
+    filename : str
+    signal : Image
+    extended_header : {None, bool}
+        If True, a FEI extended header is written with the records of
+        `original_parameters.fei_header` if they exist and the pixel 
+        size and, if the units of the stack axis are degrees, the tilt
+        angles of the signal. If None (default) it is only written if
+        the signal has a FEI extended header in its original 
+        parameters.
+    chunk_size : int
+        The approximate size in bytes of the chunks.
+
+    """
+    data = signal.data
+    if signal.axes_manager.navigation_dimension == 1:
+        data = np.rollaxis(
+            data, signal.axes_manager.navigation_axes[0].index_in_array, 0)
+    else:
+        data = data.reshape((1,) + data.shape[-2:])
+    NZ, NY, NX = data.shape
+    mode, dtype = get_mode(data.dtype)
+    endianess = '<'
+    dtype = dtype.newbyteorder(endianess)
+    if extended_header is None:
+        extended_header = signal.original_parameters.has_item('fei_header')
+
+    std_header = np.zeros(1, dtype = get_std_dtype_list(endianess))
+    std_header['NX'], std_header['NY'], std_header['NZ'] = NX, NY, NZ
+    std_header['MX'], std_header['MY'], std_header['MZ'] = NX, NY, NZ
+    std_header['MODE'] = mode
+    # The axes in the order x, y, z
+    axes = [signal.axes_manager.signal_axes[1], 
+            signal.axes_manager.signal_axes[0]]
+    if signal.axes_manager.navigation_dimension == 1:
+        axes.append(signal.axes_manager.navigation_axes[0])
+    for axis, name, size in zip(axes, ('X', 'Y', 'Z'), (NX, NY, NZ)):
+        # The lengths and the origins are stored in Amstrongs. The 
+        # axes with other units are written as if they were in nm
+        factor = length_units.get(axis.units, 1e-9) * 1e10
+        std_header[name + 'len'] = axis.scale * size * factor
+        std_header[name + 'ORIGIN'] = axis.offset * factor
+    std_header['ALPHA'] = std_header['BETA'] = std_header['GAMMA'] = 90
+    std_header['MAPC'], std_header['MAPR'], std_header['MAPS'] = 1, 2, 3
+    std_header['NEXT'] = fei_header_size if extended_header else 0
+    std_header['CMAP'] = 'MAP '
+    # Little endian machine stamp
+    std_header['STAMP'] = 'DA\x00\x00'
+    std_header['NLABL'] = 1
+    std_header['LABELS'] = 'Created by Hyperspy version %s' % Release.version
+
+    with open(filename, 'wb') as f:
+        std_header.tofile(f)
+        if extended_header:
+            _get_fei_header(signal, NZ, endianess).tofile(f)
+        image_size = NX * NY * dtype.itemsize
+        step = max(1, chunk_size // max(image_size, 1))
+        amin, amax, asum = np.inf, -np.inf, 0.
+        pbar = progressbar.progressbar(maxval=NZ)
+        for i in xrange(0, NZ, step):
+            chunk = np.ascontiguousarray(data[i:i + step], dtype = dtype)
+            chunk.tofile(f)
+            if chunk.size and mode != 4:
+                amin = min(amin, chunk.min())
+                amax = max(amax, chunk.max())
+                asum += chunk.sum(dtype='float64')
+            pbar.update(min(NZ, i + step))
+        pbar.finish()
+        if mode != 4 and data.size:
+            std_header['AMIN'], std_header['AMAX'] = amin, amax
+            std_header['AMEAN'] = asum / data.size
+            f.seek(0)
+            std_header.tofile(f)
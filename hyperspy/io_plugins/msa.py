@@ -116,39 +116,89 @@ keywords = {
             }
             
     
-def file_reader(filename, encoding = 'latin-1', **kwds):
+months = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP',
+          'OCT', 'NOV', 'DEC']
+
+def _read_keywords(spectrum_file):
+    """Read the keywords of an open MSA file up to the #SPECTRUM
+    keyword.
+
+    Returns
+    -------
+    parameters : dictionary of the keywords (not converted)
+    data_position : the position in the file of the first byte after the
+        #SPECTRUM line or None if there is no data section
+
+    """
     parameters = {}
-    mapped = DictionaryBrowser({})
-    spectrum_file = codecs.open(filename, encoding = encoding,
-                                errors = 'replace')
-    y = []
-    # Read the keywords
-    data_section = False
-    for line in spectrum_file.readlines():
-        if data_section is False:
-            if line[0] == "#":
-                try:
-                    key,value = line.split(': ')
-                    value = value.strip()
-                except ValueError:
-                    key = line
-                    value = None
-                key = key.strip('#').strip()
-                
-                if key != 'SPECTRUM':
-                    parameters[key] = value
-                else:
-                    data_section = True
+    data_position = None
+    while True:
+        line = spectrum_file.readline()
+        if not line:
+            break
+        if line[0] != "#":
+            continue
+        try:
+            key, value = line.split(': ', 1)
+            value = value.strip()
+        except ValueError:
+            key = line
+            value = None
+        key = key.strip('#').strip()
+        if key != 'SPECTRUM':
+            parameters[key] = value
         else:
-            # Read the data
-            if line[0] != "#" and line.strip(): 
-                if parameters['DATATYPE'] == 'XY':
-                    xy = line.replace(',', ' ').strip().split()
-                    y.append(float(xy[1]))
-                elif parameters['DATATYPE'] == 'Y':
-                    data = [
-                    float(i) for i in line.replace(',', ' ').strip().split()]
-                    y.extend(data)
+            data_position = spectrum_file.tell()
+            break
+    return parameters, data_position
+
+def _read_data(spectrum_file, datatype, npoints=None):
+    """Parse the data section of an open MSA file from the current
+    position up to the next keyword (usually #ENDOFDATA).
+
+    Parameters
+    ----------
+    spectrum_file : file
+    datatype : {'Y', 'XY'}
+    npoints : {None, str}
+        The value of the NPOINTS keyword, used to check that all the
+        data has been parsed.
+
+    """
+    block = spectrum_file.read()
+    end = block.find('#')
+    if end != -1:
+        block = block[:end]
+    # The data can be separated by commas, spaces and line breaks
+    block = block.replace(',', ' ')
+    data = np.fromstring(block, sep=' ')
+    try:
+        expected_size = int(float(npoints)) * (2 if datatype == 'XY' 
+                                                else 1)
+    except (TypeError, ValueError):
+        expected_size = len(block.split())
+    if data.size != expected_size:
+        # np.fromstring stops at the first value that is not a number.
+        # Converting each value raises an exception that reports it.
+        data = np.array(block.split(), dtype='float64')
+    if datatype == 'XY':
+        data = data.reshape((-1, 2))[:, 1].copy()
+    elif datatype != 'Y':
+        raise IOError('Unknown DATATYPE %s' % datatype)
+    return data
+
+def _decode_keywords(parameters, encoding):
+    return dict([(key.decode(encoding, 'replace'),
+                  value.decode(encoding, 'replace')
+                  if value is not None else None)
+                 for key, value in parameters.iteritems()])
+
+def _parameters2dictionary(parameters, size, filename):
+    """Convert the keywords to the right type, map them and define
+    the axis.
+
+    """
+    mapped = DictionaryBrowser({})
     # We rewrite the format value to be sure that it complies with the 
     # standard, because it will be used by the writer routine
     parameters['FORMAT'] = "EMSA/MAS Spectral Data File"
@@ -185,14 +235,9 @@ def file_reader(filename, encoding = 'latin-1', **kwds):
                         '_units',units)
                 
     # The data parameter needs some extra care
-    # It is necessary to change the locale to US english to read the date
-    # keyword            
-    loc = locale.getlocale(locale.LC_TIME)
-    
-    if os_name == 'posix':
-        locale.setlocale(locale.LC_TIME, ('en_US', 'utf8'))
-    elif os_name == 'windows':
-        locale.setlocale(locale.LC_TIME, 'english')
+    # The month is an English abbreviation. It is not parsed with 
+    # strptime because that requires changing the locale, which is not
+    # thread safe and fails when the English locale is not installed
     try:
         H, M = time.strptime(parameters['TIME'], "%H:%M")[3:5]
         mapped['time'] = datetime.time(H, M)
@@ -200,18 +245,17 @@ def file_reader(filename, encoding = 'latin-1', **kwds):
         if 'TIME' in parameters and parameters['TIME']:
             print('The time information could not be retrieved')
     try:    
-        Y, M, D = time.strptime(parameters['DATE'], "%d-%b-%Y")[0:3]
-        mapped['date'] = datetime.date(Y, M, D)
+        D, M, Y = parameters['DATE'].strip().split('-')
+        mapped['date'] = datetime.date(int(Y), months.index(M.upper()) + 1,
+                                       int(D))
     except:
         if 'DATE' in parameters and parameters['DATE']:
             print('The date information could not be retrieved')
 
-    locale.setlocale(locale.LC_TIME, loc) # restore saved locale
-
     axes = []
 
     axes.append({
-    'size' : len(y), 
+    'size' : size, 
     'index_in_array' : 0,
     'name' : parameters['XLABEL'] if 'XLABEL' in parameters else '', 
     'scale': parameters['XPERCHAN'] if 'XPERCHAN' in parameters else 1,
@@ -229,13 +273,54 @@ def file_reader(filename, encoding = 'latin-1', **kwds):
         mapped.signal_type = 'EELS'
 
     dictionary = {
-                    'data' : np.array(y),
                     'axes' : axes,
                     'mapped_parameters': mapped.as_dictionary(),
                     'original_parameters' : parameters
                 }
+    return dictionary
+
+def file_reader(filename, encoding = 'latin-1', **kwds):
+    with open(filename, 'rb') as spectrum_file:
+        parameters, data_position = _read_keywords(spectrum_file)
+        if data_position is None:
+            data = np.array([])
+        else:
+            data = _read_data(spectrum_file, parameters['DATATYPE'],
+                              parameters.get('NPOINTS'))
+    parameters = _decode_keywords(parameters, encoding)
+    dictionary = _parameters2dictionary(parameters, data.size, filename)
+    dictionary['data'] = data
     return [dictionary,]
 
+def file_header_reader(filename, encoding = 'latin-1', **kwds):
+    """Read the keywords of a MSA file without reading the data. The
+    number of points is taken from the NPOINTS keyword. See `io.scan`.
+
+    """
+    with open(filename, 'rb') as spectrum_file:
+        parameters, _ = _read_keywords(spectrum_file)
+    parameters = _decode_keywords(parameters, encoding)
+    size = int(float(parameters.get('NPOINTS', 0)))
+    dictionary = _parameters2dictionary(parameters, size, filename)
+    dictionary['shape'] = (size,)
+    dictionary['dtype'] = np.dtype('float64')
+    return [dictionary,]
+
+def file_data_reader(filename, **kwds):
+    """Read only the data of a MSA file.
+
+    It is used by `io.load` to stack multiple files: the keywords of
+    each file are only split to find the data section and the DATATYPE,
+    they are not converted nor mapped.
+
+    """
+    with open(filename, 'rb') as spectrum_file:
+        parameters, data_position = _read_keywords(spectrum_file)
+        if data_position is None:
+            return np.array([])
+        return _read_data(spectrum_file, parameters['DATATYPE'],
+                          parameters.get('NPOINTS'))
+
 def file_writer(filename, signal, format = None, separator = ', ',
                 encoding = 'latin-1'):
     loc_kwds = {}
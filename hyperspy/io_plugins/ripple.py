@@ -28,6 +28,7 @@ from StringIO import StringIO
 import numpy as np
 
 from hyperspy.misc.utils_readfile import *
+from hyperspy.misc import progressbar
 from hyperspy import Release
 from hyperspy.misc.utils import DictionaryBrowser
 
@@ -462,6 +463,14 @@ def file_reader(filename, rpl_info=None, encoding="latin-1",
         }
     return [dictionary, ]
 
+def file_header_reader(filename, *args, **kwds):
+    """Parse the rpl file and map the raw file read-only without
+    reading it. See `io.scan`.
+
+    """
+    kwds['mmap_mode'] = 'r'
+    return file_reader(filename, *args, **kwds)
+
 def file_writer(filename, signal, encoding='latin-1', *args, **kwds):
 
     # Set the optional keys to None
@@ -573,35 +582,83 @@ def write_rpl(filename, keys_dictionary, encoding = 'ascii'):
         f.write(key + '\t' + value + '\n')
     f.close()
 
-def write_raw(filename, signal, record_by):
+def write_raw(filename, signal, record_by, chunk_size=2**26):
     """Writes the raw file object
 
+    The data is written in chunks of about `chunk_size` bytes in the 
+    order defined by `record_by` without making a copy of the full 
+    data. Therefore memory-mapped data larger than the available memory
+    can be written. The progress and the throughput are shown in a 
+    progress bar.
+
     Parameters:
     -----------
     filename : string
         the filename, either with the extension or without it
     record_by : string
      'vector' or 'image'
+    chunk_size : int
+        The maximum size in bytes of the chunks, unless a single row of
+        the output is bigger.
 
         """
     filename = os.path.splitext(filename)[0] + '.raw'
-    dshape = signal.data.shape
     data = signal.data
+    dshape = data.shape
+    # The order of the axes of the data in the file
+    axes_order = range(len(dshape))
     if len(dshape) == 3:
         if record_by == 'vector':
-            np.rollaxis(
-                data, signal.axes_manager.signal_axes[0].index_in_array, 3
-                        ).ravel().tofile(filename)
+            signal_axis = signal.axes_manager.signal_axes[0].index_in_array
+            axes_order.remove(signal_axis)
+            axes_order.append(signal_axis)
         elif record_by == 'image':
-            data = np.rollaxis(
-                data, signal.axes_manager.navigation_axes[0].index_in_array, 0
-                        ).ravel().tofile(filename)
+            navigation_axis = \
+                signal.axes_manager.navigation_axes[0].index_in_array
+            axes_order.remove(navigation_axis)
+            axes_order.insert(0, navigation_axis)
     elif len(dshape) == 2:
         if record_by == 'vector':
-            np.rollaxis(
-                data, signal.axes_manager.signal_axes[0].index_in_array, 2
-                        ).ravel().tofile(filename)
-        elif record_by in ('image', 'dont-care'):
-            data.ravel().tofile(filename)
-    elif len(dshape) == 1:
-        data.ravel().tofile(filename)
+            signal_axis = signal.axes_manager.signal_axes[0].index_in_array
+            axes_order.remove(signal_axis)
+            axes_order.append(signal_axis)
+    write_array_in_chunks(filename, data, axes_order, chunk_size)
+
+def write_array_in_chunks(filename, data, axes_order, chunk_size=2**26):
+    """Write the data transposed to `axes_order` in C order in chunks
+    along the first output axis.
+
+    Parameters
+    ----------
+    filename : str
+    data : array or memory-mapped array
+        Any object with `shape`, `dtype` and numpy-style slicing works.
+    axes_order : list of int
+        The axes of `data` in the order in which they are written.
+    chunk_size : int
+        The approximate size in bytes of the chunks.
+
+    """
+    shape = data.shape
+    dtype = np.dtype(data.dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    with open(filename, 'wb') as f:
+        if not shape or not nbytes:
+            np.asarray(data).tofile(f)
+            return
+        first_axis = axes_order[0]
+        row_bytes = max(nbytes // shape[first_axis], 1)
+        step = max(1, chunk_size // row_bytes)
+        pbar = progressbar.ProgressBar(
+            widgets=['Writing %s' % os.path.split(filename)[1], ' ',
+                     progressbar.Percentage(), ' ', progressbar.Bar(), ' ',
+                     progressbar.FileTransferSpeed(), ' ',
+                     progressbar.ETA()],
+            maxval=nbytes).start()
+        for i in xrange(0, shape[first_axis], step):
+            index = [slice(None),] * len(shape)
+            index[first_axis] = slice(i, i + step)
+            chunk = np.asarray(data[tuple(index)]).transpose(axes_order)
+            np.ascontiguousarray(chunk).tofile(f)
+            pbar.update(min(nbytes, (i + step) * row_bytes))
+        pbar.finish()
@@ -17,11 +17,16 @@
 # along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+import sys
+import struct
+import tempfile
+
 import numpy as np
 import warnings
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
-    from hyperspy.misc.tifffile import imsave, imread
+    from hyperspy.misc.tifffile import imsave, imread, TIFFfile
 
 # Plugin characteristics
 # ----------------------
@@ -36,19 +41,259 @@ default_extension = 0 # tif
 writes = [(2,0), (2,1)]
 # ----------------------
 
+# The size from which the files are written as BigTIFF by default, as
+# in tifffile.imsave
+bigtiff_threshold = 2040 * 2**20
+
+
+class TIFFStackWriter(object):
+    """Write a stack of images to a TIFF file one image at a time.
+
+    Each image is stored uncompressed in one strip followed by its
+    image file directory. The data is aligned to 16 bytes and, if all
+    the images have the same shape, equally spaced in the file, what 
+    permits reading the stack as a memory-mapped array.
+
+    Parameters
+    ----------
+    filename : str
+    bigtiff : bool
+        If True (default) the file is written in the BigTIFF format,
+        otherwise in the standard TIFF format that cannot be larger 
+        than 4 GB.
+    byteorder : {None, '<', '>'}
+        If None the native byte order is used.
+
+    Examples
+    --------
+    >>> with TIFFStackWriter('stack.tif') as writer:
+    ...     for frame in frames:
+    ...         writer.append(frame)
+
+    """
+    _sample_formats = {'u': 1, 'i': 2, 'f': 3, 'c': 6}
+
+    def __init__(self, filename, bigtiff=True, byteorder=None):
+        if byteorder is None:
+            byteorder = '<' if sys.byteorder == 'little' else '>'
+        self.byteorder = byteorder
+        self.bigtiff = bigtiff
+        if bigtiff is True:
+            self._offset_format = 'Q'
+            self._numtags_format = 'Q'
+            self._value_size = 8
+        else:
+            self._offset_format = 'I'
+            self._numtags_format = 'H'
+            self._value_size = 4
+        self.dtype = None
+        self.number_of_images = 0
+        self._f = open(filename, 'wb')
+        self._write({'<': b'II', '>': b'MM'}[byteorder])
+        if bigtiff is True:
+            self._write(self._pack('HHH', 43, 8, 0))
+        else:
+            self._write(self._pack('H', 42))
+        # Position of the offset of the next IFD
+        self._next_ifd_pointer = self._f.tell()
+        self._write(self._pack(self._offset_format, 0))
+        self._align()
+
+    def _pack(self, fmt, *values):
+        return struct.pack(self.byteorder + fmt, *values)
+
+    def _write(self, string):
+        self._f.write(string)
+
+    def _align(self, alignment=16):
+        padding = -self._f.tell() % alignment
+        if padding:
+            self._write(b'\0' * padding)
+
+    def _tag(self, code, dtype, value):
+        tifftypes = {'H': 3, 'I': 4, 'Q': 16}
+        return (self._pack('HH', code, tifftypes[dtype]) +
+                self._pack(self._offset_format, 1) +
+                self._pack(dtype, value).ljust(self._value_size, b'\0'))
+
+    def append(self, image):
+        """Write an image at the end of the file.
 
-def file_writer(filename, signal, _rescale = True,  **kwds):
+        Parameters
+        ----------
+        image : 2D array
+            All the images must have the same dtype.
+
+        """
+        image = np.asarray(image)
+        if image.ndim != 2:
+            raise ValueError('Only 2D images can be written')
+        if self.dtype is None:
+            self.dtype = image.dtype
+        elif image.dtype != self.dtype:
+            raise ValueError('All the images must have the same dtype')
+        if self.dtype.kind not in self._sample_formats:
+            raise IOError('The TIFF format does not support writting data '
+                          'of %s type' % self.dtype.name)
+        image = np.ascontiguousarray(image, dtype=self.dtype.newbyteorder(
+            self.byteorder))
+        data_offset = self._f.tell()
+        image.tofile(self._f)
+        self._align()
+        ifd_offset = self._f.tell()
+        if self.bigtiff is False and ifd_offset >= 2**32:
+            raise IOError('The data is too large for the standard TIFF '
+                          'format, use BigTIFF instead')
+        height, width = image.shape
+        offset_format = self._offset_format
+        # The tags must be sorted by code
+        tags = [self._tag(256, 'I', width),
+                self._tag(257, 'I', height),
+                self._tag(258, 'H', image.dtype.itemsize * 8),
+                self._tag(259, 'H', 1), # No compression
+                self._tag(262, 'H', 1), # Black is zero
+                self._tag(273, offset_format, data_offset),
+                self._tag(277, 'H', 1),
+                self._tag(278, 'I', height),
+                self._tag(279, offset_format, image.nbytes),
+                self._tag(339, 'H', self._sample_formats[image.dtype.kind]),
+                ]
+        self._write(self._pack(self._numtags_format, len(tags)))
+        self._write(b''.join(tags))
+        next_ifd_pointer = self._f.tell()
+        self._write(self._pack(offset_format, 0))
+        self._align()
+        end = self._f.tell()
+        # Link the previous IFD to this one
+        self._f.seek(self._next_ifd_pointer)
+        self._write(self._pack(offset_format, ifd_offset))
+        self._f.seek(end)
+        self._next_ifd_pointer = next_ifd_pointer
+        self.number_of_images += 1
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def file_writer(filename, signal, bigtiff=None, **kwds):
     '''Writes data to tif using Christoph Gohlke's tifffile library
         
+        Stacks of images are written one image at a time from the
+        memory-mapped data with TIFFStackWriter.
+
         Parameters
         ----------
         filename: str
         signal: a Signal instance
+        bigtiff : {None, bool}
+            If True the file is written in the BigTIFF format. If None,
+            BigTIFF is used when the data is larger than 2040 MB.
     '''
+    data = signal.data
+    if bigtiff is None:
+        bigtiff = data.nbytes >= bigtiff_threshold
+    if signal.axes_manager.navigation_dimension == 0 and not bigtiff:
+        imsave(filename, data.squeeze(), **kwds)
+        return
+    if signal.axes_manager.navigation_dimension == 0:
+        images = [data.squeeze(),]
+    else:
+        images = np.rollaxis(
+            data, signal.axes_manager.navigation_axes[0].index_in_array, 0)
+    with TIFFStackWriter(filename, bigtiff=bigtiff,
+                         byteorder=kwds.get('byteorder')) as writer:
+        for image in images:
+            writer.append(image)
+
+def _map_pages(filename, pages, byte_order):
+    """Return a read-only memory-mapped array of the data of the pages
+    or None if the data of any of the pages cannot be mapped, e.g. 
+    because it is compressed.
+
+    """
+    shape = pages[0].shape
+    for page in pages:
+        if (page.is_tiled or page.is_palette or page.is_stk or
+                page.compression or page.dtype is None or
+                page.shape != shape or page.dtype != pages[0].dtype or
+                page.bits_per_sample not in (8, 16, 32, 64)):
+            return None
+    dtype = np.dtype(byte_order + pages[0].dtype)
+    frame_size = int(np.prod(shape)) * dtype.itemsize
+    offsets = []
+    for page in pages:
+        strip_offsets = page.strip_offsets
+        byte_counts = page.strip_byte_counts
+        if not isinstance(strip_offsets, (tuple, list)):
+            strip_offsets = (strip_offsets,)
+            byte_counts = (byte_counts,)
+        # The strips must be contiguous
+        if any(strip_offsets[i] + byte_counts[i] != strip_offsets[i + 1]
+               for i in xrange(len(strip_offsets) - 1)):
+            return None
+        offsets.append(strip_offsets[0])
+    strides = np.diff(offsets)
+    if len(pages) > 1 and (np.any(strides != strides[0]) or 
+                           strides[0] < frame_size):
+        return None
+    stride = int(strides[0]) if len(pages) > 1 else frame_size
+    file_size = os.path.getsize(filename)
+    if offsets[0] + stride * (len(pages) - 1) + frame_size > file_size:
+        return None
+    base = np.memmap(filename, dtype='uint8', mode='r', offset=offsets[0],
+                     shape=(stride * (len(pages) - 1) + frame_size,))
+    frame_strides = tuple(np.cumprod((1,) + shape[:0:-1])[::-1] *
+                          dtype.itemsize)
+    data = np.ndarray.__new__(np.memmap, (len(pages),) + shape,
+                              dtype=dtype, buffer=base,
+                              strides=(stride,) + frame_strides)
+    data._mmap = base._mmap
+    data.filename = base.filename
+    data.offset = base.offset
+    data.mode = base.mode
+    return data
+
+def _read_pages_lazily(filename, series=0, mmap_dir=None):
+    """Memory-map the pages of a series or, if that is not possible,
+    decode them one at a time into a memory-mapped temporary file.
+
+    """
+    tif = TIFFfile(filename)
+    try:
+        series = tif.series[series]
+        pages = series.pages
+        data = _map_pages(filename, pages, tif.byte_order)
+        if data is None:
+            tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+            data = np.memmap(tempf, dtype=series.dtype, mode='w+', 
+                             shape=(len(pages),) + pages[0].shape)
+            for i, page in enumerate(pages):
+                data[i] = page.asarray()
+            # The temporary file lives as long as the data or any view
+            # of it
+            data._temporary_file = tempf
+    finally:
+        tif._fd.close()
+    if len(pages) == 1:
+        data = data[0]
+    elif data.shape != tuple(series.shape):
+        try:
+            # Only a view, without copying
+            view = data.view()
+            view.shape = tuple(series.shape)
+            data = view
+        except AttributeError:
+            pass
+    return data
     
-    imsave(filename, signal.data.squeeze(), **kwds)
-    
-def file_reader(filename, output_level=0, record_by='image',**kwds):
+def file_reader(filename, output_level=0, record_by='image', lazy=False,
+                mmap_dir=None, **kwds):
     '''Read data from tif files using Christoph Gohlke's tifffile
     library
     
@@ -60,9 +305,22 @@ def file_reader(filename, output_level=0, record_by='image',**kwds):
     record_by: {'image'}
         Has no effect because this format only supports recording by
         image.
+    lazy : bool
+        If True the pages are not read on loading. Uncompressed pages 
+        stored equally spaced in the file, as written by Hyperspy, are
+        memory-mapped read-only. Otherwise the pages are decoded one at
+        a time into a memory-mapped temporary file, so the full stack 
+        is never stored in memory.
+    mmap_dir : {None, str}
+        The directory of the temporary file. If None the default 
+        temporary directory is used.
     
     '''
-    dc = imread(filename, **kwds)
+    if lazy is True:
+        dc = _read_pages_lazily(filename, series=kwds.get('series', 0),
+                                mmap_dir=mmap_dir)
+    else:
+        dc = imread(filename, **kwds)
     dt = 'image'    
     return [{'data':dc, 
              'mapped_parameters': { 'original_filename' : filename,
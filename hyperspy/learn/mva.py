@@ -636,11 +636,13 @@ class MVA():
         target=self.learning_results
 
         if mva_type.lower() == 'decomposition':
-            factors = target.factors
-            loadings = target.loadings.T
+            prefix = ''
         elif mva_type.lower() == 'bss':
-            factors = target.bss_factors
-            loadings = target.bss_loadings.T
+            prefix = 'bss_'
+        # Only read the columns of the components that are used
+        factors = target.get_components(prefix + 'factors', components)
+        loadings = target.get_components(prefix + 'loadings',
+                                         components).T
         if components is None:
             a = np.dot(factors,loadings)
             signal_name = 'model from %s with %i components' % (
@@ -841,10 +843,43 @@ class MVA():
         self.data=self._data_before_treatments
         del self._data_before_treatments
 
+class _LazyArray(object):
+    """Descriptor of the LearningResults arrays that can be stored
+    in a file and read on first access.
+
+    A value with a `read` method (e.g. the datasets returned by the
+    hdf5 reader) is kept as a reference and only read when the
+    attribute is accessed.
+
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return None
+        if self.name in instance.__dict__:
+            return instance.__dict__[self.name]
+        lazy_arrays = instance.__dict__.get('_lazy_arrays', {})
+        if self.name in lazy_arrays:
+            value = lazy_arrays.pop(self.name).read()
+            instance.__dict__[self.name] = value
+            return value
+        return None
+
+    def __set__(self, instance, value):
+        lazy_arrays = instance.__dict__.setdefault('_lazy_arrays', {})
+        lazy_arrays.pop(self.name, None)
+        instance.__dict__.pop(self.name, None)
+        if hasattr(value, 'read') and not isinstance(value, np.ndarray):
+            lazy_arrays[self.name] = value
+        else:
+            instance.__dict__[self.name] = value
+
 class LearningResults(object):
     # Decomposition
-    factors = None
-    loadings = None
+    factors = _LazyArray('factors')
+    loadings = _LazyArray('loadings')
     explained_variance = None
     explained_variance_ratio = None
     decomposition_algorithm = None
@@ -855,8 +890,8 @@ class LearningResults(object):
     # Unmixing
     bss_algorithm = None
     unmixing_matrix = None
-    bss_factors = None
-    bss_loadings = None
+    bss_factors = _LazyArray('bss_factors')
+    bss_loadings = _LazyArray('bss_loadings')
     # Shape
     unfolded = None
     original_shape = None
@@ -976,11 +1011,78 @@ class LearningResults(object):
         It is mainly useful to save memory and reduce the storage size
         """
         print "trimming to %i dimensions" % n
-        self.loadings = self.loadings[:,:n]
+        for attribute in ('loadings', 'factors'):
+            if self.is_lazy(attribute):
+                # Only the reference is cropped, nothing is read
+                self._lazy_arrays[attribute] = \
+                    self._lazy_arrays[attribute].crop(n)
+            else:
+                setattr(self, attribute, getattr(self, attribute)[:,:n])
         if self.explained_variance is not None:
             self.explained_variance = self.explained_variance[:n]
-        self.factors = self.factors[:,:n]
-        
+
+    def is_lazy(self, attribute):
+        """Returns True if the given array is stored in a file and
+        has not been read yet.
+
+        """
+        return attribute in self.__dict__.get('_lazy_arrays', {})
+
+    def get_components(self, attribute, comp_ids=None):
+        """Returns the columns of the factors or loadings that are
+        required to access the given components.
+
+        If the array is stored in a file and has not been read yet
+        only the required columns are read, and the array is not
+        cached.
+
+        Parameters
+        ----------
+        attribute : {'factors', 'loadings', 'bss_factors',
+            'bss_loadings'}
+        comp_ids : None, int, or list of ints
+            If None all the components are returned. If int, the
+            first `comp_ids` components are returned. If list of ints,
+            the columns up to the largest index are returned so that
+            the components keep their index.
+
+        Returns
+        -------
+        numpy array
+
+        """
+        if comp_ids is None:
+            ncolumns = None
+        elif hasattr(comp_ids, '__iter__'):
+            ncolumns = max(comp_ids) + 1
+        else:
+            ncolumns = comp_ids
+        if self.is_lazy(attribute):
+            return self._lazy_arrays[attribute].read(ncolumns)
+        array = getattr(self, attribute)
+        if array is None or ncolumns is None:
+            return array
+        return array[:,:ncolumns]
+
+    def load_lazy_arrays(self):
+        """Read into memory all the arrays that are stored in a file
+        and have not been read yet.
+
+        """
+        for attribute in self.__dict__.get('_lazy_arrays', {}).keys():
+            getattr(self, attribute)
+
+    def _get_dictionary(self):
+        """Returns a dictionary of the results, with the arrays that
+        have not been read yet as file references.
+
+        """
+        dictionary = dict([(key, value) for key, value in
+                           self.__dict__.iteritems()
+                           if not key.startswith('_')])
+        dictionary.update(self.__dict__.get('_lazy_arrays', {}))
+        return dictionary
+
     def _transpose_results(self):
         (self.factors, self.loadings, self.bss_factors, 
             self.bss_loadings) = (self.loadings, self.factors, 
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Arrays stored in memory-mapped files that can be shared between
+processes without copying.
+
+A SharedArray is a numpy memmap that, when pickled, e.g. to send it to
+a worker of a multiprocessing pool, only transmits the name of the file
+and the position of the data in it. The unpickled array maps the same
+file and therefore any change made by the worker is visible in the
+parent process and viceversa.
+
+The files are created as temporary files that are deleted when the
+array that owns them, and all the views of it, are garbage collected
+in the process that created them. The processes that attached to the
+array keep a valid mapping after the deletion. To use RAM instead of
+disk storage create the files in a memory-backed filesystem e.g.
+/dev/shm in Linux.
+
+"""
+
+import mmap
+import tempfile
+
+import numpy as np
+
+
+class SharedArray(np.memmap):
+    """A memory-mapped array that is attached, not copied, when pickled.
+
+    Use `to_shared_array` to create one.
+
+    """
+
+    def __reduce__(self):
+        if self._mmap is None or self.filename is None:
+            # Not backed by a file (e.g. the result of an operation),
+            # pickle it as a standard array
+            return np.asarray(self).__reduce__()
+        mmap_address = np.frombuffer(self._mmap, dtype='uint8'
+                                     ).__array_interface__['data'][0]
+        mmap_start = self.offset - self.offset % mmap.ALLOCATIONGRANULARITY
+        position = (self.__array_interface__['data'][0] - mmap_address +
+                    mmap_start)
+        return (_attach_shared_array,
+                (self.filename, self.mode, self.dtype.str
+                    if self.dtype.names is None else self.dtype.descr,
+                 self.shape, self.strides, position))
+
+
+def _attach_shared_array(filename, mode, dtype, shape, strides,
+                         position):
+    """Map the region of the file that contains the array data.
+
+    Parameters
+    ----------
+    filename : str
+    mode : str
+        The memmap mode.
+    dtype : data-type
+    shape, strides : tuple
+    position : int
+        Position in bytes of the first element of the array in the
+        file.
+
+    Returns
+    -------
+    SharedArray
+
+    """
+    dtype = np.dtype(dtype)
+    if mode == 'w+':
+        # Opening the file in w+ mode would truncate it
+        mode = 'r+'
+    # Get the extent in bytes of the array taking into account that
+    # the strides can be negative
+    low = sum([(n - 1) * stride for n, stride in zip(shape, strides)
+               if stride < 0 and n > 0])
+    high = sum([(n - 1) * stride for n, stride in zip(shape, strides)
+                if stride > 0 and n > 0]) + dtype.itemsize
+    if 0 in shape:
+        low, high = 0, dtype.itemsize
+    base = SharedArray(filename, dtype='uint8', mode=mode,
+                       offset=position + low, shape=(high - low,))
+    array = np.ndarray.__new__(SharedArray, shape, dtype=dtype,
+                               buffer=base, offset=-low,
+                               strides=strides)
+    array._mmap = base._mmap
+    array.filename = base.filename
+    array.offset = base.offset
+    array.mode = base.mode
+    return array
+
+
+def to_shared_array(array, dir=None):
+    """Copy an array into a new temporary file and return it as a
+    SharedArray.
+
+    The file is deleted when the returned array and all its views are
+    garbage collected.
+
+    Parameters
+    ----------
+    array : numpy array
+    dir : {None, str}
+        The directory in which the file is created. If None, the
+        default temporary directory is used.
+
+    Returns
+    -------
+    SharedArray
+
+    """
+    array = np.asarray(array)
+    tempf = tempfile.NamedTemporaryFile(dir=dir,
+                                        prefix='hyperspy_shared-')
+    # Memory maps cannot be empty
+    shape = array.shape if array.size else (1,)
+    shared = SharedArray(tempf, dtype=array.dtype, mode='w+',
+                         shape=shape)
+    if array.size:
+        shared[...] = array
+    else:
+        shared = shared[:0].reshape(array.shape)
+    # The temporary file lives as long as the array or any view of
+    # it
+    shared._temporary_file = tempf
+    return shared
+
+
+def is_shared(array):
+    """Returns True if the array is a view of a shared memory-mapped
+    file.
+
+    """
+    return isinstance(array, SharedArray) and array._mmap is not None
@@ -316,34 +316,160 @@ def estimate_variance_parameters(noisy_signal, clean_signal, mask=None,
     if return_results is True:
         return results0
 
-def rebin(a, new_shape):
-    """Rebin SI
+def _get_rebin_edges(size, factor, new_size):
+    """Return the edges of the new bins in units of the old channels.
 
-    rebin ndarray data into a smaller ndarray of the same rank whose dimensions
-    are factors of the original dimensions. eg. An array with 6 columns and 4
-    rows can be reduced to have 6,3,2 or 1 columns and 4,2 or 1 rows.
-    example usages:
-    >>> a=rand(6,4); b=rebin(a,3,2)
-    >>> a=rand(6); b=rebin(a,2)
-    Adapted from scipy cookbook
+    Parameters
+    ----------
+    size : int
+        Number of channels of the original axis.
+    factor : float
+        Size of the new bins in units of the original channels.
+    new_size : int
+        Number of new bins.
+
+    Returns
+    -------
+    numpy array of length new_size + 1
+
+    """
+    edges = np.arange(new_size + 1) * float(factor)
+    # Guard against rounding errors pushing the last edge out of the
+    # axis
+    return np.clip(edges, 0, size)
+
+def _rebin_axis(a, axis, edges):
+    """Rebin one axis of an array conserving the total counts.
+
+    The data is considered constant within each channel, therefore a
+    channel that is only partially covered by a new bin contributes to
+    it proportionally to the covered fraction.
 
     Parameters
     ----------
     a : numpy array
-    new_shape : tuple
-        shape after binning
+    axis : int
+    edges : numpy array
+        The edges of the new bins in units of the channels of `a`.
 
     Returns
     -------
     numpy array
+
+    """
+    size = a.shape[axis]
+    new_size = len(edges) - 1
+    steps = np.diff(edges)
+    step = steps[0]
+    if (np.all(steps == step) and step == int(step) and
+            edges[0] == int(edges[0])):
+        # Integer binning: reshape and sum, it is faster and exact
+        start = int(edges[0])
+        step = int(step)
+        a = a[(slice(None),) * axis +
+              (slice(start, start + new_size * step), Ellipsis)]
+        shape = a.shape[:axis] + (new_size, step) + a.shape[axis + 1:]
+        return a.reshape(shape).sum(axis + 1)
+    # The cumulative sum at the integer edges plus the fraction of the
+    # channel where the edge lies gives the integral up to each edge
+    cs = np.zeros(a.shape[:axis] + (size + 1,) + a.shape[axis + 1:])
+    np.cumsum(a, axis=axis, dtype='float',
+              out=cs[(slice(None),) * axis + (slice(1, None), Ellipsis)])
+    indices = np.floor(edges).astype('int')
+    fractions = edges - indices
+    fractions_shape = [1] * a.ndim
+    fractions_shape[axis] = len(edges)
+    integral = cs.take(indices, axis=axis) + a.take(
+        np.clip(indices, 0, size - 1), axis=axis
+        ) * fractions.reshape(fractions_shape)
+    return np.diff(integral, axis=axis)
+
+def rebin(a, new_shape=None, scale=None, out=None, chunk_size=None):
+    """Rebin an array conserving the total counts.
+
+    The binning factors do not need to be integer divisors of the
+    shape, e.g. a 4096 channels spectrum can be binned by 2.5 to
+    obtain a 1638 channels spectrum. When a new bin covers a channel
+    only partially, the channel contributes to the bin proportionally
+    to the covered fraction.
+
+    The array is processed in chunks along its first axis, therefore
+    when `a` and `out` are memory-mapped arrays only a chunk of the
+    data is loaded into memory at any given time.
+
+    >>> a=rand(6,4); b=rebin(a,(3,2))
+    >>> a=rand(6); b=rebin(a,(2,))
+    >>> a=rand(4096); b=rebin(a,scale=(2.5,))
+
+    Parameters
+    ----------
+    a : numpy array
+    new_shape : {None, tuple of ints}
+        Shape after binning. The binning factor of each axis is
+        the ratio between the old and the new size.
+    scale : {None, tuple of floats}
+        The binning factor of each axis. Only used if `new_shape` is
+        None. The size of each axis after binning is the integer part
+        of the ratio between the old size and the binning factor and
+        the channels that do not fill a whole bin at the end of the
+        axis are discarded.
+    out : {None, numpy array}
+        If not None the result is stored in the given array, that can
+        be a memory-mapped array. It must have the right shape.
+    chunk_size : {None, int}
+        Number of elements of the first axis of the output that are
+        computed at once. If None it is chosen to keep the size of
+        each chunk of the input below 64 MB.
+
+    Returns
+    -------
+    numpy array
+
     """
     shape = a.shape
-    lenShape = len(shape)
-    factor = np.asarray(shape)/np.asarray(new_shape)
-    evList = ['a.reshape('] + \
-             ['new_shape[%d],factor[%d],'%(i,i) for i in xrange(lenShape)] + \
-             [')'] + ['.sum(%d)'%(i+1) for i in xrange(lenShape)]
-    return eval(''.join(evList))
+    if new_shape is not None:
+        if len(new_shape) != len(shape):
+            raise ValueError("new_shape must have %i elements" %
+                             len(shape))
+        new_shape = tuple([int(size) for size in new_shape])
+        scale = [size / float(new_size) for size, new_size in
+                 zip(shape, new_shape)]
+    elif scale is not None:
+        if len(scale) != len(shape):
+            raise ValueError("scale must have %i elements" %
+                             len(shape))
+        new_shape = tuple([int(size / float(factor) + 1e-10)
+                           for size, factor in zip(shape, scale)])
+    else:
+        raise ValueError("Please provide either new_shape or scale")
+    if min(new_shape) < 1:
+        raise ValueError("The new shape %s is not valid" %
+                         str(new_shape))
+    edges = [_get_rebin_edges(size, factor, new_size) for
+             size, factor, new_size in zip(shape, scale, new_shape)]
+    all_integer = np.all([np.all(e == np.round(e)) for e in edges])
+    if out is None:
+        if all_integer:
+            dtype = np.zeros(1, dtype=a.dtype).sum().dtype
+        else:
+            dtype = 'float'
+        out = np.empty(new_shape, dtype=dtype)
+    elif out.shape != new_shape:
+        raise ValueError("out must have shape %s" % str(new_shape))
+    if chunk_size is None:
+        row_size = a[:1].nbytes * scale[0]
+        chunk_size = max(1, int(2 ** 26 / max(row_size, 1)))
+    for j0 in xrange(0, new_shape[0], chunk_size):
+        j1 = min(j0 + chunk_size, new_shape[0])
+        chunk_edges = edges[0][j0:j1 + 1]
+        i0 = int(np.floor(chunk_edges[0]))
+        i1 = min(int(np.ceil(chunk_edges[-1])), shape[0])
+        chunk = np.asarray(a[i0:i1])
+        chunk = _rebin_axis(chunk, 0, chunk_edges - i0)
+        for axis in xrange(1, len(shape)):
+            chunk = _rebin_axis(chunk, axis, edges[axis])
+        out[j0:j1] = chunk
+    return out
 
 def estimate_drift(im1,im2):
     """Estimate the drift  between two images by cross-correlation
@@ -1086,6 +1212,27 @@ def slugify(value, valid_variable_name=False):
             value = u'Number_' + value
     return value
     
+class LazyNode(object):
+    """A DictionaryBrowser node which content is only read when it is
+    accessed for the first time.
+
+    Parameters
+    ----------
+    loader : function
+        A function without arguments that returns the dictionary of
+        the node.
+
+    """
+    def __init__(self, loader):
+        self.loader = loader
+
+    def load(self):
+        return DictionaryBrowser(self.loader())
+
+    def __repr__(self):
+        return '<not loaded>'
+
+
 class DictionaryBrowser(object):
     """A class to comfortably access some parameters as attributes"""
 
@@ -1118,6 +1265,7 @@ class DictionaryBrowser(object):
         j = 0
         for key_, value in self.__dict__.iteritems():
             if type(key_) != types.MethodType:
+                self._load_lazy_node(value)
                 key = ensure_unicode(value['key'])
                 value = ensure_unicode(value['value'])
                 if isinstance(value, DictionaryBrowser):
@@ -1161,9 +1309,15 @@ class DictionaryBrowser(object):
     def __getattribute__(self,name):
         item = super(DictionaryBrowser,self).__getattribute__(name)
         if isinstance(item, dict) and 'value' in item:
+            DictionaryBrowser._load_lazy_node(item)
             return item['value']
         else:
             return item
+
+    @staticmethod
+    def _load_lazy_node(item):
+        if isinstance(item['value'], LazyNode):
+            item['value'] = item['value'].load()
             
     def __setattr__(self, key, value):
         if isinstance(value, dict):
@@ -1182,6 +1336,7 @@ class DictionaryBrowser(object):
         par_dict = {}
         for key_, item_ in self.__dict__.iteritems():
             if type(item_) != types.MethodType:
+                self._load_lazy_node(item_)
                 key = item_['key']
                 if isinstance(item_['value'], DictionaryBrowser):
                     item = item_['value'].as_dictionary()
@@ -205,8 +205,7 @@ def read_char(f, endian):
         return s.unpack(data)[0]
 
 def read_data_array(filename, byte_size=0, byte_address=0,
-                    data_type='uint8', write=True):
-    # inspired by numpy's memmap
+                    data_type='uint8', write=True, copy=True):
     """Return a 1-D numpy ndarray from data contained in a binary file.
 
     Parameters:
@@ -227,36 +226,33 @@ def read_data_array(filename, byte_size=0, byte_address=0,
         The data-type used to interpret the file contents.
         Default is 'uint8'.
     write : bool, optional
-        Whether the output array should be writeable
+        Whether the output array should be writeable. Only used if
+        copy is True.
+    copy : bool, optional
+        If True (default) the data is read into memory. Otherwise a 
+        read-only numpy memmap of the data is returned and the data
+        is only read from the disk when it is accessed.
     """
     # import here to minimize import overhead
-    import mmap
     import numpy as np
     if hasattr(filename,'read'):
         fobj = filename
     else:
-        fobj = file(filename, 'r+b')
+        fobj = file(filename, 'rb')
     if byte_size == 0:
-        byte_size = os.fstat(fobj.fileno())[6]
-    # To be fast, we want to map just the bytes of the file
-    # where the image data is stored. However, the module mmap
-    # only allows one to offset at multiples of ALLOCATIONGRANULARITY,
-    # so we must set up a little trick to map as little bytes
-    # as possible (see also mmap documentation).
-    byte_remainder = byte_address % mmap.ALLOCATIONGRANULARITY
-    byte_offset = byte_address - byte_remainder
-    map_bytes = byte_remainder + byte_size
+        byte_size = os.fstat(fobj.fileno())[6] - byte_address
     dt = np.dtype(data_type).itemsize
     size = byte_size // dt
-    shape = (size,)
-    bytes = byte_address + byte_size
-    acc = mmap.ACCESS_READ
-    fmap = mmap.mmap(fobj.fileno(), map_bytes, access=acc, offset=byte_offset)
-    fmap.seek(byte_remainder)
-    data =  np.ndarray(shape, data_type, fmap.read(byte_size))
-    data.setflags(write)
-    fmap.flush()
-    fmap.close()
+    if copy is True:
+        # Read the data directly into the array to avoid the
+        # intermediate copy of reading it as a string
+        fobj.seek(byte_address)
+        data = np.fromfile(fobj, dtype=data_type, count=size)
+        data.setflags(write=write)
+    else:
+        # numpy's memmap takes care of the mmap offset granularity
+        data = np.memmap(fobj, dtype=data_type, mode='r',
+                         offset=byte_address, shape=(size,))
     fobj.close()
     return data
 
@@ -19,10 +19,13 @@
 import copy
 import os
 import tempfile
+import time
 
 import numpy as np
 import numpy.linalg
 import scipy.odr as odr
+import scipy.sparse
+import scipy.sparse.linalg
 from scipy.optimize import (leastsq,
                             fmin,
                             fmin_cg,
@@ -39,17 +42,302 @@ from hyperspy import messages
 import hyperspy.drawing.spectrum
 from hyperspy.drawing.utils import on_figure_window_close
 from hyperspy.misc import progressbar
+from hyperspy.misc import shared_memory
 from hyperspy.signals.eels import EELSSpectrum, Spectrum
 from hyperspy.defaults_parser import preferences
 from hyperspy.axes import generate_axis
-from hyperspy.exceptions import WrongObjectError
+from hyperspy.exceptions import WrongObjectError, NavigationDimensionError
 from hyperspy.decorators import interactive_range_selector
 from hyperspy.misc.mpfit.mpfit import mpfit
+from hyperspy.component import batch_notifications
 from hyperspy.axes import AxesManager
 from hyperspy.drawing.widgets import (DraggableVerticalLine,
                                       DraggableLabel)
 
 
+# The per-spectrum fit diagnostics stored by `fit` in 
+# Model.diagnostics_map
+_diagnostics_dtype = np.dtype([('chisq', 'float'),
+                               ('red_chisq', 'float'),
+                               ('nfev', 'int'),
+                               ('status', 'int'),
+                               ('time', 'float'),
+                               ('message', 'S80'),
+                               ('is_set', 'bool')])
+
+
+# The status codes of the batch_lm fitter follow those of leastsq
+_batch_lm_messages = {
+    1 : 'The relative reduction of the sum of squares is at most ftol',
+    2 : 'The relative change of the parameters is at most xtol',
+    3 : 'Both sum of squares and parameter convergence',
+    4 : 'The gradient is at most gtol',
+    5 : 'The maximum number of iterations was reached',
+    6 : 'The sum of squares cannot be reduced'}
+
+
+def _split_in_blocks(iterable, size):
+    """Yields lists of size consecutive items of iterable (the last one
+    can be shorter).
+
+    """
+    block = []
+    for item in iterable:
+        block.append(item)
+        if len(block) == size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _serpentine_path(shape):
+    """Returns the indices of an array of the given shape in C order,
+    reversing the direction of each axis at every step of the previous
+    one so that consecutive indices are neighbours.
+
+    """
+    if len(shape) == 1:
+        return [(i,) for i in xrange(shape[0])]
+    inner = _serpentine_path(shape[1:])
+    path = []
+    for i in xrange(shape[0]):
+        path.extend([(i,) + index for index in 
+                     (inner if i % 2 == 0 else inner[::-1])])
+    return path
+
+def _hilbert_path(shape):
+    """Returns the indices of a 2D array of the given shape in the
+    order of the Hilbert curve that covers it.
+
+    """
+    order = 1
+    while order < max(shape):
+        order *= 2
+    path = []
+    for d in xrange(order * order):
+        x = y = 0
+        t = d
+        s = 1
+        while s < order:
+            rx = 1 & (t // 2)
+            ry = 1 & (t ^ rx)
+            if ry == 0:
+                if rx == 1:
+                    x = s - 1 - x
+                    y = s - 1 - y
+                x, y = y, x
+            x += s * rx
+            y += s * ry
+            t //= 4
+            s *= 2
+        if x < shape[0] and y < shape[1]:
+            path.append((x, y))
+    return path
+
+def _spiral_path(shape, seed=None):
+    """Returns the indices of an array of the given shape sorted by
+    their distance (in the maximum norm) to the seed index, by default
+    the centre. In 2D the indices at the same distance are sorted by
+    angle, describing a spiral.
+
+    """
+    if seed is None:
+        seed = [size // 2 for size in shape]
+    indices = np.indices(shape).reshape((len(shape), -1)).T
+    offsets = indices - np.array(seed)
+    keys = [np.abs(offsets).max(1)]
+    if len(shape) == 2:
+        keys.insert(0, np.arctan2(offsets[:, 0], offsets[:, 1]))
+    return [tuple(index) for index in indices[np.lexsort(keys)]]
+
+def navigation_path(shape, iterpath='flyback', seed=None):
+    """Returns the list of the indices of an array of the given shape
+    in the order defined by iterpath.
+
+    Parameters
+    ----------
+    shape : tuple of ints
+    iterpath : {'flyback', 'serpentine', 'hilbert', 'spiral'}
+        'flyback' is the C order. 'serpentine' reverses the direction
+        of the fastest axes at every row so that consecutive indices
+        are neighbours. 'hilbert' follows a Hilbert curve (only 2D).
+        'spiral' starts at the seed and goes around it.
+    seed : {None, tuple of ints}
+        The first index of the 'spiral' path. If None, the centre.
+
+    Returns
+    -------
+    list of tuples
+
+    """
+    shape = tuple(shape)
+    if iterpath == 'flyback':
+        return list(np.ndindex(*shape))
+    elif iterpath == 'serpentine':
+        return _serpentine_path(shape)
+    elif iterpath == 'hilbert':
+        if len(shape) != 2:
+            raise ValueError(
+                "The hilbert path requires two navigation dimensions")
+        return _hilbert_path(shape)
+    elif iterpath == 'spiral':
+        return _spiral_path(shape, seed)
+    else:
+        raise ValueError("Unknown iterpath: %s" % iterpath)
+
+
+def _resample_map(map_, shape):
+    """Nearest neighbour resampling of a parameter map to shape.
+
+    Each element of the new map takes the value of the element of the
+    original map that contains its centre, what works both for
+    reducing and for enlarging the map.
+
+    """
+    indices = [np.minimum(((np.arange(size) + 0.5) * old_size /
+                           float(size)).astype(int), old_size - 1)
+               for size, old_size in zip(shape, map_.shape)]
+    return map_[np.ix_(*indices)]
+
+
+def _interpolate_map(map_, shape):
+    """Linear interpolation of the values of a parameter map to shape.
+
+    If not all the values of the map are set, the nearest neighbour
+    is used instead.
+
+    """
+    resampled = _resample_map(map_, shape)
+    if not map_['is_set'].all():
+        return resampled
+    values = map_['values']
+    for axis, (size, old_size) in enumerate(zip(shape, map_.shape)):
+        position = np.clip((np.arange(size) + 0.5) * old_size / 
+                           float(size) - 0.5, 0, old_size - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, old_size - 1)
+        weight = (position - lower).reshape(
+            [-1] + [1] * (values.ndim - axis - 1))
+        values = (np.take(values, lower, axis) * (1 - weight) +
+                  np.take(values, upper, axis) * weight)
+    resampled['values'] = values
+    return resampled
+
+
+class ModelCube(object):
+    """Lazy view of the spectrum image generated by a model.
+
+    The model is only evaluated at the navigation positions that are
+    indexed, using the values stored in the parameters maps, so
+    creating the view does not allocate any memory. The channels
+    outside the fitting range are NaN. Only basic indexing (integers,
+    slices and Ellipsis) is supported.
+
+    To store the whole spectrum image in memory or in a memory-mapped
+    file use `Model.generate_data_from_model`.
+
+    Parameters
+    ----------
+    model : Model instance
+
+    Examples
+    --------
+    >>> m.model_cube[10, 20]  # The model at one position
+    >>> m.model_cube[..., 100]  # One channel of the model at all positions
+
+    """
+    dtype = np.dtype('float')
+
+    def __init__(self, model):
+        self.model = model
+
+    def __repr__(self):
+        return "<ModelCube, shape: %s>" % str(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def shape(self):
+        return self.model.spectrum.data.shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __array__(self, dtype=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+    def _get_current_spectrum(self, fill_value=np.nan):
+        """Returns the model at the current coordinates for all the
+        channels, with `fill_value` outside the fitting range.
+
+        """
+        model = self.model
+        model.charge(only_fixed=False)
+        spectrum = np.empty(model.axis.size)
+        spectrum[:] = fill_value
+        spectrum[model.channel_switches] = model.__call__(
+            non_convolved=not model.convolved, onlyactive=True)
+        return spectrum
+
+    def __getitem__(self, key):
+        model = self.model
+        if not isinstance(key, tuple):
+            key = (key,)
+        # Expand the Ellipsis and complete the key with full slices
+        for i, item in enumerate(key):
+            if item is Ellipsis:
+                key = (key[:i] + (slice(None),) * 
+                       (self.ndim - len(key) + 1) + key[i + 1:])
+                break
+        if len(key) > self.ndim:
+            raise IndexError("invalid index")
+        key = key + (slice(None),) * (self.ndim - len(key))
+        signal_index = model.axis.index_in_array
+        navigation_key = key[:signal_index] + key[signal_index + 1:]
+        signal_key = key[signal_index]
+        navigation_shape = (self.shape[:signal_index] + 
+                            self.shape[signal_index + 1:])
+        positions = np.asarray(np.arange(
+            int(np.prod(navigation_shape))).reshape(navigation_shape)[
+                navigation_key])
+        
+        # Backup the current values to restore them after evaluating
+        # the model at the requested positions
+        axes_manager = model.axes_manager
+        old_indices = axes_manager.indices
+        old_values = [(parameter, parameter.value, parameter.std) 
+                      for component in model 
+                      for parameter in component.parameters
+                      if parameter.twin is None]
+        spectra = np.empty((positions.size, model.axis.size))
+        try:
+            for i, position in enumerate(positions.ravel()):
+                if navigation_shape:
+                    axes_manager.indices = np.unravel_index(
+                        position, navigation_shape)
+                spectra[i] = self._get_current_spectrum()
+        finally:
+            if navigation_shape:
+                axes_manager.indices = old_indices
+            for parameter, value, std in old_values:
+                parameter.value = value
+                parameter.std = std
+        spectra = spectra[:, signal_key]
+        data = spectra.reshape(positions.shape + spectra.shape[1:])
+        if data.ndim > positions.ndim:
+            # Move the signal axis to its position in the output
+            destination = len([item for item in key[:signal_index]
+                               if isinstance(item, slice)])
+            data = np.rollaxis(data, data.ndim - 1, destination)
+        return data
+
+
 class Model(list):
     """Build and fit a model
     
@@ -66,12 +354,18 @@ class Model(list):
         self.axes_manager = self.spectrum.axes_manager
         self.axis = self.axes_manager.signal_axes[0]
         self.axes_manager.connect(self.charge)
+        self._create_diagnostics_map()
+        self._reset_fit_profile()
          
         self.free_parameters_boundaries = None
-        # TODO: model cube should dissapear or at least be an option
-        self.model_cube = np.zeros(self.spectrum.data.shape, 
-                                   dtype = 'float')
-        self.model_cube[:] = np.nan
+        self._free_parameters = []
+        self._free_parameters_vector = None
+        self._static_components = set()
+        self._static_baseline = None
+        self.clear_component_cache()
+        self._keep_component_cache = False
+        self._model_cube = None
+        self._initial_values = None
         self.channel_switches=np.array([True] * len(self.axis.axis))
         self._low_loss = None
         self._position_widgets = []
@@ -88,6 +382,24 @@ class Model(list):
         else:
             raise WrongObjectError(str(type(value)), 'Spectrum')
                     
+    @property
+    def model_cube(self):
+        """The spectrum image generated by the model.
+
+        Until `generate_data_from_model` is called it is a `ModelCube`
+        lazy view that evaluates the model from the parameters maps
+        only at the indexed positions.
+
+        """
+        if self._model_cube is None:
+            return ModelCube(self)
+        return self._model_cube
+
+    @model_cube.setter
+    def model_cube(self, value):
+        self._model_cube = value
+        self._model_cube_temporary_file = None
+
     @property
     def low_loss(self):
         return self._low_loss
@@ -176,28 +488,202 @@ class Model(list):
                 parameter.disconnect(self.update_plot)
     
 
-    def generate_data_from_model(self, out_of_range_to_nan=True):
+    def generate_data_from_model(self, out_of_range_to_nan=True,
+                                 dtype='float', mmap=False,
+                                 mmap_dir=None):
         """Generate a SI with the current model
         
-        The SI is stored in self.model_cube
+        The SI is stored in self.model_cube. Note that it is not
+        necessary to generate the SI to access the model at some
+        positions, as model_cube is evaluated lazily until this
+        method is called.
+
+        Parameters
+        ----------
+        out_of_range_to_nan : bool
+            If True the channels outside the fitting range are set to
+            NaN, otherwise they are set to zero. A ValueError is 
+            raised if it is True and the dtype cannot store NaN, e.g.
+            integer dtypes.
+        dtype : numpy dtype
+            The data type of the SI.
+        mmap : bool
+            If True the SI is stored in a memory-mapped temporary
+            file.
+        mmap_dir : {None, str}
+            If mmap_dir is not None and mmap is True the memory
+            mapped file will be created in the given directory,
+            otherwise the default directory is used.
+
         """
+        if out_of_range_to_nan is True and \
+                np.dtype(dtype).kind not in ('f', 'c'):
+            raise ValueError(
+                "The channels outside the fitting range cannot be set "
+                "to NaN with the %s dtype. Set out_of_range_to_nan to "
+                "False." % np.dtype(dtype).name)
+        shape = self.spectrum.data.shape
+        tempf = None
+        if mmap is True:
+            tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+            model_cube = np.memmap(tempf, dtype=dtype, mode='w+',
+                                   shape=shape)
+        else:
+            model_cube = np.empty(shape, dtype=dtype)
+        fill_value = np.nan if out_of_range_to_nan is True else 0
+        lazy_cube = ModelCube(self)
         maxval = self.axes_manager.navigation_size
         if maxval > 0:
             pbar = progressbar.progressbar(maxval=maxval)
         i = 0
         for index in self.axes_manager:
-            self.charge(only_fixed=False)
-            self.model_cube[self.axes_manager._getitem_tuple][
-            self.channel_switches] = self.__call__(
-                non_convolved=not self.convolved, onlyactive=True)
-            if out_of_range_to_nan is True:
-                self.model_cube[self.axes_manager._getitem_tuple][
-                self.channel_switches == False] = np.nan
+            model_cube[tuple(self.axes_manager._getitem_tuple)] = \
+                lazy_cube._get_current_spectrum(fill_value=fill_value)
             i += 1
             if maxval > 0:
                 pbar.update(i)
-        pbar.finish()
+        if maxval > 0:
+            pbar.finish()
+        self.model_cube = model_cube
+        # Store the temporary file in the model to avoid its deletion
+        # when garbage collecting
+        self._model_cube_temporary_file = tempf
         
+    def _create_diagnostics_map(self):
+        shape = self.axes_manager.navigation_shape
+        if len(shape) == 1 and shape[0] == 0:
+            shape = [1,]
+        self.diagnostics_map = np.zeros(shape, _diagnostics_dtype)
+        for field in ('chisq', 'red_chisq', 'time'):
+            self.diagnostics_map[field][:] = np.nan
+
+    def _reset_fit_profile(self):
+        self._fit_profile = {'model_function' : 0.,
+                             'jacobian' : 0.,
+                             'plotting' : 0.,
+                             'total' : 0.,
+                             'nfev' : 0,
+                             'njev' : 0,
+                             'fits' : 0}
+
+    def get_fit_profile(self):
+        """Returns the time spent by the fits since the last call to 
+        `multifit` (or to `fit` outside `multifit`).
+
+        Returns
+        -------
+        dictionary with the keys:
+        'total' : the wall time of the fits in seconds.
+        'model_function' : the time spent evaluating the components.
+        'jacobian' : the time spent evaluating the analytical 
+            gradients.
+        'plotting' : the time spent updating the plot.
+        'other' : the rest of the time, i.e. the optimizer and the
+            Python overhead.
+        'nfev', 'njev' : the number of evaluations of the model and of
+            the jacobian.
+        'fits' : the number of fits.
+
+        See Also
+        --------
+        print_fit_profile, diagnostics_as_signal
+
+        """
+        profile = self._fit_profile.copy()
+        profile['other'] = max(0., profile['total'] - 
+                               profile['model_function'] - 
+                               profile['jacobian'] - 
+                               profile['plotting'])
+        return profile
+
+    def print_fit_profile(self):
+        """Print the time spent by the fits. See `get_fit_profile`."""
+        profile = self.get_fit_profile()
+        total = profile['total']
+        print "Fits: %i  Function evaluations: %i  Jacobian evaluations: %i"\
+            % (profile['fits'], profile['nfev'], profile['njev'])
+        for key in ('model_function', 'jacobian', 'plotting', 'other'):
+            print "%-15s %10.3f s (%5.1f %%)" % (
+                key.replace('_', ' ').capitalize(), profile[key], 
+                100. * profile[key] / total if total else 0.)
+        print "%-15s %10.3f s" % ('Total', total)
+
+    def diagnostics_as_signal(self, field='red_chisq'):
+        """Get a map of the diagnostics of the fit as a signal object.
+
+        The diagnostics are stored by `fit` in the `diagnostics_map`
+        structured array, that also contains the message of the fitter
+        in the 'message' field.
+
+        Parameters
+        ----------
+        field : {'chisq', 'red_chisq', 'nfev', 'status', 'time', 
+                 'is_set'}
+            The chi-square (weighted if the fit is weighted) and the 
+            reduced chi-square, the number of evaluations of the 
+            model, the status code returned by the fitter (the `ier` 
+            output of leastsq, the `status` of mpfit, the `info` of 
+            odr and -1 for the rest), and the wall time of the fit in 
+            seconds.
+
+        Raises
+        ------
+        NavigationDimensionError : if the navigation dimension is 0
+
+        """
+        from hyperspy.signal import Signal
+        if self.axes_manager.navigation_dimension == 0:
+            raise NavigationDimensionError(0, '>0')
+        if field not in _diagnostics_dtype.names or field == 'message':
+            raise ValueError("Unknown field: %s" % field)
+        s = Signal(
+            {'data' : self.diagnostics_map[field],
+             'axes' : self.axes_manager._get_navigation_axes_dicts()})
+        s.mapped_parameters.title = field
+        for axis in s.axes_manager.axes:
+            axis.navigate = False
+        return s
+
+    def _get_fit_status(self, fitter, args):
+        """Returns the chi-square, status code and message of the last
+        fit.
+
+        """
+        residuals = None
+        status = -1
+        message = ''
+        if fitter == 'leastsq':
+            residuals = self.fit_output[2]['fvec']
+            status = self.fit_output[4]
+            message = self.fit_output[3]
+        elif fitter == 'mpfit':
+            status = self.fit_output.status
+            message = self.fit_output.errmsg
+        elif fitter == 'odr':
+            status = self.fit_output.info
+            message = '; '.join(self.fit_output.stopreason)
+        if residuals is None:
+            residuals = self._errfunc(np.array(self.p0, dtype='float'),
+                                      *args)
+        return np.sum(residuals ** 2), status, message
+
+    def _store_fit_diagnostics(self, chisq, status, message, nfev, 
+                               fit_time):
+        indices = self.axes_manager.indices
+        # If it is a single spectrum indices is ()
+        if not indices:
+            indices = (0,)
+        dof = self.channel_switches.sum() - len(self.p0)
+        diagnostics = self.diagnostics_map[indices]
+        diagnostics['chisq'] = chisq
+        diagnostics['red_chisq'] = chisq / dof if dof > 0 else np.nan
+        diagnostics['nfev'] = nfev
+        diagnostics['status'] = status
+        diagnostics['time'] = fit_time
+        diagnostics['message'] = str(message)[:80]
+        diagnostics['is_set'] = True
+        self.diagnostics_map[indices] = diagnostics
+
     def _get_auto_update_plot(self):
         if self._plot is not None and self._plot.is_active() is True:
             return True
@@ -226,13 +712,162 @@ class Model(list):
 #            print "The red_chisq could not been calculated"
 
     def _set_p0(self):
-        self.p0 = ()
-        for component in self:
-            if component.active:
-                for parameter in component.free_parameters:
-                    self.p0 = (self.p0 + (parameter.value,) 
-                    if parameter._number_of_elements == 1
-                    else self.p0 + parameter.value)
+        """Store the values of the free parameters of the active
+        components in a contiguous vector and set p0 to a copy of it.
+
+        While fitting, the free parameters are bound to the vector, so
+        the model can be charged with the parameters of the optimizer
+        with a single array copy. See `_charge_free_parameters`.
+
+        """
+        self._unbind_free_parameters()
+        self._free_parameters = [parameter 
+                                 for component in self if component.active
+                                 for parameter in component.free_parameters]
+        self._free_parameters_vector = np.zeros(
+            sum([parameter._number_of_elements 
+                 for parameter in self._free_parameters]))
+        index = 0
+        for parameter in self._free_parameters:
+            parameter._bind_to_vector(self._free_parameters_vector, index)
+            index += parameter._number_of_elements
+        # The external bounding must be applied by the value setter
+        self._fast_charge = not np.any([parameter.ext_bounded 
+                                        for parameter in 
+                                        self._free_parameters])
+        # The parameters whose changes must be notified when charging
+        # the vector, e.g. to recompute the EELSCLEdge cross-section
+        self._notifying_parameters = []
+        index = 0
+        for parameter in self._free_parameters:
+            if parameter.connected_functions:
+                self._notifying_parameters.append((parameter, index))
+            index += parameter._number_of_elements
+        self.p0 = self._free_parameters_vector.copy()
+
+    def _unbind_free_parameters(self):
+        for parameter in self._free_parameters:
+            parameter._unbind_from_vector()
+        self._free_parameters = []
+        self._free_parameters_vector = None
+
+    def clear_component_cache(self):
+        """Clear the cache of the evaluated components and reset its
+        statistics. See `get_component_cache_info`.
+
+        """
+        self._component_cache = {}
+        self._component_cache_hits = 0
+        self._component_cache_misses = 0
+        # The components whose function does not accept arrays of
+        # parameter values. See _component_fd_jacobian
+        self._scalar_components = set()
+
+    def get_component_cache_info(self):
+        """Returns the statistics of the cache of the evaluated
+        components.
+
+        While fitting, the components without free parameters are
+        evaluated once per fit and the result is stored in a cache
+        together with the values of their parameters, the axis and
+        the signal range. A component is only evaluated again if any
+        of them changes. The cache is cleared when `fit` is called
+        outside `multifit` and when `multifit` starts.
+
+        Returns
+        -------
+        dictionary with the keys 'hits', 'misses' and 'size'.
+
+        """
+        return {'hits' : self._component_cache_hits,
+                'misses' : self._component_cache_misses,
+                'size' : len(self._component_cache)}
+
+    def _evaluate_component(self, component, axis, axis_key):
+        """Returns component.function(axis), memoized on the values of
+        the parameters and axis_key. The returned array must not be
+        modified.
+
+        """
+        key = (axis_key, tuple([parameter.value 
+                                for parameter in component.parameters]))
+        cached = self._component_cache.get(component)
+        if cached is not None and cached[0] == key:
+            self._component_cache_hits += 1
+            return cached[1]
+        self._component_cache_misses += 1
+        value = component.function(axis)
+        self._component_cache[component] = (key, value)
+        return value
+
+    def _set_static_baseline(self):
+        """Sum the active components without free parameters, which do
+        not change while fitting the current spectrum.
+
+        """
+        self._static_components = set([component for component in self
+            if component.active and not component.free_parameters and
+            np.all([parameter.twin is None 
+                    for parameter in component.parameters])])
+        switches_key = self.channel_switches.tostring()
+        if self.convolved is False:
+            axis = self.axis.axis[self.channel_switches]
+            baseline = np.zeros(len(axis))
+            for component in self._static_components:
+                baseline = baseline + self._evaluate_component(
+                    component, axis, (id(self.axis.axis), switches_key))
+        else:
+            baseline = np.zeros(len(self.axis.axis))
+            sum_convolved = np.zeros(len(self.convolution_axis))
+            for component in self._static_components:
+                if component.convolved is True:
+                    sum_convolved = sum_convolved + \
+                        self._evaluate_component(component,
+                            self.convolution_axis, 
+                            id(self.convolution_axis))
+                else:
+                    baseline = baseline + self._evaluate_component(
+                        component, self.axis.axis, id(self.axis.axis))
+            if np.any(sum_convolved):
+                baseline += np.convolve(self.low_loss(self.axes_manager),
+                                        sum_convolved, mode="valid")
+            baseline = baseline[self.channel_switches]
+        self._static_baseline = baseline
+
+    def _reset_static_baseline(self):
+        self._static_components = set()
+        self._static_baseline = None
+
+    def _charge_free_parameters(self, param):
+        """Charge the free parameters of the active components from the
+        `param` vector of the optimizer.
+
+        """
+        vector = self._free_parameters_vector
+        if (vector is not None and self._fast_charge is True and
+                len(param) == len(vector)):
+            changed = [parameter for parameter, index in 
+                       self._notifying_parameters if np.any(
+                       vector[index:index + 
+                              parameter._number_of_elements] != 
+                       param[index:index + 
+                             parameter._number_of_elements])]
+            vector[:] = param
+            if changed:
+                # Each connected function is called only once
+                with batch_notifications(changed) as batch:
+                    for parameter in changed:
+                        for f in parameter.connected_functions:
+                            batch.add(f, parameter)
+        else:
+            counter = 0
+            with self.batch_notifications():
+                for component in self:
+                    if component.active:
+                        component.charge(param[counter:counter + 
+                                               component._nfree_param], 
+                                         onlyfree=True)
+                        counter += component._nfree_param
     
     def set_boundaries(self):
         """Generate the boundary list.
@@ -287,21 +922,41 @@ class Model(list):
             If True, only the fixed parameters will be charged.
             
         """
-        switch_aap = (False != self._get_auto_update_plot())
-        if switch_aap is True:
-            self._disconnect_parameters2update_plot()
+        with self.batch_notifications() as batch:
+            for component in self:
+                component.charge_value_from_map(only_fixed=only_fixed)
+            if self._get_auto_update_plot() is True:
+                batch.add(self.update_plot)
+
+    def batch_notifications(self):
+        """Context manager that defers the functions connected to the
+        components and parameters of the model, e.g. the plot update,
+        until it ends, calling each of them only once.
+
+        `charge` and the fitting functions batch the notifications
+        automatically.
+
+        Examples
+        --------
+        >>> with m.batch_notifications():
+        ...     for component in m:
+        ...         component.active = False
+
+        """
+        objects = []
         for component in self:
-            component.charge_value_from_map(only_fixed=only_fixed)
-        if switch_aap is True:
-            self._connect_parameters2update_plot()
-            self.update_plot()
+            objects.append(component)
+            objects.extend(component.parameters)
+        return batch_notifications(objects)
 
     def update_plot(self):
         if self.spectrum._plot is not None:
+            start = time.time()
             try:
                 self.spectrum._plot.signal_plot.ax_lines[1].update()
             except:
                 self._disconnect_parameters2update_plot()
+            self._fit_profile['plotting'] += time.time() - start
                 
     def _charge_p0(self, p_std = None):
         """Charge the free data for the current coordinates (x,y) from the
@@ -314,14 +969,16 @@ class Model(list):
         """
         comp_p_std = None
         counter = 0
-        for component in self: # Cut the parameters list
-            if component.active is True:
-                if p_std is not None:
-                    comp_p_std = p_std[counter: counter + component._nfree_param]
-                component.charge(
-                self.p0[counter: counter + component._nfree_param], 
-                comp_p_std, onlyfree = True)
-                counter += component._nfree_param
+        with self.batch_notifications():
+            for component in self: # Cut the parameters list
+                if component.active is True:
+                    if p_std is not None:
+                        comp_p_std = p_std[
+                            counter: counter + component._nfree_param]
+                    component.charge(
+                    self.p0[counter: counter + component._nfree_param], 
+                    comp_p_std, onlyfree = True)
+                    counter += component._nfree_param
 
     # Defines the functions for the fitting process -------------------------
     def _model2plot(self, axes_manager, out_of_range2nans=True):
@@ -504,50 +1161,62 @@ class Model(list):
             self.update_plot()
 
     def _model_function(self,param):
+        start = time.time()
+        self._fit_profile['nfev'] += 1
+        try:
+            return self._evaluate_model_function(param)
+        finally:
+            self._fit_profile['model_function'] += time.time() - start
 
+    def _evaluate_model_function(self, param):
+        self._charge_free_parameters(param)
+        # The components without free parameters are summed in the
+        # static baseline when the fit starts
+        static = self._static_components
         if self.convolved is True:
-            counter = 0
             sum_convolved = np.zeros(len(self.convolution_axis))
             sum = np.zeros(len(self.axis.axis))
             for component in self: # Cut the parameters list
-                if component.active is True:
+                if component.active is True and component not in static:
                     if component.convolved is True:
-                        np.add(sum_convolved, component(param[\
-                        counter:counter+component._nfree_param],
+                        np.add(sum_convolved, component.function(
                         self.convolution_axis), sum_convolved)
                     else:
-                        np.add(sum, component(param[counter:counter + \
-                        component._nfree_param], self.axis.axis), sum)
-                    counter+=component._nfree_param
+                        np.add(sum, component.function(self.axis.axis),
+                               sum)
 
-            return (sum + np.convolve(self.low_loss(self.axes_manager), 
-                                      sum_convolved,mode="valid"))[
-                                      self.channel_switches]
+            sum = (sum + np.convolve(self.low_loss(self.axes_manager), 
+                                     sum_convolved,mode="valid"))[
+                                     self.channel_switches]
+            if self._static_baseline is not None:
+                sum += self._static_baseline
+            return sum
 
         else:
             axis = self.axis.axis[self.channel_switches]
-            counter = 0
-            first = True
+            if self._static_baseline is not None:
+                sum = self._static_baseline.copy()
+            else:
+                sum = np.zeros(len(axis))
             for component in self: # Cut the parameters list
-                if component.active is True:
-                    if first is True:
-                        sum = component(param[counter:counter + \
-                        component._nfree_param],axis)
-                        first = False
-                    else:
-                        sum += component(param[counter:counter + \
-                        component._nfree_param], axis)
-                    counter += component._nfree_param
+                if component.active is True and component not in static:
+                    sum += component.function(axis)
             return sum
 
-    def _jacobian(self,param, y, weights=None):
+    def _jacobian(self, param, y, weights=None):
+        start = time.time()
+        self._fit_profile['njev'] += 1
+        try:
+            return self._evaluate_jacobian(param, y, weights)
+        finally:
+            self._fit_profile['jacobian'] += time.time() - start
+
+    def _evaluate_jacobian(self, param, y, weights=None):
         if self.convolved is True:
-            counter = 0
-            grad = np.zeros(len(self.axis.axis))
+            grad = []
+            self._charge_free_parameters(param)
             for component in self: # Cut the parameters list
                 if component.active:
-                    component.charge(param[counter:counter + \
-                    component._nfree_param] , onlyfree = True)
                     if component.convolved:
                         for parameter in component.free_parameters :
                             par_grad = np.convolve(
@@ -561,8 +1230,7 @@ class Model(list):
                                     self.convolution_axis), 
                                     self.low_loss(self.axes_manager), 
                                     mode="valid"), par_grad)
-                            grad = np.vstack((grad, par_grad))
-                        counter += component._nfree_param
+                            grad.append(par_grad)
                     else:
                         for parameter in component.free_parameters :
                             par_grad = parameter.grad(self.axis.axis)
@@ -570,33 +1238,167 @@ class Model(list):
                                 for parameter in parameter._twins:
                                     np.add(par_grad, parameter.grad(
                                     self.axis.axis), par_grad)
-                            grad = np.vstack((grad, par_grad))
-                        counter += component._nfree_param
+                            grad.append(par_grad)
+            grad = np.vstack(grad)
             if weights is None:
-                return grad[1:, self.channel_switches]
+                return grad[:, self.channel_switches]
             else:
-                return grad[1:, self.channel_switches] * weights
+                return grad[:, self.channel_switches] * weights
         else:
             axis = self.axis.axis[self.channel_switches]
-            counter = 0
-            grad = axis
+            grad = []
+            self._charge_free_parameters(param)
             for component in self: # Cut the parameters list
                 if component.active:
-                    component.charge(param[counter:counter + \
-                    component._nfree_param] , onlyfree = True)
                     for parameter in component.free_parameters :
                         par_grad = parameter.grad(axis)
                         if parameter._twins:
                             for parameter in parameter._twins:
                                 np.add(par_grad, parameter.grad(
                                 axis), par_grad)
-                        grad = np.vstack((grad, par_grad))
-                    counter += component._nfree_param
+                        grad.append(par_grad)
+            grad = np.vstack(grad)
             if weights is None:
-                return grad[1:,:]
+                return grad
             else:
-                return grad[1:,:] * weights
+                return grad * weights
         
+    def _evaluate_component_rows(self, component, axis):
+        """Evaluate the component with the model axis and the signal 
+        range, convolving it if required.
+
+        """
+        if self.convolved is True and component.convolved is True:
+            values = component.function(self.convolution_axis)
+            low_loss = self.low_loss(self.axes_manager)
+            if values.ndim == 1:
+                return np.convolve(low_loss, values, mode="valid")[
+                    self.channel_switches]
+            return np.array([np.convolve(low_loss, row, mode="valid")
+                             for row in values])[:, self.channel_switches]
+        elif self.convolved is True:
+            return component.function(self.axis.axis)[
+                ..., self.channel_switches]
+        else:
+            return component.function(axis)
+
+    def _component_fd_jacobian(self, component, axis):
+        """Returns a dictionary parameter: derivative of the model with
+        respect to the free parameters of the component estimated by
+        forward differences.
+
+        Only the component (and the components with parameters 
+        twinned to its free parameters) depends on its free 
+        parameters, so only it is evaluated. If possible, the 
+        parameters are bound to an array with one column per 
+        perturbation so that a single call to the component function
+        evaluates all the perturbations.
+
+        """
+        free_parameters = list(component.free_parameters)
+        steps = []
+        for parameter in free_parameters:
+            value = np.array(parameter.value, dtype='float', ndmin=1)
+            # As in MINPACK
+            step = np.sqrt(np.finfo(float).eps) * np.abs(value)
+            step[step == 0] = np.sqrt(np.finfo(float).eps)
+            steps.append(step)
+        derivatives = {}
+        vectorize = component not in self._scalar_components and not \
+            np.any([parameter._twins or parameter.twin is not None or 
+                    parameter.connected_functions or 
+                    parameter.ext_bounded
+                    for parameter in component.parameters])
+        if vectorize is True:
+            rows = {}
+            values = []
+            for parameter in component.parameters:
+                rows[parameter] = len(values)
+                values.extend(np.array(parameter.value, dtype='float',
+                                       ndmin=1))
+            nperturbations = sum([len(step) for step in steps])
+            vector = np.empty((len(values), nperturbations + 1, 1))
+            vector[:] = np.array(values)[:, np.newaxis, np.newaxis]
+            column = 1
+            for parameter, step in zip(free_parameters, steps):
+                for i in xrange(len(step)):
+                    vector[rows[parameter] + i, column, 0] += step[i]
+                    column += 1
+            old_vectors = [(parameter, parameter._vector) 
+                           for parameter in component.parameters]
+            try:
+                for parameter in component.parameters:
+                    parameter._vector = (vector, rows[parameter])
+                result = self._evaluate_component_rows(component, axis)
+            except (ValueError, TypeError):
+                result = None
+            finally:
+                for parameter, old_vector in old_vectors:
+                    parameter._vector = old_vector
+            if result is not None and result.shape == (
+                    nperturbations + 1, len(axis)):
+                column = 1
+                for parameter, step in zip(free_parameters, steps):
+                    derivatives[parameter] = (
+                        result[column:column + len(step)] - result[0]
+                        ) / step[:, np.newaxis]
+                    column += len(step)
+                return derivatives
+            self._scalar_components.add(component)
+        # The component function does not support arrays of values,
+        # evaluate the perturbations one by one
+        component_base = self._evaluate_component_rows(component, axis)
+        for parameter, step in zip(free_parameters, steps):
+            dependent = set([component] + 
+                            [twin.component for twin in parameter._twins])
+            base = component_base + sum([
+                self._evaluate_component_rows(dependent_component, axis) 
+                for dependent_component in dependent 
+                if dependent_component is not component])
+            value = parameter.value
+            rows = []
+            for i in xrange(len(step)):
+                if parameter._number_of_elements == 1:
+                    parameter.value = value + step[i]
+                else:
+                    perturbed = list(value)
+                    perturbed[i] += step[i]
+                    parameter.value = tuple(perturbed)
+                rows.append((sum([
+                    self._evaluate_component_rows(dependent_component,
+                                                  axis)
+                    for dependent_component in dependent]) - base) / 
+                    step[i])
+                parameter.value = value
+            derivatives[parameter] = np.array(rows)
+        return derivatives
+
+    def _jacobian_fd(self, param, y, weights=None):
+        """Jacobian of the model estimated by forward differences 
+        evaluating each component only with respect to its own
+        parameters. It has the same signature and output as 
+        `_jacobian`.
+
+        """
+        start = time.time()
+        self._fit_profile['njev'] += 1
+        self._charge_free_parameters(param)
+        axis = self.axis.axis[self.channel_switches]
+        derivatives = {}
+        # The notifications are not batched because the connected
+        # functions, e.g. the cross-section of EELSCLEdge, must be 
+        # called when the parameters are perturbed
+        for component in self:
+            if component.active is True and component.free_parameters:
+                derivatives.update(self._component_fd_jacobian(
+                    component, axis))
+        grad = np.vstack([derivatives[parameter] 
+                          for parameter in self._free_parameters])
+        if weights is not None:
+            grad = grad * weights
+        self._fit_profile['jacobian'] += time.time() - start
+        return grad
+
     def _function4odr(self,param,x):
         return self._model_function(param)
     
@@ -642,7 +1444,7 @@ class Model(list):
         return gls
         
     def _errfunc4mpfit(self, p, fjac=None, x=None, y=None,
-        weights = None):
+        weights = None, jacobian=None):
         if fjac is None:
             errfunc = self._model_function(p) - y
             if weights is not None:
@@ -651,8 +1453,343 @@ class Model(list):
             status = 0
             return [status, errfunc]
         else:
-            return [0, self._jacobian(p,y).T]
+            return [0, jacobian(p, y, weights).T]
         
+    def _get_navigation_getitem(self, index):
+        """Returns the tuple that indexes the spectrum at the given 
+        navigation index in the data array.
+
+        """
+        getitem = list(self.axes_manager._getitem_tuple)
+        for axis, i in zip(self.axes_manager.navigation_axes, index):
+            getitem[self.axes_manager.axes.index(axis)] = i
+        return tuple(getitem)
+
+    def _bind_batch_vector(self, vector):
+        """Bind the parameters in `_batch_rows` to the rows of vector,
+        an array of shape (number of parameters, number of pixels, 1).
+
+        The value of the parameters are then column arrays and the 
+        components evaluate the model of all the pixels at once.
+
+        """
+        for parameter, row in self._batch_rows:
+            parameter._vector = (vector, row)
+
+    def _batch_model_function(self, vector, axis):
+        start = time.time()
+        self._bind_batch_vector(vector)
+        self._fit_profile['nfev'] += vector.shape[1]
+        result = np.zeros((vector.shape[1], len(axis)))
+        try:
+            for component in self:
+                if component.active is True:
+                    try:
+                        result += component.function(axis)
+                    except ValueError:
+                        raise ValueError(
+                            "%s does not support the batch_lm fitter" % 
+                            component._get_short_description())
+        finally:
+            self._fit_profile['model_function'] += time.time() - start
+        return result
+
+    def _batch_residuals(self, vector, axis, y, weights):
+        residuals = self._batch_model_function(vector, axis) - y
+        if weights is not None:
+            residuals *= weights
+        return residuals
+
+    def _batch_jacobian(self, vector, axis, y, weights, residuals, 
+                        grad=False):
+        """Returns the jacobian of the residuals of the pixels in
+        vector as an array of shape (pixels, channels, free 
+        parameters) and the number of evaluations of the model.
+
+        The columns of the parameters with a single element and an 
+        analytical gradient are calculated from it if grad is True,
+        the rest by forward differences, perturbing the parameter at
+        all the pixels at once.
+
+        """
+        jacobian = np.empty(residuals.shape + (len(self._batch_free_rows),))
+        nfev = 0
+        for column, (parameter, row) in enumerate(self._batch_free_rows):
+            if (grad is True and parameter.grad is not None and
+                    parameter._number_of_elements == 1):
+                start = time.time()
+                self._bind_batch_vector(vector)
+                par_grad = parameter.grad(axis)
+                for twin in parameter._twins:
+                    par_grad = par_grad + twin.grad(axis)
+                jacobian[:, :, column] = par_grad
+                if weights is not None:
+                    jacobian[:, :, column] *= weights
+                self._fit_profile['jacobian'] += time.time() - start
+            else:
+                value = vector[row].copy()
+                step = np.sqrt(np.finfo(float).eps) * np.maximum(
+                    np.abs(value), 1.)
+                vector[row] = value + step
+                jacobian[:, :, column] = (self._batch_residuals(
+                    vector, axis, y, weights) - residuals) / step
+                vector[row] = value
+                nfev += 1
+        self._fit_profile['njev'] += 1
+        return jacobian, nfev
+
+    def _check_batch_lm_arguments(self, method, ext_bounding):
+        """Raise a ValueError if the fit options are not supported by
+        the batch_lm fitter.
+
+        """
+        if method != 'ls':
+            raise ValueError(
+                "The batch_lm fitter only supports method='ls'")
+        if ext_bounding is True:
+            raise ValueError(
+                "The batch_lm fitter does not support ext_bounding, "
+                "use bounded=True instead")
+
+    def _batch_fit(self, pixels, grad=False, weights=None, 
+                   bounded=False, max_iterations=100, xtol=1.49012e-8,
+                   ftol=1.49012e-8, gtol=0., **kwargs):
+        """Fit the spectra at the given navigation indices at the same
+        time with the batch_lm fitter, storing the result in the 
+        parameters and diagnostics maps. See `fit`.
+
+        """
+        start = time.time()
+        if kwargs:
+            raise TypeError(
+                "The batch_lm fitter does not accept the arguments: %s" %
+                ', '.join(sorted(kwargs)))
+        if self.convolved is True:
+            raise ValueError(
+                "The batch_lm fitter does not support convolved models")
+        if self._keep_component_cache is False:
+            # Outside multifit
+            self._reset_fit_profile()
+        npixels = len(pixels)
+        map_indices = tuple(np.array([index if index else (0,) 
+                                      for index in pixels]).T)
+        # All the parameters of the active components, including the
+        # fixed ones whose value can change from pixel to pixel, are 
+        # bound to the rows of the batch vector. The twinned 
+        # parameters read the value of their twin.
+        parameters = [parameter for component in self 
+                      if component.active
+                      for parameter in component.parameters
+                      if parameter.twin is None]
+        self._batch_rows = []
+        self._batch_free_rows = []
+        nrows = 0
+        for parameter in parameters:
+            self._batch_rows.append((parameter, nrows))
+            for i in xrange(parameter._number_of_elements):
+                if parameter.free is True:
+                    self._batch_free_rows.append((parameter, nrows + i))
+            nrows += parameter._number_of_elements
+        rows = dict(self._batch_rows)
+        free_rows = np.array([row for parameter, row in 
+                              self._batch_free_rows], dtype='int')
+        if not len(free_rows):
+            raise ValueError("The model does not have free parameters")
+        # The initial values are those of the maps where they are set,
+        # otherwise the initial guesses of the pyramid strategy or the
+        # current values
+        x = np.empty((nrows, npixels, 1))
+        old_values = []
+        for parameter, row in self._batch_rows:
+            nelements = parameter._number_of_elements
+            old_values.append((parameter, parameter.value))
+            values = np.empty((npixels, nelements))
+            values[:] = parameter.value
+            maps = [parameter.map]
+            if (self._initial_values is not None and 
+                    parameter in self._initial_values):
+                maps.insert(0, self._initial_values[parameter])
+            for map_ in maps:
+                is_set = map_['is_set'][map_indices]
+                values[is_set] = map_['values'][map_indices].reshape(
+                    npixels, nelements)[is_set]
+            x[row:row + nelements, :, 0] = values.T
+        getitems = [self._get_navigation_getitem(index) 
+                    for index in pixels]
+        y = np.array([self.spectrum.data[getitem][self.channel_switches]
+                      for getitem in getitems], dtype='float')
+        if weights is True:
+            if self.spectrum.variance is None:
+                self.spectrum.estimate_variance()
+            weights = 1. / np.sqrt(np.array(
+                [self.spectrum.variance[getitem][self.channel_switches]
+                 for getitem in getitems]))
+        elif weights is not None:
+            weights = np.array([weights[getitem][self.channel_switches]
+                                for getitem in getitems])
+        axis = self.axis.axis[self.channel_switches]
+        if bounded is True:
+            bounds = [(row, parameter.bmin, parameter.bmax) 
+                      for parameter, row in self._batch_free_rows]
+            for row, bmin, bmax in bounds:
+                if bmin is not None or bmax is not None:
+                    x[row] = np.clip(x[row], bmin, bmax)
+
+        status = np.zeros(npixels, dtype='int')
+        nfev = np.ones(npixels, dtype='int')
+        damping = np.zeros(npixels)
+        residuals = np.empty(y.shape)
+        try:
+            residuals[:] = self._batch_residuals(x, axis, y, weights)
+            cost = (residuals ** 2).sum(1)
+            active = np.arange(npixels)
+            iteration = 0
+            while len(active) and iteration < max_iterations:
+                iteration += 1
+                xa = x[:, active]
+                wa = None if weights is None else weights[active]
+                jacobian, n = self._batch_jacobian(
+                    xa, axis, y[active], wa, residuals[active], grad)
+                nfev[active] += n
+                hessian = np.einsum('pci,pcj->pij', jacobian, jacobian)
+                gradient = np.einsum('pci,pc->pi', jacobian, 
+                                     residuals[active])
+                if bounded is True:
+                    # The parameters at a bound that the step would 
+                    # move outside are kept constant
+                    at_bound = np.zeros(gradient.shape, dtype='bool')
+                    for column, (row, bmin, bmax) in enumerate(bounds):
+                        value = xa[row, :, 0]
+                        if bmin is not None:
+                            at_bound[:, column] |= ((value <= bmin) & 
+                                (gradient[:, column] > 0))
+                        if bmax is not None:
+                            at_bound[:, column] |= ((value >= bmax) &
+                                (gradient[:, column] < 0))
+                    gradient[at_bound] = 0.
+                    hessian[at_bound] = 0.
+                    hessian.transpose(0, 2, 1)[at_bound] = 0.
+                converged = np.abs(gradient).max(1) <= gtol
+                status[active[converged]] = 4
+                keep = ~converged
+                active = active[keep]
+                if not len(active):
+                    break
+                xa = xa[:, keep]
+                hessian = hessian[keep]
+                gradient = gradient[keep]
+                diagonal = hessian.diagonal(axis1=1, axis2=2).copy()
+                diagonal[diagonal == 0] = 1.
+                first = damping[active] == 0
+                damping[active[first]] = 1e-3 * diagonal[first].max(1)
+                # Solve the damped normal equations of all the pixels
+                step = np.linalg.solve(
+                    hessian + damping[active, np.newaxis, np.newaxis] *
+                    diagonal[:, :, np.newaxis] * 
+                    np.eye(len(free_rows)),
+                    -gradient[..., np.newaxis])[..., 0]
+                new_x = xa.copy()
+                new_x[free_rows, :, 0] += step.T
+                if bounded is True:
+                    for row, bmin, bmax in bounds:
+                        if bmin is not None or bmax is not None:
+                            new_x[row] = np.clip(new_x[row], bmin, bmax)
+                new_residuals = self._batch_residuals(
+                    new_x, axis, y[active], 
+                    None if weights is None else weights[active])
+                nfev[active] += 1
+                new_cost = (new_residuals ** 2).sum(1)
+                improved = new_cost < cost[active]
+                accepted = active[improved]
+                reduction = ((cost[accepted] - new_cost[improved]) / 
+                             np.maximum(cost[accepted], 
+                                        np.finfo(float).tiny))
+                step_norm = np.sqrt(
+                    ((new_x[free_rows][:, improved] - 
+                      xa[free_rows][:, improved]) ** 2).sum(0))[:, 0]
+                x_norm = np.sqrt((new_x[free_rows][:, improved] ** 2
+                                  ).sum(0))[:, 0]
+                x[:, accepted] = new_x[:, improved]
+                residuals[accepted] = new_residuals[improved]
+                cost[accepted] = new_cost[improved]
+                damping[accepted] /= 3.
+                rejected = active[~improved]
+                damping[rejected] *= 2.
+                status[accepted] = ((reduction <= ftol) + 
+                                    2 * (step_norm <= 
+                                         xtol * (x_norm + xtol)))
+                status[rejected[damping[rejected] > 1e16]] = 6
+                active = active[status[active] == 0]
+            status[status == 0] = 5
+
+            # Standard deviation from the jacobian at the solution as
+            # in leastsq
+            jacobian, n = self._batch_jacobian(x, axis, y, weights, 
+                                               residuals, grad)
+            hessian = np.einsum('pci,pcj->pij', jacobian, jacobian)
+            try:
+                std = np.sqrt(np.abs(np.linalg.inv(hessian).diagonal(
+                    axis1=1, axis2=2)))
+            except np.linalg.LinAlgError:
+                std = np.nan * np.ones((npixels, len(free_rows)))
+            # The twinned parameters are not in the vector. Their 
+            # values are the twin function of the fitted values
+            self._bind_batch_vector(x)
+            twinned_values = [(parameter, parameter.value)
+                              for component in self if component.active
+                              for parameter in component.parameters
+                              if parameter.twin is not None]
+        finally:
+            for parameter, row in self._batch_rows:
+                parameter._vector = None
+            with self.batch_notifications():
+                for parameter, value in old_values:
+                    parameter.value = value
+            self._batch_rows = []
+            self._batch_free_rows = []
+
+        column = 0
+        for parameter in parameters:
+            nelements = parameter._number_of_elements
+            row = rows[parameter]
+            values = x[row:row + nelements, :, 0].T
+            parameter.map['values'][map_indices] = (
+                values[:, 0] if nelements == 1 else values)
+            if parameter.free is True:
+                parameter_std = std[:, column:column + nelements]
+                parameter.map['std'][map_indices] = (
+                    parameter_std[:, 0] if nelements == 1 
+                    else parameter_std)
+                column += nelements
+            parameter.map['is_set'][map_indices] = True
+        for parameter, value in twinned_values:
+            nelements = parameter._number_of_elements
+            values = np.empty((npixels, nelements))
+            for i, element in enumerate(
+                    (value,) if nelements == 1 else value):
+                values[:, i] = np.ravel(element)
+            parameter.map['values'][map_indices] = (
+                values[:, 0] if nelements == 1 else values)
+            parameter.map['is_set'][map_indices] = True
+        fit_time = time.time() - start
+        dof = len(axis) - len(free_rows)
+        self.diagnostics_map['chisq'][map_indices] = cost
+        self.diagnostics_map['red_chisq'][map_indices] = (
+            cost / dof if dof > 0 else np.nan)
+        self.diagnostics_map['nfev'][map_indices] = nfev
+        self.diagnostics_map['status'][map_indices] = status
+        self.diagnostics_map['time'][map_indices] = fit_time / npixels
+        self.diagnostics_map['message'][map_indices] = [
+            _batch_lm_messages[code] for code in status]
+        self.diagnostics_map['is_set'][map_indices] = True
+        self._fit_profile['total'] += fit_time
+        self._fit_profile['fits'] += npixels
+        self.fit_output = {'status' : status,
+                           'nfev' : nfev,
+                           'iterations' : iteration,
+                           'chisq' : cost}
+        self.charge()
+
     def fit(self, fitter=None, method='ls', grad=False, weights=None,
             bounded=False, ext_bounding=False, update_plot=False, 
             **kwargs):
@@ -660,7 +1797,7 @@ class Model(list):
         
         Parameters
         ----------
-        fitter : {None, "leastsq", "odr", "mpfit", "fmin"}
+        fitter : {None, "leastsq", "odr", "mpfit", "fmin", "batch_lm"}
             The optimizer to perform the fitting. If None the fitter
             defined in the Preferences is used. leastsq is the most 
             stable but it does not support bounding. mpfit supports
@@ -668,6 +1805,16 @@ class Model(list):
             maximum likelihood estimation, but it is less robust than 
             the Levenberg–Marquardt based leastsq and mpfit, and it is 
             better to use it after one of them to refine the estimation.
+            batch_lm is a Levenberg-Marquardt fitter that, in 
+            `multifit`, fits blocks of `batch_size` spectra (1000 by
+            default) at the same time using vectorized operations. It
+            supports bounding and the `max_iterations`, `xtol`, `ftol`
+            and `gtol` arguments, but it only works with components 
+            whose function and gradients accept numpy arrays of 
+            values as parameters, e.g. Gaussian, Lorentzian, Offset or
+            Polynomial. It does not support convolved models, 
+            method='ml', ext_bounding nor the warm_start of 
+            `multifit`.
         method : {'ls', 'ml'}
             Choose 'ls' (default) for least squares and 'ml' for 
             maximum-likelihood estimation. The latter only works with 
@@ -701,19 +1848,35 @@ class Model(list):
         multifit
             
         """
+        start = time.time()
         if fitter is None:
             fitter = preferences.Model.default_fitter
+        if fitter == 'batch_lm':
+            self._check_batch_lm_arguments(method, ext_bounding)
+            self._batch_fit([self.axes_manager.indices], grad=grad,
+                            weights=weights, bounded=bounded, **kwargs)
+            return
         switch_aap = (update_plot != self._get_auto_update_plot())
         if switch_aap is True and update_plot is False:
             self._disconnect_parameters2update_plot()
             
         self.p_std = None
-        self._set_p0()
         if ext_bounding:
             self._enable_ext_bounding()
+        self._set_p0()
+        if self._keep_component_cache is False:
+            # Outside multifit
+            self.clear_component_cache()
+            self._reset_fit_profile()
+        nfev = self._fit_profile['nfev']
+        self._set_static_baseline()
         if grad is False :
             approx_grad = True
-            jacobian = None
+            # leastsq and mpfit estimate the jacobian with the model
+            # level forward differences, that only evaluate each
+            # component with respect to its own parameters
+            jacobian = (self._jacobian_fd if self._fast_charge is True 
+                        else None)
             odr_jacobian = None
             grad_ml = None
             grad_ls = None
@@ -725,17 +1888,7 @@ class Model(list):
             grad_ls = self._gradient_ls
         if method == 'ml':
             weights = None
-        if weights is True:
-            if self.spectrum.variance is None:
-                self.spectrum.estimate_variance()
-            weights = 1. / np.sqrt(self.spectrum.variance.__getitem__(
-            self.axes_manager._getitem_tuple)[self.channel_switches])
-        elif weights is not None:
-            weights = weights.__getitem__(
-                self.axes_manager._getitem_tuple)[
-                    self.channel_switches]
-        args = (self.spectrum()[self.channel_switches], 
-        weights)
+        args = self._get_fit_arrays(weights)
         
         # Least squares "dedicated" fitters
         if fitter == "leastsq":
@@ -766,9 +1919,7 @@ class Model(list):
             self.fit_output = myoutput
             
         elif fitter == 'mpfit':
-            autoderivative = 1
-            if grad is True:
-                autoderivative = 0
+            autoderivative = 1 if jacobian is None else 0
 
             if bounded is True:
                 self.set_mpfit_parameters_info()
@@ -776,8 +1927,9 @@ class Model(list):
                 self.mpfit_parinfo = None
             m = mpfit(self._errfunc4mpfit, self.p0[:], 
                 parinfo=self.mpfit_parinfo, functkw= {
-                'y': self.spectrum()[self.channel_switches], 
-                'weights' :weights}, autoderivative = autoderivative,
+                'y': args[0], 'weights' : args[1], 
+                'jacobian' : jacobian}, 
+                autoderivative = autoderivative,
                 quiet = 1)
             self.p0 = m.params
             self.p_std = m.perror
@@ -854,16 +2006,212 @@ class Model(list):
         
         if np.iterable(self.p0) == 0:
             self.p0 = (self.p0,)
+        nfev = self._fit_profile['nfev'] - nfev
+        chisq, status, message = self._get_fit_status(fitter, args)
         self._charge_p0(p_std=self.p_std)
+        self._unbind_free_parameters()
+        self._reset_static_baseline()
         self.set()
         if ext_bounding is True:
             self._disable_ext_bounding()
         if switch_aap is True and update_plot is False:
             self._connect_parameters2update_plot()
             self.update_plot()            
+        fit_time = time.time() - start
+        self._store_fit_diagnostics(chisq, status, message, nfev, 
+                                    fit_time)
+        self._fit_profile['total'] += fit_time
+        self._fit_profile['fits'] += 1
                 
+    def _iterate_navigation_path(self, path):
+        """Set the navigation indices to those of path in order,
+        yielding each of them, and restore the current indices at the
+        end.
+
+        """
+        old_indices = self.axes_manager.indices
+        try:
+            for index in path:
+                self.axes_manager.indices = index
+                yield index
+        finally:
+            self.axes_manager.indices = old_indices
+
+    def _set_values_from_neighbours(self, index, function=np.mean):
+        """Set the value of the free parameters that are not set at the
+        given navigation index to the result of applying function to 
+        the values already set at the neighbouring indices.
+
+        """
+        neighbourhood = tuple([slice(max(i - 1, 0), i + 2) 
+                               for i in index])
+        with self.batch_notifications():
+            for component in self:
+                if component.active is False:
+                    continue
+                for parameter in component.free_parameters:
+                    if parameter.map['is_set'][index]:
+                        continue
+                    is_set = parameter.map['is_set'][neighbourhood]
+                    if not is_set.any():
+                        continue
+                    value = function(
+                        parameter.map['values'][neighbourhood][is_set],
+                        axis=0)
+                    parameter.value = (value 
+                        if parameter._number_of_elements == 1
+                        else tuple(value))
+
+    def _set_initial_values(self, index):
+        """Set the value of the free parameters that are not set at the
+        given navigation index to the initial guesses stored in
+        `_initial_values`, a dictionary of parameter: map.
+
+        """
+        with self.batch_notifications():
+            for parameter, map_ in self._initial_values.iteritems():
+                if (parameter.free is False or
+                        parameter.map['is_set'][index] or
+                        not map_['is_set'][index]):
+                    continue
+                value = map_['values'][index]
+                parameter.value = (value 
+                    if parameter._number_of_elements == 1
+                    else tuple(value))
+
+    def _bin_navigation(self, signal, shape):
+        """Returns a copy of signal with the navigation axes binned to
+        the given shape (in the order of navigation_shape) using 
+        Signal.rebin. The data is divided by the number of spectra in
+        each bin so the intensity of the binned spectra is comparable
+        to that of the original ones.
+
+        """
+        # Avoid copying the data, rebin creates a new array
+        data = signal.data
+        signal.data = None
+        try:
+            binned = signal.deepcopy()
+        finally:
+            signal.data = data
+        binned.data = data
+        new_shape = list(data.shape)
+        for axis, size in zip(signal.axes_manager.navigation_axes, shape):
+            new_shape[axis.index_in_array] = size
+        binned.rebin(new_shape)
+        binned.data = binned.data / (
+            float(np.prod(data.shape)) / np.prod(new_shape))
+        return binned
+
+    def _set_spectrum(self, spectrum, low_loss=None, maps=None):
+        """Replace the spectrum (and low_loss) of the model by others
+        with the same signal axis but a different navigation shape.
+
+        The parameters maps are replaced by those in the maps 
+        dictionary (parameter: map) or, if None, by new ones.
+
+        """
+        self.spectrum = spectrum
+        self.axes_manager = spectrum.axes_manager
+        self.axis = self.axes_manager.signal_axes[0]
+        if maps is None:
+            self.axes_manager.connect(self.charge)
+        # The signal axis does not change, so the convolution axis
+        # is still valid
+        self._low_loss = low_loss
+        if maps is None:
+            self._create_diagnostics_map()
+        for component in self:
+            component._axes_manager = self.axes_manager
+            for parameter in component.parameters:
+                if maps is None:
+                    parameter._create_array()
+                else:
+                    parameter.map = maps[parameter]
+                    parameter.std = None
+        self.clear_component_cache()
+
+    def _multifit_pyramid(self, levels=None, fine_levels_kwargs=None,
+                          mask=None, **kwargs):
+        """Coarse to fine multifit. See the `strategy` argument of
+        multifit.
+
+        """
+        nav_shape = list(self.axes_manager.navigation_shape)
+        if levels is None:
+            # Halve the navigation shape until the largest axis is
+            # smaller than 16
+            levels = 1
+            while max(nav_shape) // 2 ** levels >= 8:
+                levels += 1
+        shapes = [[max(1, size // 2 ** level) for size in nav_shape]
+                  for level in xrange(levels - 1, 0, -1)]
+        if fine_levels_kwargs is None:
+            fine_levels_kwargs = {}
+        # The autosave and resume arguments only apply to the full
+        # resolution level
+        coarse_kwargs = dict([(key, value) for key, value in 
+                              kwargs.iteritems() if key not in
+                              ('autosave', 'autosave_every', 'resume')])
+        seed = kwargs.get('seed')
+        spectrum = self.spectrum
+        low_loss = self.low_loss
+        maps = {}
+        for component in self:
+            for parameter in component.parameters:
+                maps[parameter] = parameter.map
+        diagnostics_map = self.diagnostics_map
+        initial_values = None
+        try:
+            for i, shape in enumerate(shapes):
+                messages.information(
+                    "Fitting the navigation binned to %s" % (shape,))
+                self._set_spectrum(
+                    self._bin_navigation(spectrum, shape),
+                    None if low_loss is None else 
+                    self._bin_navigation(low_loss, shape))
+                # The fixed parameters keep the values of the full
+                # resolution maps
+                for parameter, map_ in maps.iteritems():
+                    if parameter.free is False:
+                        parameter.map[:] = _resample_map(map_, shape)
+                if initial_values is not None:
+                    self._initial_values = dict(
+                        [(parameter, _interpolate_map(map_, shape))
+                         for parameter, map_ in 
+                         initial_values.iteritems()])
+                if seed is not None:
+                    coarse_kwargs['seed'] = tuple(
+                        [index * size // full_size for index, size,
+                         full_size in zip(seed, shape, nav_shape)])
+                if i == 0:
+                    self.multifit(**coarse_kwargs)
+                else:
+                    self.multifit(**dict(coarse_kwargs, 
+                                         **fine_levels_kwargs))
+                initial_values = dict(
+                    [(parameter, parameter.map.copy()) for component 
+                     in self for parameter in component.free_parameters])
+        finally:
+            self._initial_values = None
+            self._set_spectrum(spectrum, low_loss, maps)
+            self.diagnostics_map = diagnostics_map
+        if initial_values is not None:
+            self._initial_values = dict(
+                [(parameter, _interpolate_map(map_, nav_shape))
+                 for parameter, map_ in initial_values.iteritems()])
+        try:
+            if shapes:
+                kwargs.update(fine_levels_kwargs)
+            self.multifit(mask=mask, **kwargs)
+        finally:
+            self._initial_values = None
+
     def multifit(self, mask=None, charge_only_fixed=False,
-                 autosave=False, autosave_every=10, **kwargs):
+                 autosave=False, autosave_every=10, resume=None,
+                 iterpath='flyback', seed=None, warm_start=None,
+                 strategy='pixelwise', levels=None,
+                 fine_levels_kwargs=None, **kwargs):
         """Fit the data to the model at all the positions of the 
         navigation dimensions.        
         
@@ -877,11 +2225,60 @@ class Model(list):
         charge_only_fixed : bool
             If True, only the fixed parameters values will be updated
             when changing the positon.
-        autosave : bool
+        autosave : bool or str
             If True, the result of the fit will be saved automatically
-            with a frequency defined by autosave_every.
+            with a frequency defined by autosave_every to a temporary
+            HDF5 file that is deleted when multifit finishes. Only the
+            region of the parameters maps that contains the spectra
+            fitted since the previous save is written. If a file name,
+            the results are saved to that file, that is not deleted, 
+            and that can be used to resume the fit. If h5py is not
+            installed the parameters are saved in the npz format by 
+            `save_parameters2file`.
         autosave_every : int
             Save the result of fitting every given number of spectra.
+        resume : {None, str}
+            The name of a HDF5 file written by `autosave` or 
+            `save_parameters2hdf5`. The parameters maps are loaded from
+            it and the spectra at which all the parameters are set are
+            not fitted again. If `autosave` is True, the fit is saved 
+            to the same file.
+        iterpath : {'flyback', 'serpentine', 'hilbert', 'spiral'}
+            The order in which the navigation positions are fitted.
+            Each fit starts from the values of the previous one, that
+            with 'flyback', the default, jumps across the map at the
+            beginning of every row. 'serpentine' reverses the
+            direction at every row. 'hilbert' follows a Hilbert curve
+            (only for two navigation dimensions). 'spiral' starts at 
+            `seed` and goes around it. See `navigation_path`.
+        seed : {None, tuple of ints}
+            The first navigation index of the 'spiral' path. If None,
+            the centre of the map.
+        warm_start : {None, 'mean', 'median'}
+            If not None, the initial value of the free parameters is 
+            the mean or median of their values at the neighbouring 
+            positions that are already fitted, if any.
+        strategy : {'pixelwise', 'pyramid'}
+            If 'pixelwise', the default, every position is fitted
+            once. If 'pyramid', the navigation space is first binned
+            by factors of two using `Signal.rebin` (averaging the 
+            spectra) and fitted from the coarsest level to the full
+            resolution. The values of the free parameters at each
+            level, linearly interpolated, are the initial values of
+            the fit at the next one, what reduces the number of 
+            function evaluations when the parameters vary smoothly 
+            across the map. The low-loss of convolved models is 
+            binned in the same way.
+        levels : {None, int}
+            The number of levels of the 'pyramid' strategy including
+            the full resolution one. If None, the navigation shape is
+            halved until its largest axis is smaller than 16.
+        fine_levels_kwargs : {None, dict}
+            With the 'pyramid' strategy, key word arguments that 
+            replace those in kwargs when fitting all the levels but 
+            the coarsest, e.g. `{'maxfev' : 20}` to allow fewer 
+            iterations to the leastsq fitter where the initial values
+            are already close to the solution.
         
         **kwargs : key word arguments
             Any extra key word argument will be passed to 
@@ -890,27 +2287,72 @@ class Model(list):
             
         See Also
         --------
-        fit
+        fit, global_fit
             
         """
         
-        if autosave is not False:
+        if strategy == 'pyramid':
+            if self.axes_manager.navigation_dimension != 0:
+                return self._multifit_pyramid(
+                    levels=levels, 
+                    fine_levels_kwargs=fine_levels_kwargs, mask=mask,
+                    autosave=autosave, autosave_every=autosave_every,
+                    resume=resume, iterpath=iterpath, seed=seed,
+                    warm_start=warm_start, **kwargs)
+        elif strategy != 'pixelwise':
+            raise ValueError("Unknown strategy: %s" % strategy)
+        try:
+            import h5py
+            use_hdf5 = True
+        except ImportError:
+            use_hdf5 = False
+        if resume is not None:
+            self.load_parameters_from_hdf5(resume)
+            if autosave is True:
+                autosave = resume
+        delete_autosave_file = autosave is True
+        if autosave is True:
+            suffix = '.hdf5' if use_hdf5 else '.npz'
             fd, autosave_fn = tempfile.mkstemp(
                 prefix = 'hyperspy_autosave-', 
-                dir = '.', suffix = '.npz')
+                dir = '.', suffix = suffix)
             os.close(fd)
-            autosave_fn = autosave_fn[:-4]
+            if use_hdf5 is True:
+                # h5py must create the file
+                os.remove(autosave_fn)
+            else:
+                autosave_fn = autosave_fn[:-4]
             messages.information(
-            "Autosaving each %s pixels to %s.npz" % (autosave_every, 
-                                                     autosave_fn))
+            "Autosaving each %s pixels to %s" % (autosave_every, 
+                                                 autosave_fn + 
+                                                 ('' if use_hdf5 else
+                                                  '.npz')))
             messages.information(
             "When multifit finishes its job the file will be deleted")
+        elif autosave is not False:
+            if use_hdf5 is False:
+                raise ImportError(
+                    'Saving the fit to a file requires h5py')
+            autosave_fn = autosave
+            autosave = True
+            messages.information(
+            "Autosaving each %s pixels to %s" % (autosave_every, 
+                                                 autosave_fn))
         if mask is not None and \
         (mask.shape != tuple(self.axes_manager.navigation_shape)):
            messages.warning_exit(
            "The mask must be a numpy array of boolen type with "
            " the same shape as the navigation: %s" % 
            self.axes_manager.navigation_shape)
+        if resume is not None:
+            # Do not fit again the spectra where all the parameters
+            # are set
+            is_set = np.ones(self.axes_manager.navigation_shape,
+                             dtype='bool')
+            for component in self:
+                for param in component.parameters:
+                    is_set &= param.map['is_set'].reshape(is_set.shape)
+            mask = is_set if mask is None else (mask | is_set)
         masked_elements = 0 if mask is None else mask.sum()
         maxval=self.axes_manager.navigation_size - masked_elements
         if maxval > 0:
@@ -922,6 +2364,8 @@ class Model(list):
             elif kwargs['fitter'] in ("tnc", "l_bfgs_b"):
                 self.set_boundaries()
                 kwargs['bounded'] = None
+            elif kwargs['fitter'] == 'batch_lm':
+                pass
             else:
                 messages.information(
                 "The chosen fitter does not suppport bounding."
@@ -929,23 +2373,349 @@ class Model(list):
                 "following fitters instead: mpfit, tnc, l_bfgs_b")
                 kwargs['bounded'] = False
         i = 0
-        for index in self.axes_manager:
-            if mask is None or not mask[index]:
-                self.fit(**kwargs)
-                i += 1
-                if maxval > 0:
-                    pbar.update(i)
-            if autosave is True and i % autosave_every  == 0:
-                self.save_parameters2file(autosave_fn)
+        # The indices fitted since the last save
+        unsaved_indices = []
+        # Reuse the evaluation of the fixed components between pixels
+        self.clear_component_cache()
+        self._reset_fit_profile()
+        self._keep_component_cache = True
+        batch = kwargs.get('fitter') == 'batch_lm'
+        if batch is True:
+            if warm_start is not None:
+                raise ValueError(
+                    "The batch_lm fitter does not support warm_start")
+            del kwargs['fitter']
+            self._check_batch_lm_arguments(kwargs.pop('method', 'ls'),
+                                           kwargs.pop('ext_bounding', 
+                                                      False))
+            kwargs.pop('update_plot', None)
+            batch_size = kwargs.pop('batch_size', 1000)
+            # The batch fitter reads the spectra and the maps directly
+            if self.axes_manager.navigation_dimension == 0:
+                positions = [()]
+            else:
+                positions = navigation_path(
+                    self.axes_manager.navigation_shape, iterpath, seed)
+        elif iterpath == 'flyback':
+            positions = self.axes_manager
+        else:
+            positions = self._iterate_navigation_path(navigation_path(
+                self.axes_manager.navigation_shape, iterpath, seed))
+        if warm_start is not None:
+            warm_start = {'mean' : np.mean, 
+                          'median' : np.median}[warm_start]
+            if self.axes_manager.navigation_dimension == 0:
+                warm_start = None
+        positions = (index for index in positions 
+                     if mask is None or not mask[index])
+        try:
+            for block in (_split_in_blocks(positions, batch_size) 
+                          if batch is True else 
+                          ([index] for index in positions)):
+                if batch is True:
+                    self._batch_fit(block, **kwargs)
+                else:
+                    index = block[0]
+                    if self._initial_values is not None:
+                        self._set_initial_values(index)
+                    if warm_start is not None:
+                        self._set_values_from_neighbours(index, 
+                                                         warm_start)
+                    self.fit(**kwargs)
+                for index in block:
+                    i += 1
+                    unsaved_indices.append(index)
+                    if maxval > 0:
+                        pbar.update(i)
+                    if autosave is True and i % autosave_every  == 0:
+                        if use_hdf5 is True:
+                            self.save_parameters2hdf5(autosave_fn,
+                                                      unsaved_indices)
+                        else:
+                            self.save_parameters2file(autosave_fn)
+                        unsaved_indices = []
+        finally:
+            self._keep_component_cache = False
         if maxval > 0:
             pbar.finish()
         if autosave is True:
-            messages.information(
-            'Deleting the temporary file %s pixels' % (
-                autosave_fn + 'npz'))
-            os.remove(autosave_fn + '.npz')
+            if delete_autosave_file is True:
+                if use_hdf5 is False:
+                    autosave_fn += '.npz'
+                messages.information(
+                'Deleting the temporary file %s' % autosave_fn)
+                if os.path.exists(autosave_fn):
+                    os.remove(autosave_fn)
+            elif unsaved_indices:
+                self.save_parameters2hdf5(autosave_fn, unsaved_indices)
 
             
+    def _get_fit_arrays(self, weights=None):
+        """Returns the data and the weights of the current spectrum in
+        the signal range as used by `fit`.
+
+        """
+        if weights is True:
+            if self.spectrum.variance is None:
+                self.spectrum.estimate_variance()
+            weights = 1. / np.sqrt(self.spectrum.variance.__getitem__(
+            self.axes_manager._getitem_tuple)[self.channel_switches])
+        elif weights is not None:
+            weights = weights.__getitem__(
+                self.axes_manager._getitem_tuple)[
+                    self.channel_switches]
+        return self.spectrum()[self.channel_switches], weights
+
+    def _global_residuals(self, x, pixels, columns, weights=None,
+                          grad=False, jacobian=False):
+        """Returns the residuals of all the pixels stacked in a vector
+        for the global parameters vector x and, if jacobian is True, 
+        the block-sparse jacobian.
+
+        The jacobian is built from the jacobian of each pixel, that 
+        only has non-zero columns for the local parameters of the 
+        pixel and for the shared parameters.
+
+        """
+        residuals = []
+        rows, cols, values = [], [], []
+        nfev = 0
+        offset = 0
+        for index, pixel_columns in zip(pixels, columns):
+            self.axes_manager.indices = index
+            self._set_p0()
+            self._set_static_baseline()
+            y, w = self._get_fit_arrays(weights)
+            param = x[pixel_columns]
+            residual = self._errfunc(param, y, w)
+            nfev += 1
+            residuals.append(residual)
+            if jacobian is True:
+                if grad is True:
+                    block = self._jacobian(param, y, w)
+                else:
+                    # Forward differences
+                    block = np.empty((len(param), len(residual)))
+                    for i in xrange(len(param)):
+                        step = np.sqrt(np.finfo(float).eps) * max(
+                            abs(param[i]), 1.)
+                        shifted = param.copy()
+                        shifted[i] += step
+                        block[i] = (self._errfunc(shifted, y, w) - 
+                                    residual) / step
+                    nfev += len(param)
+                rows.append(np.tile(np.arange(offset, 
+                                              offset + len(residual)),
+                                    len(param)))
+                cols.append(np.repeat(pixel_columns, len(residual)))
+                values.append(block.ravel())
+            offset += len(residual)
+        self._unbind_free_parameters()
+        self._reset_static_baseline()
+        residuals = np.hstack(residuals)
+        if jacobian is False:
+            return residuals, nfev
+        jacobian = scipy.sparse.coo_matrix(
+            (np.hstack(values), (np.hstack(rows), np.hstack(cols))),
+            shape=(len(residuals), len(x))).tocsr()
+        return residuals, jacobian, nfev
+
+    def global_fit(self, shared_parameters, mask=None, weights=None,
+                   grad=False, max_iterations=100, xtol=1e-8, ftol=1e-8,
+                   gtol=1e-10):
+        """Fit the model to all the spectra at the same time, sharing
+        the value of the given parameters over the whole navigation
+        space.
+
+        The spectra are fitted as a single least-squares problem whose
+        unknowns are the shared parameters and the rest of the free 
+        parameters at every position. The jacobian is block-sparse,
+        so the Levenberg-Marquardt steps are computed by a sparse
+        solver. The shared parameters are constrained by all the 
+        spectra, what is more robust than fitting them independently
+        at every position with `multifit`.
+
+        Parameters
+        ----------
+        shared_parameters : list of Parameter instances
+            The free parameters whose value is the same at all the 
+            positions.
+        mask : {None, numpy.array}
+            A boolean array with the shape of the navigation where
+            True indicates that the spectrum is not fitted.
+        weights : {None, True, numpy.array}
+            As in `fit`.
+        grad : bool
+            If True, the analytical gradient of the components is used
+            to build the jacobian, otherwise it is estimated by 
+            forward differences.
+        max_iterations : int
+            The maximum number of iterations.
+        xtol, ftol, gtol : float
+            The fit stops when the relative change of the parameters or
+            of the sum of squares is smaller than xtol or ftol 
+            respectively, or when the largest element of the gradient
+            is smaller than gtol.
+
+        Notes
+        -----
+        The jacobian is stored in memory for all the spectra, with 
+        as many non-zero elements as the number of channels in the 
+        signal range times the number of free parameters times the 
+        number of fitted spectra. The standard deviation of the 
+        parameters is not estimated.
+
+        The number of iterations, of function evaluations (per 
+        spectrum), the final sum of squares and the reason for 
+        stopping are stored in the `fit_output` attribute.
+
+        See Also
+        --------
+        fit, multifit
+
+        Examples
+        --------
+        >>> m.global_fit([m[0].sigma])
+
+        """
+        free_parameters = [parameter for component in self 
+                           if component.active 
+                           for parameter in component.free_parameters]
+        for parameter in shared_parameters:
+            if parameter not in free_parameters:
+                raise ValueError("%s is not a free parameter of an "
+                                 "active component" % parameter)
+        if (mask is not None and 
+                mask.shape != tuple(self.axes_manager.navigation_shape)):
+            raise ValueError("The mask must have the shape of the "
+                             "navigation: %s" % 
+                             self.axes_manager.navigation_shape)
+        pixels = [index for index in np.ndindex(
+            *self.axes_manager.navigation_shape) 
+            if mask is None or not mask[index]]
+        # The global vector contains the shared parameters followed by
+        # the local parameters of each pixel. columns maps the 
+        # parameters vector of each pixel to the global vector.
+        shared_columns = {}
+        nshared = 0
+        for parameter in shared_parameters:
+            shared_columns[parameter] = np.arange(
+                nshared, nshared + parameter._number_of_elements)
+            nshared += parameter._number_of_elements
+        nlocal = sum([parameter._number_of_elements 
+                      for parameter in free_parameters 
+                      if parameter not in shared_columns])
+        columns = []
+        for i in xrange(len(pixels)):
+            pixel_columns = []
+            offset = nshared + i * nlocal
+            for parameter in free_parameters:
+                if parameter in shared_columns:
+                    pixel_columns.append(shared_columns[parameter])
+                else:
+                    pixel_columns.append(np.arange(
+                        offset, offset + parameter._number_of_elements))
+                    offset += parameter._number_of_elements
+            columns.append(np.hstack(pixel_columns))
+        # The initial values of the shared parameters are the current
+        # ones, those of the local parameters are charged from the
+        # maps
+        x = np.zeros(nshared + len(pixels) * nlocal)
+        old_indices = self.axes_manager.indices
+        for parameter in shared_parameters:
+            x[shared_columns[parameter]] = parameter.value
+        for index, pixel_columns in zip(pixels, columns):
+            self.axes_manager.indices = index
+            self._set_p0()
+            local = np.array([column >= nshared 
+                              for column in pixel_columns])
+            x[pixel_columns[local]] = self.p0[local]
+        self._unbind_free_parameters()
+
+        try:
+            residuals, jacobian, nfev = self._global_residuals(
+                x, pixels, columns, weights, grad, jacobian=True)
+            cost = np.dot(residuals, residuals)
+            damping = None
+            iteration = 0
+            message = "The maximum number of iterations was reached"
+            for iteration in xrange(1, max_iterations + 1):
+                hessian = (jacobian.T * jacobian).tocsc()
+                gradient = jacobian.T * residuals
+                if np.abs(gradient).max() <= gtol:
+                    message = "The gradient is smaller than gtol"
+                    break
+                diagonal = hessian.diagonal()
+                diagonal[diagonal == 0] = 1.
+                if damping is None:
+                    damping = 1e-3 * diagonal.max()
+                # Increase the damping until the step reduces the sum
+                # of squares
+                while True:
+                    step = scipy.sparse.linalg.spsolve(
+                        hessian + scipy.sparse.spdiags(
+                            damping * diagonal, 0, len(x), len(x)),
+                        -gradient)
+                    new_residuals, n = self._global_residuals(
+                        x + step, pixels, columns, weights)
+                    nfev += n
+                    new_cost = np.dot(new_residuals, new_residuals)
+                    if new_cost < cost:
+                        damping /= 3.
+                        break
+                    damping *= 2.
+                    if damping > 1e16:
+                        break
+                if new_cost >= cost:
+                    message = "The sum of squares cannot be reduced"
+                    break
+                x = x + step
+                relative_reduction = (cost - new_cost) / cost
+                cost = new_cost
+                if (np.linalg.norm(step) <= 
+                        xtol * (np.linalg.norm(x) + xtol)):
+                    message = "The change of the parameters is smaller " \
+                              "than xtol"
+                    break
+                if relative_reduction <= ftol:
+                    message = "The change of the sum of squares is " \
+                              "smaller than ftol"
+                    break
+                residuals, jacobian, n = self._global_residuals(
+                    x, pixels, columns, weights, grad, jacobian=True)
+                nfev += n
+
+            # Store the result in the parameters maps
+            for index, pixel_columns in zip(pixels, columns):
+                self.axes_manager.indices = index
+                self._set_p0()
+                self.p0 = x[pixel_columns]
+                self._charge_p0()
+                self._unbind_free_parameters()
+                self.set()
+        finally:
+            self._unbind_free_parameters()
+            self._reset_static_baseline()
+            self.axes_manager.indices = old_indices
+        self.fit_output = {'iterations' : iteration,
+                           'nfev' : nfev / float(len(pixels)),
+                           'chisq' : cost,
+                           'message' : message}
+
+    def _get_parameters_keys(self):
+        """Returns a list of (key, parameter) tuples where key is a
+        name that identifies the parameter in the files written by
+        save_parameters2file and save_parameters2hdf5.
+
+        """
+        keys = []
+        for i, component in enumerate(self):
+            cname = component.name.lower().replace(' ', '_')
+            for param in component.parameters:
+                pname = param.name.lower().replace(' ', '_')
+                keys.append(('%s_%s.%s' % (i, cname, pname), param))
+        return keys
+
     def save_parameters2file(self, filename):
         """Save the parameters array in binary format
         
@@ -955,15 +2725,88 @@ class Model(list):
         
         """
         kwds = {}
-        i = 0
-        for component in self:
-            cname = component.name.lower().replace(' ', '_')
-            for param in component.parameters:
-                pname = param.name.lower().replace(' ', '_')
-                kwds['%s_%s.%s' % (i, cname, pname)] = param.map
-            i += 1
+        for key, param in self._get_parameters_keys():
+            kwds[key] = param.map
+        kwds['diagnostics'] = self.diagnostics_map
         np.savez(filename, **kwds)
 
+    def save_parameters2hdf5(self, filename, indices=None):
+        """Save the parameters maps to a HDF5 file.
+
+        The values, std and is_set fields of the map of each parameter
+        are stored in a group with the parameter key (see 
+        `save_parameters2file`) inside the `parameters` group. The 
+        fields of the `diagnostics_map` are stored in the `diagnostics`
+        group. The datasets are created the first time that the file 
+        is written.
+        After that, if `indices` is given, only the smallest region 
+        that contains the indices is written.
+
+        Parameters
+        ----------
+        filename : str
+        indices : {None, list of tuples}
+            The navigation indices of the values that have changed. If
+            None, the full maps are written.
+
+        See Also
+        --------
+        load_parameters_from_hdf5, multifit
+
+        """
+        import h5py
+        region = Ellipsis
+        if indices:
+            indices = np.array(indices, ndmin=2)
+            region = tuple([slice(indices[:, axis].min(),
+                                  indices[:, axis].max() + 1)
+                            for axis in xrange(indices.shape[1])])
+        with h5py.File(filename, 'a') as f:
+            group = f.require_group('parameters')
+            groups = [(group.require_group(key), param.map, 
+                       ('values', 'std', 'is_set'))
+                      for key, param in self._get_parameters_keys()]
+            groups.append((f.require_group('diagnostics'), 
+                           self.diagnostics_map, 
+                           _diagnostics_dtype.names))
+            for pgroup, map_, fields in groups:
+                for field in fields:
+                    array = map_[field]
+                    if field not in pgroup:
+                        pgroup.create_dataset(field, data=array)
+                    elif pgroup[field].shape != array.shape:
+                        raise IOError(
+                            'The parameters in %s do not have the '
+                            'shape of the model parameters' % filename)
+                    else:
+                        pgroup[field][region] = array[region]
+
+    def load_parameters_from_hdf5(self, filename):
+        """Loads the parameters maps from a HDF5 file written with
+        `save_parameters2hdf5`.
+
+        Parameters
+        ----------
+        filename : str
+
+        """
+        import h5py
+        with h5py.File(filename, 'r') as f:
+            group = f['parameters']
+            for key, param in self._get_parameters_keys():
+                if key not in group:
+                    raise IOError(
+                        'The parameter %s is not in %s' % (key, filename))
+                for field in ('values', 'std', 'is_set'):
+                    param.map[field] = group[key][field][...]
+            # Files written before the diagnostics were saved do not
+            # have them
+            if 'diagnostics' in f:
+                for field in _diagnostics_dtype.names:
+                    self.diagnostics_map[field] = \
+                        f['diagnostics'][field][...]
+        self.charge()
+
     def load_parameters_from_file(self,filename):
         """Loads the parameters array from  a binary file written with 
         the 'save_parameters2file' function
@@ -975,15 +2818,47 @@ class Model(list):
         """
         
         f = np.load(filename)
-        i = 0
-        for component in self: # Cut the parameters list
-            cname = component.name.lower().replace(' ', '_')
-            for param in component.parameters:
-                pname = param.name.lower().replace(' ', '_')
-                param.map = f['%s_%s.%s' % (i, cname, pname)]
-            i += 1
+        for key, param in self._get_parameters_keys():
+            param.map = f[key]
+        if 'diagnostics' in f.files:
+            self.diagnostics_map = f['diagnostics']
                 
         self.charge()
+
+    def to_shared(self, mmap_dir=None):
+        """Store the parameters maps in shared memory.
+
+        The maps are copied to memory-mapped temporary files so that
+        worker processes can read and write the parameters maps
+        without copying them. See `Signal.to_shared` for details.
+
+        Parameters
+        ----------
+        mmap_dir : {None, str}
+            The directory in which the memory-mapped files are
+            created. If None the default temporary directory is used.
+
+        See Also
+        --------
+        from_shared
+
+        """
+        for component in self:
+            for param in component.parameters:
+                if (param.map is not None and
+                        not shared_memory.is_shared(param.map)):
+                    param.map = shared_memory.to_shared_array(
+                        param.map, dir=mmap_dir)
+
+    def from_shared(self):
+        """Copy back to standard numpy arrays the parameters maps
+        stored in shared memory by `to_shared`.
+
+        """
+        for component in self:
+            for param in component.parameters:
+                if isinstance(param.map, shared_memory.SharedArray):
+                    param.map = np.array(param.map)
            
     def plot(self):
         """Plots the current spectrum to the screen and a map with a 
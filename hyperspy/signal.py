@@ -18,6 +18,10 @@
 
 import copy
 import os.path
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 from matplotlib import pyplot as plt
@@ -35,6 +39,59 @@ from hyperspy.drawing import signal as sigdraw
 from hyperspy.decorators import auto_replot
 from hyperspy.defaults_parser import preferences
 from hyperspy.misc.utils import ensure_directory
+from hyperspy.misc import progressbar
+from hyperspy.misc import shared_memory
+
+
+def _map_chunk(function, data, vectorized, kwargs, iterated_kwargs):
+    """Apply a function to a chunk of data of Signal.map.
+
+    It is defined at the module level so it can be pickled when the
+    chunks are processed by a pool of processes.
+
+    Parameters
+    ----------
+    function : function
+    data : numpy array
+        The first index runs over the navigation positions of the
+        chunk.
+    vectorized : bool
+        If True the function is called once with the whole chunk,
+        otherwise it is called for each navigation position.
+    kwargs : dictionary
+        Keyword arguments passed to the function at every position.
+    iterated_kwargs : dictionary
+        Keyword arguments which value is an array which first index
+        runs over the navigation positions of the chunk.
+
+    Returns
+    -------
+    numpy array
+
+    """
+    if vectorized is True:
+        kwds = kwargs.copy()
+        kwds.update(iterated_kwargs)
+        return np.asarray(function(data, **kwds))
+    results = []
+    for i in xrange(len(data)):
+        kwds = kwargs.copy()
+        for key, value in iterated_kwargs.iteritems():
+            kwds[key] = value[i]
+        results.append(np.asarray(function(data[i], **kwds)))
+    return np.array(results)
+
+def _map_chunk_star(args):
+    return _map_chunk(*args)
+
+def _get_chunk(data, start, stop, navigation_shape):
+    """Return the data at the given range of navigation positions of a
+    navigation-first array.
+
+    """
+    indices = np.unravel_index(np.arange(start, stop),
+                               navigation_shape)
+    return np.asarray(data[indices])
 
 
 class Signal(t.HasTraits, MVA):
@@ -366,7 +423,8 @@ class Signal(t.HasTraits, MVA):
         dic['original_parameters'] = \
         self.original_parameters.as_dictionary()
         if hasattr(self,'learning_results'):
-            dic['learning_results'] = self.learning_results.__dict__
+            dic['learning_results'] = \
+                self.learning_results._get_dictionary()
         return dic
 
     def _get_undefined_axes_list(self):
@@ -644,19 +702,74 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         self.axes_manager.axes[axis2] = c1
         self.axes_manager.update_attributes()
 
-    def rebin(self, new_shape):
-        """
-        Rebins the data to the new shape
+    def rebin(self, new_shape=None, scale=None, mmap=False,
+              mmap_dir=None):
+        """Rebins the data to the new shape conserving the total counts.
+
+        The binning factors do not need to be divisors of the shape,
+        e.g. it is possible to bin a 4096 channels spectrum by 3 or
+        by 2.5. The calibration (scale and offset) of the axes is
+        updated accordingly.
 
         Parameters
         ----------
-        new_shape: tuple of ints
-            The new shape must be a divisor of the original shape
+        new_shape : {None, tuple of ints}
+            The new shape in array order.
+        scale : {None, tuple of floats}
+            The binning factor of each axis in array order. Only used
+            if `new_shape` is None. The channels that do not fill a
+            whole bin at the end of an axis are discarded.
+        mmap: bool
+            If True, the rebinned data is stored in a memory-mapped
+            temporary file and the data is processed in chunks so it
+            is never loaded into memory as a whole. The data type of
+            the rebinned data is float in this case.
+        mmap_dir : string
+            If mmap_dir is not None and mmap is True the memory
+            mapped file will be created in the given directory,
+            otherwise the default directory is used.
+
+        Examples
+        --------
+        >>> s = signals.Spectrum({'data' : np.ones((64, 64, 4096))})
+        >>> s.rebin((32, 32, 1024))
+        >>> s.data.shape
+        (32, 32, 1024)
+        >>> s.rebin(scale=(1, 1, 2.5))
+        >>> s.data.shape
+        (32, 32, 409)
+
         """
-        factors = np.array(self.data.shape) / np.array(new_shape)
-        self.data = utils.rebin(self.data, new_shape)
+        if new_shape is None and scale is None:
+            raise ValueError("Please provide either new_shape or scale")
+        shape = self.data.shape
+        if new_shape is not None:
+            factors = [size / float(new_size) for size, new_size in
+                       zip(shape, new_shape)]
+        else:
+            factors = [float(factor) for factor in scale]
+        out = None
+        if mmap is True:
+            new_shape_ = tuple([int(size / factor + 1e-10)
+                for size, factor in zip(shape, factors)]
+                if new_shape is None else new_shape)
+            tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+            out = np.memmap(tempf,
+                            dtype='float',
+                            mode='w+',
+                            shape=new_shape_)
+        self.data = utils.rebin(self.data, new_shape=new_shape,
+                                scale=factors, out=out)
+        if mmap is True:
+            # Store the temporary file in the signal class to
+            # avoid its deletion when garbage collecting
+            self._data_temporary_file = tempf
         for axis in self.axes_manager.axes:
-            axis.scale *= factors[axis.index_in_array]
+            factor = factors[axis.index_in_array]
+            # The offset is the position of the centre of the first
+            # bin
+            axis.offset += (factor - 1) * axis.scale / 2.
+            axis.scale *= factor
         self.get_dimensions_from_data()
 
     def split_in(self, axis, number_of_parts = None, steps = None):
@@ -866,6 +979,246 @@ reconstruction created using either get_decomposition_model or get_bss_model met
             getitem[unfolded_axis] = i
             yield(data[getitem])
 
+    def map(self, function, vectorized=False, parallel=None,
+            max_workers=None, chunk_size=None, inplace=False,
+            mmap=False, mmap_dir=None, show_progressbar=True,
+            **kwargs):
+        """Apply a function to the signal at all the navigation
+        positions.
+
+        The function must accept the data at a given position, e.g. a
+        spectrum or an image, as its first argument and return an
+        array (or a number) of the same shape at all positions. The
+        shape and data type of the output are inferred from the
+        result of the first call.
+
+        Parameters
+        ----------
+        function : function
+            Any extra keyword argument is passed to the function. If
+            the value of a keyword argument is a Signal with the same
+            navigation shape, the function gets its data at the current
+            position instead.
+        vectorized : bool
+            If True, the function is called with a chunk of data which
+            first index runs over the navigation positions and it must
+            return the results for all the positions of the chunk.
+        parallel : {None, 'threads', 'processes'}
+            If not None the chunks are processed in parallel by a pool
+            of threads or of processes. Processes require that the
+            function and the keyword arguments can be pickled e.g. the
+            function must be defined at the module level.
+        max_workers : {None, int}
+            The size of the pool. If None, the number of CPUs is used.
+        chunk_size : {None, int}
+            The number of navigation positions processed at once. If
+            None, it is chosen to keep the size of each chunk below
+            64 MB and to provide work to all the workers.
+        inplace : bool
+            If True, the result is stored in the data of the signal.
+            The output must have the same shape as the input in this
+            case.
+        mmap: bool
+            If True and inplace is False, the result is stored in a
+            memory-mapped temporary file.
+        mmap_dir : string
+            If mmap_dir is not None and mmap is True the memory
+            mapped file will be created in the given directory,
+            otherwise the default directory is used.
+        show_progressbar : bool
+
+        Returns
+        -------
+        If inplace is False, a signal with the result. If the shape of
+        the output is the same as the shape of the signal at a given
+        position the signal is of the same class and it has the
+        same axes, otherwise new signal axes are created.
+
+        Examples
+        --------
+        >>> import scipy.ndimage
+        >>> s = signals.Spectrum({'data' : np.random.random((64,64,1024))})
+        >>> sg = s.map(scipy.ndimage.gaussian_filter1d, sigma=2)
+        >>> s.map(np.max).data.shape
+        (64, 64)
+        >>> s.map(np.max, vectorized=True, axis=-1).data.shape
+        (64, 64)
+
+        """
+        nav_idx = [axis.index_in_array for axis in
+                   self.axes_manager.navigation_axes]
+        sig_idx = [axis.index_in_array for axis in
+                   self.axes_manager.signal_axes]
+        nav_shape = tuple([self.data.shape[i] for i in nav_idx])
+        sig_shape = tuple([self.data.shape[i] for i in sig_idx])
+        constant_kwargs = {}
+        iterated_signals = {}
+        for key, value in kwargs.iteritems():
+            if isinstance(value, Signal):
+                if value.axes_manager.navigation_dimension == 0:
+                    constant_kwargs[key] = value.data
+                elif (tuple(value.axes_manager.navigation_shape) ==
+                      nav_shape):
+                    iterated_signals[key] = value.data.transpose(
+                        [axis.index_in_array for axis in
+                         value.axes_manager.navigation_axes +
+                         value.axes_manager.signal_axes])
+                else:
+                    raise ValueError(
+                        "The navigation shape of %s must be %s" %
+                        (key, str(nav_shape)))
+            else:
+                constant_kwargs[key] = value
+        data = self.data.transpose(nav_idx + sig_idx)
+
+        if not nav_shape:
+            result = _map_chunk(function, data[np.newaxis], vectorized,
+                                constant_kwargs,
+                                dict([(key, value[np.newaxis]) for
+                                      key, value in
+                                      iterated_signals.iteritems()]))[0]
+            if inplace is True:
+                self.data[:] = result.transpose(
+                    np.argsort(nav_idx + sig_idx))
+                self._replot()
+                return
+            elif result.shape == sig_shape:
+                return self.get_deepcopy_with_new_data(
+                    result.transpose(np.argsort(nav_idx + sig_idx)))
+            else:
+                return Signal({'data' : result})
+
+        size = int(np.prod(nav_shape))
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        if chunk_size is None:
+            position_size = int(np.prod(sig_shape)) * \
+                self.data.dtype.itemsize
+            chunk_size = max(1, 2 ** 26 // max(position_size, 1))
+            if parallel is not None:
+                chunk_size = min(chunk_size, max(
+                    1, int(np.ceil(size / (4. * max_workers)))))
+        chunks = [(start, min(start + chunk_size, size)) for
+                  start in xrange(0, size, chunk_size)]
+
+        def get_args(start, stop):
+            return (function,
+                    _get_chunk(data, start, stop, nav_shape),
+                    vectorized,
+                    constant_kwargs,
+                    dict([(key, _get_chunk(value, start, stop, nav_shape))
+                          for key, value in iterated_signals.iteritems()]))
+
+        if show_progressbar is True:
+            pbar = progressbar.progressbar(maxval=size)
+        # The first chunk is processed on its own to get the shape and
+        # dtype of the output
+        start, stop = chunks.pop(0)
+        result = _map_chunk(*get_args(start, stop))
+        out_sig_shape = result.shape[1:]
+        tempf = None
+        if inplace is True:
+            if out_sig_shape != sig_shape:
+                raise ValueError(
+                    "The output shape %s is not the signal shape %s, "
+                    "therefore it is not possible to store the result "
+                    "in place" % (str(out_sig_shape), str(sig_shape)))
+            out = self.data
+            out_view = data
+        else:
+            if len(out_sig_shape) == len(sig_shape):
+                # Keep the axes order of the signal
+                shape = list(self.data.shape)
+                for index, size_ in zip(sig_idx, out_sig_shape):
+                    shape[index] = size_
+                transpose = nav_idx + sig_idx
+            else:
+                shape = nav_shape + out_sig_shape
+                transpose = range(len(shape))
+            if mmap is True:
+                tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+                out = np.memmap(tempf,
+                                dtype=result.dtype,
+                                mode='w+',
+                                shape=tuple(shape))
+            else:
+                out = np.empty(shape, dtype=result.dtype)
+            out_view = out.transpose(transpose)
+        out_view[np.unravel_index(np.arange(start, stop),
+                                  nav_shape)] = result
+        if show_progressbar is True:
+            pbar.update(stop)
+
+        if parallel is None:
+            for start, stop in chunks:
+                out_view[np.unravel_index(np.arange(start, stop),
+                                          nav_shape)] = \
+                    _map_chunk(*get_args(start, stop))
+                if show_progressbar is True:
+                    pbar.update(stop)
+        else:
+            if parallel == 'threads':
+                pool = ThreadPool(max_workers)
+            elif parallel == 'processes':
+                pool = multiprocessing.Pool(max_workers)
+            else:
+                raise ValueError(
+                    "parallel must be None, 'threads' or 'processes'")
+            try:
+                # Submit the chunks in batches to keep the memory usage
+                # bounded
+                for i in xrange(0, len(chunks), max_workers):
+                    batch = chunks[i:i + max_workers]
+                    results = pool.map(
+                        _map_chunk_star,
+                        [get_args(start, stop) for start, stop in batch])
+                    for (start, stop), result in zip(batch, results):
+                        out_view[np.unravel_index(
+                            np.arange(start, stop), nav_shape)] = result
+                    if show_progressbar is True:
+                        pbar.update(batch[-1][1])
+            finally:
+                pool.close()
+                pool.join()
+        if show_progressbar is True:
+            pbar.finish()
+
+        if inplace is True:
+            self._replot()
+            return
+        if len(out_sig_shape) == len(sig_shape):
+            s = self.get_deepcopy_with_new_data(out)
+            s.get_dimensions_from_data()
+        elif not out_sig_shape:
+            s = self._get_navigation_signal()
+            s.data = out
+            s.mapped_parameters.title = self.mapped_parameters.title
+        else:
+            axes = self.axes_manager._get_navigation_axes_dicts()
+            for i, size_ in enumerate(out_sig_shape):
+                axes.append({
+                    'name': 'axis%i' % i,
+                    'scale': 1.,
+                    'offset': 0.,
+                    'size': int(size_),
+                    'units': 'undefined',
+                    'index_in_array': len(nav_shape) + i,
+                    'navigate': False, })
+            if len(out_sig_shape) == 1:
+                from hyperspy.signals.spectrum import Spectrum
+                s = Spectrum({'data' : out, 'axes' : axes})
+            elif len(out_sig_shape) == 2:
+                from hyperspy.signals.image import Image
+                s = Image({'data' : out, 'axes' : axes})
+            else:
+                s = Signal({'data' : out, 'axes' : axes})
+            s.mapped_parameters.title = self.mapped_parameters.title
+        if tempf is not None:
+            # Store the temporary file in the signal class to
+            # avoid its deletion when garbage collecting
+            s._data_temporary_file = tempf
+        return s
+
     @auto_replot
     def sum(self, axis, return_signal=False):
         """Sum the data over the specify axis
@@ -1042,7 +1395,135 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         if self.data is not None:
             s.data = s.data.copy()
         return s
-        
+
+    def _get_shareable_arrays(self):
+        """Returns a list of (object, attribute name) tuples of the
+        numpy arrays that are converted by to_shared and from_shared.
+        The learning results arrays that have not been read from their
+        file are not included.
+
+        """
+        arrays = [(self, 'data'), (self, 'variance')]
+        learning_results = self.learning_results
+        for attribute in dir(learning_results):
+            if not attribute.startswith('_') and \
+                    not learning_results.is_lazy(attribute):
+                arrays.append((learning_results, attribute))
+        return [(obj, name) for obj, name in arrays
+                if isinstance(getattr(obj, name), np.ndarray)]
+
+    def to_shared(self, mmap_dir=None):
+        """Store the data, the variance and the arrays of the
+        learning results in shared memory.
+
+        The arrays are copied to memory-mapped temporary files. When
+        the signal or any of its arrays is sent to other processes,
+        e.g. the workers of a multiprocessing pool or `map` with
+        parallel='processes', the workers attach to the same memory
+        instead of receiving a copy and any change they make is
+        visible in all the processes.
+
+        The temporary files are deleted when the arrays are garbage
+        collected or when `from_shared` is called.
+
+        The learning results arrays that are stored in a file and have
+        not been read yet are not read nor shared. Call 
+        `learning_results.load_lazy_arrays` first to share them.
+
+        Parameters
+        ----------
+        mmap_dir : {None, str}
+            The directory in which the memory-mapped files are
+            created. If None the default temporary directory is used.
+            Use a memory-backed filesystem, e.g. /dev/shm in Linux,
+            to store the data in RAM.
+
+        See Also
+        --------
+        from_shared, is_shared
+
+        """
+        for obj, name in self._get_shareable_arrays():
+            array = getattr(obj, name)
+            if not shared_memory.is_shared(array):
+                setattr(obj, name, shared_memory.to_shared_array(
+                    array, dir=mmap_dir))
+
+    def from_shared(self):
+        """Copy back to standard numpy arrays the arrays stored in
+        shared memory by `to_shared`.
+
+        See Also
+        --------
+        to_shared, is_shared
+
+        """
+        for obj, name in self._get_shareable_arrays():
+            array = getattr(obj, name)
+            if isinstance(array, shared_memory.SharedArray):
+                setattr(obj, name, np.array(array))
+
+    @property
+    def is_shared(self):
+        """True if the data is stored in shared memory."""
+        return shared_memory.is_shared(self.data)
+
+    def make_data_contiguous(self, background=False, mmap_dir=None):
+        """Copy the data to a C-contiguous memory-mapped temporary file.
+
+        This is useful when the data is a strided view of a file, e.g.
+        a spectrum image loaded lazily from a DM3 file, because
+        accessing the data in the order of the file can be much faster
+        than accessing a non-contiguous view.
+
+        Parameters
+        ----------
+        background : bool
+            If True, the copy is performed by a background thread and
+            the data is replaced by the copy when it finishes. Until
+            then the original data is used. If the data is replaced by
+            other means before the copy finishes, the copy is
+            discarded.
+        mmap_dir : {None, str}
+            The directory in which the memory-mapped file is created.
+            If None the default temporary directory is used.
+
+        Returns
+        -------
+        If background is True, the thread that performs the copy. Use
+        its join method to wait until the copy finishes.
+
+        """
+        source = self.data
+        if source.flags['C_CONTIGUOUS']:
+            return
+        tempf = tempfile.NamedTemporaryFile(dir=mmap_dir)
+        out = np.memmap(tempf, dtype=source.dtype, mode='w+',
+                        shape=source.shape)
+
+        def copy():
+            if source.ndim == 0:
+                out[...] = source
+            else:
+                # Copy in chunks of approximately 64 MB
+                step = max(1, 2 ** 26 // max(1, source[0].nbytes))
+                for i in xrange(0, source.shape[0], step):
+                    out[i:i + step] = source[i:i + step]
+            out.flush()
+            if self.data is source:
+                self.data = out
+                # Store the temporary file in the signal class to
+                # avoid its deletion when garbage collecting
+                self._data_temporary_file = tempf
+
+        if background is True:
+            thread = threading.Thread(target=copy)
+            thread.daemon = True
+            thread.start()
+            return thread
+        else:
+            copy()
+
     def change_dtype(self, dtype):
         """Change the data type
         
@@ -1583,9 +2064,10 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         """
         if same_window is None:
             same_window = preferences.MachineLearning.same_window
-        factors=self.learning_results.factors
         if comp_ids is None:
             comp_ids = self.learning_results.output_dimension
+        factors = self.learning_results.get_components('factors',
+                                                       comp_ids)
             
         return self._plot_factors_or_pchars(factors, 
                                             comp_ids=comp_ids, 
@@ -1627,7 +2109,8 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         """
         if same_window is None:
             same_window = preferences.MachineLearning.same_window
-        factors=self.learning_results.bss_factors
+        factors = self.learning_results.get_components('bss_factors',
+                                                       comp_ids)
         return self._plot_factors_or_pchars(factors, 
                                             comp_ids=comp_ids, 
                                             calibrate=calibrate,
@@ -1679,14 +2162,16 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         """
         if same_window is None:
             same_window = preferences.MachineLearning.same_window
-        loadings=self.learning_results.loadings.T
+        if comp_ids is None:
+            comp_ids = self.learning_results.output_dimension
+        loadings = self.learning_results.get_components('loadings',
+                                                        comp_ids).T
         if with_factors:
-            factors=self.learning_results.factors
+            factors = self.learning_results.get_components('factors',
+                                                           comp_ids)
         else:
             factors=None
         
-        if comp_ids is None:
-            comp_ids = self.learning_results.output_dimension
         return self._plot_loadings(loadings, comp_ids=comp_ids, 
                                  with_factors=with_factors, factors=factors,
                                  same_window=same_window, comp_label=comp_label,
@@ -1736,9 +2221,11 @@ reconstruction created using either get_decomposition_model or get_bss_model met
         """
         if same_window is None:
             same_window = preferences.MachineLearning.same_window
-        loadings=self.learning_results.bss_loadings.T
+        loadings = self.learning_results.get_components('bss_loadings',
+                                                        comp_ids).T
         if with_factors:
-            factors=self.learning_results.bss_factors
+            factors = self.learning_results.get_components('bss_factors',
+                                                           comp_ids)
         else: factors=None
         return self._plot_loadings(loadings, comp_ids=comp_ids, 
                                  with_factors=with_factors, factors=factors,
@@ -1820,8 +2307,10 @@ reconstruction created using either get_decomposition_model or get_bss_model met
             
         """
         
-        factors=self.learning_results.factors
-        loadings=self.learning_results.loadings.T
+        factors = self.learning_results.get_components('factors',
+                                                       comp_ids)
+        loadings = self.learning_results.get_components('loadings',
+                                                        comp_ids).T
         self._export_factors(factors, folder=folder,comp_ids=comp_ids,
                              calibrate=calibrate, multiple_files=multiple_files,
                              factor_prefix=factor_prefix,
@@ -1918,8 +2407,10 @@ reconstruction created using either get_decomposition_model or get_bss_model met
             
         """
         
-        factors=self.learning_results.bss_factors
-        loadings=self.learning_results.bss_loadings.T
+        factors = self.learning_results.get_components('bss_factors',
+                                                       comp_ids)
+        loadings = self.learning_results.get_components('bss_loadings',
+                                                        comp_ids).T
         self._export_factors(factors,
                              folder=folder,
                              comp_ids=comp_ids,
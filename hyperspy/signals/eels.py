@@ -32,10 +32,24 @@ from hyperspy.decorators import only_interactive
 from hyperspy.gui.eels import TEMParametersUI
 from hyperspy.defaults_parser import preferences
 import hyperspy.gui.messages as messagesui
-from hyperspy.misc.progressbar import progressbar
 from hyperspy.components.power_law import PowerLaw
 
 
+def _richardson_lucy(D, kernel, iterations):
+    """Richardson-Lucy deconvolution of a single spectrum.
+    
+    """
+    psf_size = len(kernel)
+    imax = kernel.argmax()
+    mimax = psf_size -1 - imax
+    O = D.copy()
+    for i in xrange(iterations):
+        first = np.convolve(kernel, O)[imax: imax + psf_size]
+        O = O * (np.convolve(kernel[::-1], 
+                 D / first)[mimax: mimax + psf_size])
+    return O
+
+
 class EELSSpectrum(Spectrum):
     
     def __init__(self, *args, **kwards):
@@ -472,7 +486,7 @@ class EELSSpectrum(Spectrum):
         return cl
             
     def richardson_lucy_deconvolution(self,  psf, iterations=15, 
-                                      mask=None):
+                                      mask=None, parallel=None):
         """1D Richardson-Lucy Poissonian deconvolution of 
         the spectrum by the given kernel.
     
@@ -485,6 +499,9 @@ class EELSSpectrum(Spectrum):
             It must have the same signal dimension as the current 
             spectrum and a spatial dimension of 0 or the same as the 
             current spectrum.
+        parallel : {None, 'threads', 'processes'}
+            If not None the spectra are processed in parallel. See 
+            `map` for details.
             
         Notes:
         -----
@@ -495,41 +512,14 @@ class EELSSpectrum(Spectrum):
         
         """
 
-        ds = self.deepcopy()
-        ds.data = ds.data.copy()
+        ds = self.map(_richardson_lucy, kernel=psf,
+                      iterations=iterations, parallel=parallel)
         ds.mapped_parameters.title += (
             ' after Richardson-Lucy deconvolution %i iterations' % 
                 iterations)
         if ds.tmp_parameters.has_item('filename'):
                 ds.tmp_parameters.filename += (
                     '_after_R-L_deconvolution_%iiter' % iterations)
-        psf_size = psf.axes_manager.signal_axes[0].size
-        kernel = psf()
-        imax = kernel.argmax()
-        j = 0
-        maxval = self.axes_manager.navigation_size
-        if maxval > 0:
-            pbar = progressbar(maxval=maxval)
-        for D in self:
-            D = D.data.copy()
-            if psf.axes_manager.navigation_dimension != 0:
-                kernel = psf(axes_manager=self.axes_manager)
-                imax = kernel.argmax()
-
-            s = ds(axes_manager=self.axes_manager)
-            mimax = psf_size -1 - imax
-            O = D.copy()
-            for i in xrange(iterations):
-                first = np.convolve(kernel, O)[imax: imax + psf_size]
-                O = O * (np.convolve(kernel[::-1], 
-                         D / first)[mimax: mimax + psf_size])
-            s[:] = O
-            j += 1
-            if maxval > 0:
-                pbar.update(j)
-        if maxval > 0:
-            pbar.finish()
-        
         return ds
 
             
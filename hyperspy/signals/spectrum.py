@@ -44,6 +44,17 @@ from hyperspy.decorators import interactive_range_selector
 from hyperspy.decorators import auto_replot
 from hyperspy.misc.utils import one_dim_findpeaks
 
+def _findpeaks_with_padding(spectrum, maxpeakn, **kwargs):
+    """Run one_dim_findpeaks and pad the result with zeros to 
+    `maxpeakn` rows so the result has the same shape for all the
+    spectra.
+    
+    """
+    peaks = np.zeros((maxpeakn, 3))
+    found = one_dim_findpeaks(spectrum, maxpeakn=maxpeakn, **kwargs)
+    peaks[:found.shape[0]] = found
+    return peaks
+
 
             
 class Spectrum(Signal):
@@ -375,7 +386,7 @@ class Spectrum(Signal):
 
     def peakfind_1D(self, xdim=None,slope_thresh=0.5, amp_thresh=None, 
                     subchannel=True, medfilt_radius=5, maxpeakn=30000, 
-                    peakgroup=10):
+                    peakgroup=10, parallel=None):
         """Find peaks along a 1D line (peaks in spectrum/spectra).
 
         Function to locate the positive peaks in a noisy x-y data set.
@@ -424,14 +435,20 @@ class Spectrum(Signal):
         subpix : bool (optional)
                  default is set to True
 
+        parallel : {None, 'threads', 'processes'}
+                   If not None the spectra are processed in parallel.
+                   See `map` for details.
+
         Returns
         -------
         P : array of shape (npeaks, 3)
             contains position, height, and width of each peak
+            The array is stored in the `peaks` attribute. For
+            multidimensional data its shape is 
+            (npeaks, 3) + navigation shape.
             
         """
-        if len(self.data.shape)==1:
-            # preallocate a large array for the results
+        if self.axes_manager.navigation_dimension == 0:
             self.peaks=one_dim_findpeaks(self.data,
                 slope_thresh=slope_thresh,
                 amp_thresh=amp_thresh,
@@ -439,60 +456,23 @@ class Spectrum(Signal):
                 maxpeakn=maxpeakn,
                 peakgroup=peakgroup,
                 subchannel=subchannel)
-                
-        elif len(self.data.shape)==2:
-            pbar=progressbar.ProgressBar(
-                    maxval=self.data.shape[1]).start()
-            # preallocate a large array for the results
-            # the third dimension is for the number of rows in your 
-            # data.
-            # assumes spectra are rows of the 2D array, each col is a 
-            # channel.
-            self.peaks=np.zeros((maxpeakn,3,self.data.shape[0]))
-            for i in xrange(self.data.shape[1]):
-                tmp=one_dim_findpeaks(
-                                    self.data[i],
-                                    slope_thresh=slope_thresh,
-                                    amp_thresh=amp_thresh,
-                                    medfilt_radius=medfilt_radius,
-                                    maxpeakn=maxpeakn,
-                                    peakgroup=peakgroup,
-                                    subchannel=subchannel)
-                self.peaks[:tmp.shape[0],:,i]=tmp
-                pbar.update(i+1)
-            # trim any extra blank space
-            # works by summing along axes to compress to a 1D line, then
-            # finds
-            # the first 0 along that line.
-            trim_id=np.min(np.nonzero(np.sum(np.sum(self.peaks,axis=2),
-                                             axis=1)==0))
-            pbar.finish()
-            self.peaks=self.peaks[:trim_id,:,:]
-        elif len(self.data.shape)==3:
-            # preallocate a large array for the results
-            self.peaks=np.zeros((maxpeakn,3,self.data.shape[0],
-                                 self.data.shape[1]))
-            pbar=progressbar.ProgressBar(
-                maxval=self.data.shape[0]).start()
-            for i in xrange(self.data.shape[0]):
-                for j in xrange(self.data.shape[1]):
-                    tmp=one_dim_findpeaks(self.data[i,j],
-                            slope_thresh=slope_thresh,
-                            amp_thresh=amp_thresh,
-                            medfilt_radius=medfilt_radius,
-                            maxpeakn=maxpeakn,
-                            peakgroup=peakgroup,
-                            subchannel=subchannel)
-                    self.peaks[:tmp.shape[0],:,i,j]=tmp
-                pbar.update(i+1)
-            # trim any extra blank space
-            # works by summing along axes to compress to a 1D line, 
-            # then finds
-            # the first 0 along that line.
-            trim_id=np.min(np.nonzero(np.sum(np.sum(np.sum(
-                            self.peaks,axis=3),axis=2),axis=1)==0))
-            pbar.finish()
-            self.peaks=self.peaks[:trim_id,:,:,:]
+            return
+        # The results for each spectrum are stored in an array of shape
+        # (maxpeakn, 3) that we then move to the first two indices
+        peaks = self.map(_findpeaks_with_padding,
+                         slope_thresh=slope_thresh,
+                         amp_thresh=amp_thresh,
+                         medfilt_radius=medfilt_radius,
+                         maxpeakn=maxpeakn,
+                         peakgroup=peakgroup,
+                         subchannel=subchannel,
+                         parallel=parallel).data
+        nav_dim = self.axes_manager.navigation_dimension
+        peaks = peaks.transpose([nav_dim, nav_dim + 1] + range(nav_dim))
+        # trim any extra blank space
+        found = np.nonzero(np.any(peaks.reshape((maxpeakn, -1)), 1))[0]
+        trim_id = found[-1] + 1 if len(found) else 0
+        self.peaks = peaks[:trim_id]
 
     def to_image(self, signal_to_index=0):
         """Spectrum to image
@@ -590,11 +570,11 @@ class Spectrum(Signal):
         """
         if (polynomial_order is not None and 
             number_of_points) is not None:
-            for spectrum in self:
-                spectrum.data[:] = utils.sg(self(),
-                                            number_of_points, 
-                                            polynomial_order,
-                                            differential_order)
+            self.map(utils.sg,
+                     num_points=number_of_points,
+                     pol_degree=polynomial_order,
+                     diff_order=differential_order,
+                     inplace=True)
         else:
             smoother = SmoothingSavitzkyGolay(self)
             smoother.differential_order = differential_order
@@ -22,8 +22,11 @@ import os
 import numpy as np
 from generate_dm_testing_files import data_types
 
-from nose.tools import assert_true
+from nose.tools import assert_true, assert_equal
 from hyperspy.io import load
+from hyperspy.misc.utils import DictionaryBrowser, LazyNode
+from hyperspy.misc.dm3reader import parseDM3
+from hyperspy.io_plugins import digital_micrograph
 
 my_path = os.path.dirname(__file__)
 
@@ -61,6 +64,73 @@ def test_content():
             dat = dat.astype(data_types[key])
             yield check_content, data, dat, subfolder, key
 
+def test_lazy_content():
+    for subfolder in data_dict:
+        for key, data in data_dict[subfolder].iteritems():
+            fname = "test-%s.dm3" % key
+            filename = os.path.join(my_path, subfolder, fname)
+            yield check_lazy_content, filename, data, subfolder, key
+
+def test_header_only():
+    for subfolder in data_dict:
+        for key, data in data_dict[subfolder].iteritems():
+            fname = "test-%s.dm3" % key
+            filename = os.path.join(my_path, subfolder, fname)
+            yield check_header_only, filename, data, subfolder, key
+
+def check_header_only(filename, data, subfolder, key):
+    s = load(filename)
+    sh = load(filename, header_only=True)
+    msg = 'header only %s type % i' % (subfolder, key)
+    assert_true(np.all(sh.data == data), msg=msg)
+    assert_equal(sh.mapped_parameters.as_dictionary(),
+                 s.mapped_parameters.as_dictionary(), msg=msg)
+    for axis, axis_h in zip(s.axes_manager.axes, sh.axes_manager.axes):
+        assert_equal(axis.get_axis_dictionary(),
+                     axis_h.get_axis_dictionary(), msg=msg)
+    # The original parameters are read on first access
+    assert_true(isinstance(sh.original_parameters.__dict__['root']['value'],
+                           LazyNode), msg=msg)
+    assert_equal(sh.original_parameters.as_dictionary(),
+                 s.original_parameters.as_dictionary(), msg=msg)
+    assert_true(isinstance(sh.original_parameters.root, DictionaryBrowser),
+                msg=msg)
+
+def test_indexed_tags():
+    for subfolder in data_dict:
+        for key in data_dict[subfolder]:
+            fname = "test-%s.dm3" % key
+            filename = os.path.join(my_path, subfolder, fname)
+            yield check_indexed_tags, filename, subfolder, key
+
+def check_indexed_tags(filename, subfolder, key):
+    index = {}
+    digital_micrograph.open_dm3(filename, header_only=True, index=index)
+    tags = digital_micrograph.read_indexed_tags(filename, index, 'little')
+    assert_equal(tags, parseDM3(filename), 
+                 msg='indexed tags %s type % i' % (subfolder, key))
+
+def test_lazy_node():
+    calls = []
+    def loader():
+        calls.append(1)
+        return {'a' : {'b' : 1}}
+    d = DictionaryBrowser({'node' : LazyNode(loader), 'c' : 2})
+    assert_equal(d.c, 2)
+    assert_equal(len(calls), 0)
+    assert_equal(d.node.a.b, 1)
+    assert_equal(d.as_dictionary(), {'node' : {'a' : {'b' : 1}}, 'c' : 2})
+    assert_equal(len(calls), 1)
+    # Printing also loads the node
+    d = DictionaryBrowser({'node' : LazyNode(loader)})
+    assert_true('b = 1' in repr(d))
+    assert_equal(len(calls), 2)
+
+def check_lazy_content(filename, data, subfolder, key):
+    s = load(filename, lazy=True)
+    assert_true(np.all(s.data == data), 
+                msg = 'lazy content %s type % i' % (subfolder, key))
+
 def check_load(filename, subfolder, key):
     try:
         s = load(filename)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import struct
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_true, assert_false, assert_equal
+
+from hyperspy.io_plugins.fei import load_ser_file, ser_reader
+
+
+def write_spectrum_ser(filename, data, written=None):
+    """Write a minimal SER file of float32 spectra.
+
+    Parameters
+    ----------
+    data : array of shape (y, x, channels)
+    written : None or int
+        If not None, only the first `written` elements are stored, as in
+        an interrupted acquisition.
+
+    """
+    ny, nx, channels = data.shape
+    total = nx * ny
+    if written is None:
+        written = total
+    element_dtype = np.dtype([
+        ("CalibrationOffset", "<f8"),
+        ("CalibrationDelta", "<f8"),
+        ("CalibrationElement", "<u4"),
+        ("DataType", "<u2"),
+        ("ArrayLength", "<u4"),
+        ("Array", ("<f4", channels)),
+        ("TagTypeID", "<u2"),
+        ("Unknown", "<u2"),
+        ("Time", "<u4"),
+        ("PositionX", "<f8"),
+        ("PositionY", "<f8"),])
+    header = struct.pack('<HHHLLLLLL', 0x4949, 0x0197, 0x0210, 16672,
+                         16706, total, written, 0, 2)
+    for size, units in ((nx, 'meters'), (ny, 'meters')):
+        header += struct.pack('<LddLL', size, 0., 1e-9, 0, 0)
+        header += struct.pack('<L', len(units)) + units
+    data_offset = len(header) + 8 * total
+    offsets = data_offset + element_dtype.itemsize * np.arange(total)
+    header += offsets.astype('<u4').tostring()
+    # The tags are stored just after the data
+    header += (offsets + element_dtype.itemsize - 24).astype(
+        '<u4').tostring()
+    elements = np.zeros(written, dtype=element_dtype)
+    elements['CalibrationOffset'] = 100.
+    elements['CalibrationDelta'] = 0.5
+    elements['DataType'] = 7
+    elements['ArrayLength'] = channels
+    elements['Array'] = data.reshape((total, channels))[:written]
+    elements['TagTypeID'] = 16706
+    elements['PositionX'] = np.tile(np.arange(nx), ny)[:written]
+    elements['PositionY'] = np.repeat(np.arange(ny), nx)[:written]
+    f = open(filename, 'wb')
+    f.write(header)
+    f.write(elements.tostring())
+    f.close()
+    return data_offset, element_dtype.itemsize
+
+
+class TestLazySER:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'test_1.ser')
+        self.data = np.arange(2 * 3 * 5, dtype='float32').reshape((2, 3, 5))
+        self.data_offset, self.itemsize = write_spectrum_ser(
+            self.filename, self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_memmap_offset_and_shape(self):
+        header, data = load_ser_file(self.filename, lazy=True)
+        assert_true(isinstance(data, np.memmap))
+        assert_equal(data.offset, self.data_offset)
+        assert_equal(data.shape, (6,))
+        assert_equal(data.dtype.itemsize, self.itemsize)
+        assert_true(np.all(data['Array'] == self.data.reshape((6, 5))))
+
+    def test_lazy_equals_eager(self):
+        lazy_header, lazy_data = load_ser_file(self.filename, lazy=True)
+        header, data = load_ser_file(self.filename, lazy=False)
+        assert_false(isinstance(data, np.memmap))
+        assert_equal(lazy_data.dtype, data.dtype)
+        for name in data.dtype.names:
+            assert_true(np.all(lazy_data[name] == data[name]))
+
+    def test_ser_reader(self):
+        for lazy in (True, False):
+            dictionary = ser_reader(self.filename, lazy=lazy)
+            assert_equal(dictionary['data'].shape, (2, 3, 5))
+            assert_true(np.all(dictionary['data'] == self.data))
+            assert_equal([axis['size'] for axis in dictionary['axes']],
+                         [3, 2, 5])
+            assert_equal(dictionary['axes'][0]['units'], 'nm')
+            assert_equal(dictionary['axes'][2]['offset'], 100.)
+        # The data of the lazy reader is a view of the map
+        dictionary = ser_reader(self.filename, lazy=True)
+        assert_true(isinstance(dictionary['data'].base, np.memmap) or
+                    isinstance(dictionary['data'], np.memmap))
+        parameters = \
+            dictionary['original_parameters']['ser_header_parameters']
+        assert_true(np.all(parameters['PositionX'] == [0, 1, 2] * 2))
+
+
+class TestInterruptedSER:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'test_1.ser')
+        self.data = np.arange(2 * 3 * 5, dtype='float32').reshape((2, 3, 5))
+        write_spectrum_ser(self.filename, self.data, written=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_memmap_clipped_to_file_size(self):
+        header, data = load_ser_file(self.filename, lazy=True)
+        assert_equal(header['TotalNumberElements'][0], 6)
+        assert_equal(data.shape, (4,))
+        assert_true(np.all(data['Array'] == self.data.reshape((6, 5))[:4]))
+
+    def test_ser_reader_fills_with_nan(self):
+        dictionary = ser_reader(self.filename, lazy=True)
+        data = dictionary['data'].reshape((6, 5))
+        assert_true(np.all(data[:4] == self.data.reshape((6, 5))[:4]))
+        assert_true(np.all(np.isnan(data[4:])))
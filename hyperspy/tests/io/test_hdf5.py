@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.io_plugins import hdf5
+from hyperspy.learn.mva import LearningResults
+
+
+class TestLazyLearningResults:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'results.hdf5')
+        learning_results = LearningResults()
+        learning_results.factors = np.random.random((16, 10))
+        learning_results.loadings = np.random.random((30, 10))
+        learning_results.explained_variance = np.arange(10.)
+        learning_results.output_dimension = 10
+        self.original = learning_results
+        with h5py.File(self.filename, 'w') as f:
+            hdf5.write_learning_results(learning_results,
+                                        f.create_group('learning_results'))
+        with h5py.File(self.filename, 'r') as f:
+            dictionary = hdf5.hdfgroup2dict(
+                f['learning_results'], {},
+                lazy_keys=hdf5.lazy_learning_results)
+        self.learning_results = LearningResults()
+        for key, value in dictionary.iteritems():
+            setattr(self.learning_results, key, value)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_read_on_access(self):
+        assert_true(self.learning_results.is_lazy('factors'))
+        assert_true(np.all(self.learning_results.factors ==
+                           self.original.factors))
+        assert_true(not self.learning_results.is_lazy('factors'))
+
+    def test_get_components(self):
+        loadings = self.learning_results.get_components('loadings', 3)
+        assert_equal(loadings.shape, (30, 3))
+        assert_true(np.all(loadings == self.original.loadings[:,:3]))
+        assert_true(self.learning_results.is_lazy('loadings'))
+
+    def test_crop_decomposition_dimension(self):
+        self.learning_results.crop_decomposition_dimension(4)
+        assert_true(self.learning_results.is_lazy('loadings'))
+        assert_equal(self.learning_results.loadings.shape, (30, 4))
+        assert_equal(self.learning_results.factors.shape, (16, 4))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.io import load
+from hyperspy.signals.spectrum import Spectrum
+
+
+class TestHSR:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'test.hsr')
+        s = Spectrum({'data' : np.random.random((2, 3, 10))})
+        s.mapped_parameters.title = 'test'
+        s.axes_manager.axes[2].scale = 0.5
+        s.learning_results.factors = np.ones((10, 2))
+        s.save(self.filename, overwrite=True)
+        self.spectrum = s
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_data_is_memmapped(self):
+        s = load(self.filename)
+        assert_true(isinstance(s.data, np.memmap))
+        assert_true(np.all(s.data == self.spectrum.data))
+
+    def test_axes_and_parameters(self):
+        s = load(self.filename)
+        assert_equal(s.axes_manager.axes[2].scale, 0.5)
+        assert_equal(s.mapped_parameters.title, 'test')
+        assert_true(np.all(s.learning_results.factors == 1))
+
+    def test_transposed_data(self):
+        self.spectrum.data = self.spectrum.data[::-1]
+        self.spectrum.save(self.filename, overwrite=True)
+        s = load(self.filename)
+        assert_true(np.all(s.data == self.spectrum.data))
+
+
+class TestHSRLazyLearningResults:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        s = Spectrum({'data' : np.random.random((2, 3, 10))})
+        s.learning_results.factors = np.random.random((10, 2))
+        s.learning_results.loadings = np.random.random((6, 2))
+        s.learning_results.explained_variance = np.arange(2.)
+        s.save(os.path.join(self.folder, 'test.hdf5'))
+        self.spectrum = s
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip_from_hdf5(self):
+        s = load(os.path.join(self.folder, 'test.hdf5'))
+        assert_true(s.learning_results.is_lazy('factors'))
+        filename = os.path.join(self.folder, 'test.hsr')
+        s.save(filename)
+        s = load(filename)
+        original = self.spectrum.learning_results
+        for attribute in ('factors', 'loadings', 'explained_variance'):
+            assert_true(np.all(getattr(s.learning_results, attribute) ==
+                               getattr(original, attribute)))
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import (assert_true, assert_false, assert_equal,
+                        assert_almost_equal)
+
+from hyperspy.io import load
+from hyperspy.io_plugins import mrc
+from hyperspy.misc.utils import LazyNode
+from hyperspy.signals.image import Image
+
+
+class TestMRCRoundTrip:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'stack.mrc')
+        self.data = np.arange(3 * 4 * 5, dtype='float32').reshape((3, 4, 5))
+        s = Image({'data' : self.data})
+        tilt, y, x = s.axes_manager.axes
+        tilt.scale, tilt.offset, tilt.units = 10., -10., 'deg'
+        for axis in (x, y):
+            axis.scale, axis.units = 0.5, 'nm'
+        x.offset = 2.
+        self.s = s
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_standard_header(self):
+        # Write in chunks of one image
+        self.s.save(self.filename, extended_header=False, chunk_size=80)
+        s = load(self.filename)
+        assert_true(np.all(s.data == self.data))
+        header = s.original_parameters.std_header
+        assert_equal((header.NX, header.NY, header.NZ), (5, 4, 3))
+        assert_equal(header.MODE, 2)
+        assert_equal(header.NEXT, 0)
+        # The lengths and origins are stored in Amstrongs
+        assert_almost_equal(header.Xlen, 25.)
+        assert_almost_equal(header.XORIGIN, 20.)
+        assert_equal(header.AMIN, 0)
+        assert_equal(header.AMAX, 59)
+        assert_almost_equal(header.AMEAN, 29.5)
+        assert_false(s.original_parameters.has_item('fei_header'))
+        tilt, y, x = s.axes_manager.axes
+        assert_almost_equal(x.scale, 0.5)
+        assert_almost_equal(y.scale, 0.5)
+        assert_almost_equal(x.offset, 2.)
+        assert_almost_equal(tilt.scale, 10.)
+        assert_almost_equal(tilt.offset, -10.)
+        assert_equal(x.units, 'nm')
+
+    def test_extended_header(self):
+        self.s.save(self.filename, extended_header=True)
+        assert_equal(os.path.getsize(self.filename),
+                     1024 + mrc.fei_header_size + self.data.nbytes)
+        s = load(self.filename)
+        assert_true(np.all(s.data == self.data))
+        assert_equal(s.original_parameters.std_header.NEXT,
+                     mrc.fei_header_size)
+        # The extended header is read when it is accessed
+        assert_true(isinstance(
+            s.original_parameters.__dict__['fei_header']['value'], LazyNode))
+        fei_header = s.original_parameters.fei_header
+        assert_true(np.allclose(fei_header.a_tilt[:3], [-10, 0, 10]))
+        assert_true(np.allclose(fei_header.pixel_size[:3], 0.5e-9))
+        assert_true(np.all(fei_header.pixel_size[3:] == 0))
+        # FEI stores the scale in the extended header
+        tilt, y, x = s.axes_manager.axes
+        assert_almost_equal(x.scale, 0.5)
+        assert_almost_equal(y.scale, 0.5)
+
+    def test_other_length_units(self):
+        for axis in self.s.axes_manager.signal_axes:
+            axis.units = 'um'
+        for extended_header in (False, True):
+            self.s.save(self.filename, extended_header=extended_header,
+                        overwrite=True)
+            s = load(self.filename)
+            tilt, y, x = s.axes_manager.axes
+            for axis in (x, y):
+                assert_equal(axis.units, 'nm')
+                # The pixel size is stored in single precision
+                assert_almost_equal(axis.scale, 500., places=4)
+            if extended_header is True:
+                assert_true(np.allclose(
+                    s.original_parameters.fei_header.pixel_size[:3], 
+                    0.5e-6))
+            else:
+                assert_almost_equal(x.offset, 2000.)
+
+    def test_unknown_units(self):
+        # The pixel size is not defined, the scale is read from the 
+        # standard header
+        for axis in self.s.axes_manager.signal_axes:
+            axis.units = 'px'
+        self.s.save(self.filename, extended_header=True)
+        s = load(self.filename)
+        assert_true(np.all(s.original_parameters.fei_header.pixel_size == 0))
+        tilt, y, x = s.axes_manager.axes
+        assert_almost_equal(x.scale, 0.5)
+        assert_almost_equal(y.scale, 0.5)
+        assert_almost_equal(x.offset, 2.)
+
+    def test_extended_header_is_kept(self):
+        self.s.save(self.filename, extended_header=True)
+        s = load(self.filename)
+        filename = os.path.join(self.folder, 'copy.mrc')
+        s.save(filename)
+        s = load(filename)
+        assert_equal(s.original_parameters.std_header.NEXT,
+                     mrc.fei_header_size)
+        assert_true(np.allclose(s.original_parameters.fei_header.a_tilt[:3],
+                                [-10, 0, 10]))
+
+    def test_single_image(self):
+        s = Image({'data' : self.data[0]})
+        s.save(self.filename)
+        s = load(self.filename)
+        # The reader always returns a stack
+        assert_equal(s.data.shape, (1, 4, 5))
+        assert_true(np.all(s.data[0] == self.data[0]))
+
+
+def test_get_mode():
+    for dtype, mode, written in (('int8', 1, 'i2'), ('uint8', 1, 'i2'),
+                                 ('int16', 1, 'i2'), ('uint16', 6, 'u2'),
+                                 ('int32', 2, 'f4'), ('float64', 2, 'f4'),
+                                 ('complex128', 4, 'c8')):
+        yield check_mode, dtype, mode, written
+
+def check_mode(dtype, mode, written):
+    assert_equal(mrc.get_mode(dtype), (mode, np.dtype(written)))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import datetime
+
+import numpy as np
+from nose.tools import assert_true, assert_equal, raises
+
+from hyperspy.io import load
+from hyperspy.io_plugins import msa
+from hyperspy.signals.spectrum import Spectrum
+
+example = '''#FORMAT      : EMSA/MAS Spectral Data File\r
+#VERSION     : 1.0\r
+#TITLE       : example\r
+#DATE        : 05-APR-2012\r
+#TIME        : 14:25\r
+#NPOINTS     : 7\r
+#NCOLUMNS    : 3\r
+#XUNITS      : eV\r
+#DATATYPE    : Y\r
+#XPERCHAN    : 0.5\r
+#OFFSET      : 100\r
+#BEAMKV      : 200\r
+#SPECTRUM    : Spectral Data Starts Here\r
+1.5, 2, 3\r
+4e1, -5, 6\r
+7\r
+#ENDOFDATA   : \r
+'''
+
+
+class TestMSA:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'example.msa')
+        with open(self.filename, 'wb') as f:
+            f.write(example)
+        self.data = np.array([1.5, 2, 3, 40, -5, 6, 7])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_file_reader(self):
+        dictionary, = msa.file_reader(self.filename)
+        assert_true(np.all(dictionary['data'] == self.data))
+        axis = dictionary['axes'][0]
+        assert_equal(axis['size'], 7)
+        assert_equal(axis['scale'], 0.5)
+        assert_equal(axis['offset'], 100)
+        assert_equal(axis['units'], 'eV')
+        mapped = dictionary['mapped_parameters']
+        assert_equal(mapped['date'], datetime.date(2012, 4, 5))
+        assert_equal(mapped['time'], datetime.time(14, 25))
+        assert_equal(mapped['TEM']['beam_energy'], 200)
+
+    def test_file_data_reader(self):
+        data = msa.file_data_reader(self.filename)
+        assert_true(np.all(data == self.data))
+
+    def test_wrong_npoints(self):
+        # When NPOINTS does not match the values are parsed one by one
+        with open(self.filename, 'wb') as f:
+            f.write(example.replace('NPOINTS     : 7', 'NPOINTS     : 8'))
+        data = msa.file_data_reader(self.filename)
+        assert_true(np.all(data == self.data))
+
+    @raises(ValueError)
+    def test_not_a_number(self):
+        with open(self.filename, 'wb') as f:
+            f.write(example.replace('4e1', 'four'))
+        msa.file_data_reader(self.filename)
+
+    def test_xy(self):
+        lines = example.split('\r\n')
+        start = lines.index('#SPECTRUM    : Spectral Data Starts Here')
+        xy = ['%g, %g' % (100 + 0.5 * i, y) for i, y in enumerate(self.data)]
+        text = '\r\n'.join(lines[:start + 1] + xy + lines[-2:])
+        with open(self.filename, 'wb') as f:
+            f.write(text.replace('DATATYPE    : Y', 'DATATYPE    : XY'))
+        dictionary, = msa.file_reader(self.filename)
+        assert_true(np.all(dictionary['data'] == self.data))
+        assert_true(np.all(msa.file_data_reader(self.filename) == self.data))
+
+    def test_header_reader(self):
+        dictionary, = msa.file_header_reader(self.filename)
+        assert_equal(dictionary['shape'], (7,))
+        assert_equal(dictionary['axes'][0]['size'], 7)
+
+
+class TestMSARoundTrip:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        s = Spectrum({'data' : np.arange(10.) / 3})
+        s.axes_manager.signal_axes[0].scale = 0.25
+        s.axes_manager.signal_axes[0].offset = -1.
+        s.axes_manager.signal_axes[0].units = 'keV'
+        s.mapped_parameters.set_item('TEM.beam_energy', 100.)
+        self.s = s
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_round_trip(self, format):
+        filename = os.path.join(self.folder, 'spectrum%s.msa' % format)
+        self.s.save(filename, format=format)
+        s = load(filename)
+        assert_true(np.allclose(s.data, self.s.data))
+        axis = s.axes_manager.signal_axes[0]
+        assert_equal(axis.scale, 0.25)
+        assert_equal(axis.offset, -1.)
+        assert_equal(axis.units, 'keV')
+        assert_equal(s.mapped_parameters.TEM.beam_energy, 100.)
+        assert_equal(s.original_parameters.DATATYPE, format)
+
+    def test_y(self):
+        self.check_round_trip('Y')
+
+    def test_xy(self):
+        self.check_round_trip('XY')
+
+    def test_stack(self):
+        for i in xrange(3):
+            s = self.s.deepcopy()
+            s.data = s.data + i
+            s.save(os.path.join(self.folder, 'spectrum%i.msa' % i),
+                   format='XY' if i == 1 else 'Y')
+        s = load(os.path.join(self.folder, 'spectrum*.msa'), stack=True)
+        assert_equal(s.data.shape, (3, 10))
+        assert_true(np.allclose(s.data, self.s.data + 
+                                np.arange(3)[:, np.newaxis]))
+        assert_equal(s.axes_manager.signal_axes[0].scale, 0.25)
+        assert_equal(s.original_parameters.DATATYPE, 'Y')
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import itertools
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.io import load
+from hyperspy.io_plugins.ripple import write_array_in_chunks
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.signals.image import Image
+
+
+class TestWriteArrayInChunks:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'test.raw')
+        self.data = np.arange(7 * 5 * 3, dtype='int16').reshape((7, 5, 3))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_order(self, data, axes_order, chunk_size):
+        write_array_in_chunks(self.filename, data, axes_order, chunk_size)
+        written = np.fromfile(self.filename, dtype=data.dtype)
+        assert_true(np.all(
+            written == np.transpose(data, axes_order).ravel()))
+
+    def test_axes_orders(self):
+        # A chunk size smaller than a row, a few rows and the whole array
+        for axes_order in itertools.permutations(range(3)):
+            for chunk_size in (1, 40, 2**26):
+                self.check_order(self.data, list(axes_order), chunk_size)
+
+    def test_memmap(self):
+        filename = os.path.join(self.folder, 'source.raw')
+        self.data.tofile(filename)
+        data = np.memmap(filename, dtype=self.data.dtype, mode='r',
+                         shape=self.data.shape)
+        self.check_order(data, [1, 2, 0], 40)
+        del data
+
+    def test_empty(self):
+        write_array_in_chunks(self.filename, np.zeros((0, 3)), [1, 0])
+        assert_equal(os.path.getsize(self.filename), 0)
+
+
+class TestRippleRoundTrip:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data = np.arange(4 * 3 * 6, dtype='float32').reshape((4, 3, 6))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_spectrum(self):
+        filename = os.path.join(self.folder, 'spectrum.rpl')
+        Spectrum({'data' : self.data}).save(filename)
+        s = load(filename)
+        assert_equal(s.data.shape, self.data.shape)
+        assert_true(np.all(s.data == self.data))
+
+    def test_image(self):
+        filename = os.path.join(self.folder, 'image.rpl')
+        Image({'data' : self.data}).save(filename)
+        s = load(filename)
+        assert_equal(s.data.shape, self.data.shape)
+        assert_true(np.all(s.data == self.data))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy import io
+from hyperspy.signals.spectrum import Spectrum
+
+my_path = os.path.dirname(__file__)
+
+
+# The RGB files are not generated correctly (see test_dm3) and the 1D
+# ones cannot be read
+expected_errors = set([os.path.join('dm3_1D_data', 'test-8.dm3'),
+                       os.path.join('dm3_1D_data', 'test-23.dm3')])
+
+def test_scan_dm3_directories():
+    errors = set()
+    for subfolder in ('dm3_1D_data', 'dm3_2D_data', 'dm3_3D_data'):
+        records = io.scan(os.path.join(my_path, subfolder), workers=2)
+        assert_equal(len(records),
+                     len(os.listdir(os.path.join(my_path, subfolder))))
+        for record in records:
+            name = os.path.join(subfolder,
+                                os.path.basename(record['filename']))
+            if 'error' in record:
+                errors.add(name)
+                continue
+            s = io.load(record['filename'])
+            assert_equal(record['shape'], s.data.shape)
+            assert_equal(record['dtype'], s.data.dtype)
+            assert_equal(record['record_by'],
+                         s.mapped_parameters.record_by)
+    assert_equal(errors, expected_errors)
+
+
+class TestScanCache:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'test.hsr')
+        s = Spectrum({'data' : np.zeros((2, 10), dtype='float32')})
+        s.save(self.filename, overwrite=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_offset_and_size(self):
+        record, = io.scan(self.filename)
+        assert_equal(record['format'], 'HSR')
+        assert_equal(record['data_offset'], 0)
+        assert_equal(record['data_size'], 80)
+
+    def test_modified_file_is_scanned_again(self):
+        record, = io.scan(self.filename)
+        assert_equal(record['shape'], (2, 10))
+        s = Spectrum({'data' : np.zeros((3, 10), dtype='float32')})
+        s.save(self.filename, overwrite=True)
+        # Make sure that the modification time changes
+        stat = os.stat(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime + 10))
+        record, = io.scan(self.filename)
+        assert_equal(record['shape'], (3, 10))
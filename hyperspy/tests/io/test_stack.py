@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_true, assert_false, assert_equal, raises
+
+from hyperspy.io import load
+from hyperspy.signals.spectrum import Spectrum
+
+
+class TestLoadStack:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data = np.random.random((3, 10))
+        for i, data in enumerate(self.data):
+            s = Spectrum({'data' : data})
+            s.mapped_parameters.title = 'spectrum'
+            s.axes_manager.signal_axes[0].scale = 0.5
+            if i == 2:
+                s.mapped_parameters.set_item('Sample.description',
+                                             'other')
+            s.save(os.path.join(self.folder, 'spectrum%i.hdf5' % i))
+        self.pattern = os.path.join(self.folder, 'spectrum*.hdf5')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_load_list(self):
+        for parallel in (False, True):
+            spectra = load(self.pattern, parallel=parallel)
+            assert_equal(len(spectra), 3)
+            for s, data in zip(spectra, self.data):
+                assert_true(np.all(s.data == data))
+
+    def test_stack(self):
+        for parallel in (False, True):
+            s = load(self.pattern, stack=True, parallel=parallel)
+            assert_equal(s.data.shape, (3, 10))
+            assert_true(np.all(s.data == self.data))
+            assert_equal(s.axes_manager.signal_axes[0].scale, 0.5)
+            assert_equal(s.mapped_parameters.title,
+                         os.path.split(self.folder)[1])
+
+    def test_stack_mmap(self):
+        s = load(self.pattern, stack=True, mmap=True)
+        assert_true(isinstance(s.data, np.memmap))
+        assert_true(np.all(s.data == self.data))
+
+    def test_stack_metadata_first(self):
+        s = load(self.pattern, stack=True)
+        elements = s.original_parameters.stack_elements
+        assert_equal(elements.element1.original_filename,
+                     'spectrum1.hdf5')
+        # Only the mapped parameters that differ from the ones of the
+        # first file are stored, and the title of the stack does not
+        # count as a difference
+        assert_false(elements.element1.has_item('mapped_parameters'))
+        assert_equal(elements.element2.mapped_parameters.as_dictionary(),
+                     {'Sample' : {'description' : 'other'}})
+        assert_false(elements.element1.has_item('original_parameters'))
+
+    def test_stack_metadata_all(self):
+        s = load(self.pattern, stack=True, stack_metadata='all')
+        elements = s.original_parameters.stack_elements
+        assert_true(elements.element0.has_item('original_parameters'))
+        # Identical original parameters are only stored once
+        assert_equal(elements.element1.original_parameters_as_in,
+                     'element0')
+
+    @raises(ValueError)
+    def test_wrong_stack_metadata(self):
+        load(self.pattern, stack=True, stack_metadata='none')
+
+    @raises(IOError)
+    def test_different_shapes(self):
+        Spectrum({'data' : np.ones(5)}).save(
+            os.path.join(self.folder, 'spectrum3.hdf5'))
+        load(self.pattern, stack=True)
+
+
+class TestLoadStackDataReader:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data = np.arange(30.).reshape((3, 10))
+        for i, data in enumerate(self.data):
+            Spectrum({'data' : data}).save(
+                os.path.join(self.folder, 'spectrum%i.msa' % i))
+        self.pattern = os.path.join(self.folder, 'spectrum*.msa')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_stack(self):
+        for parallel in (False, True):
+            s = load(self.pattern, stack=True, parallel=parallel)
+            assert_true(np.allclose(s.data, self.data))
+            # The parameters of the files after the first one are not
+            # parsed
+            elements = s.original_parameters.stack_elements
+            assert_equal(elements.element2.as_dictionary(),
+                         {'original_filename' : 'spectrum2.msa'})
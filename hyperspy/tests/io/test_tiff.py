@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.io_plugins import tiff
+from hyperspy.misc.tifffile import imread
+
+
+class TestTIFFStackWriter:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'stack.tif')
+        self.data = np.arange(5 * 7 * 9, dtype='int16').reshape((5, 7, 9))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_bigtiff(self):
+        with tiff.TIFFStackWriter(self.filename, bigtiff=True) as writer:
+            for image in self.data:
+                writer.append(image)
+        assert_true(np.all(imread(self.filename) == self.data))
+
+    def test_standard_tiff(self):
+        with tiff.TIFFStackWriter(self.filename, bigtiff=False) as writer:
+            for image in self.data:
+                writer.append(image)
+        assert_true(np.all(imread(self.filename) == self.data))
+
+    def test_lazy_reading(self):
+        with tiff.TIFFStackWriter(self.filename) as writer:
+            for image in self.data:
+                writer.append(image)
+        data = tiff.file_reader(self.filename, lazy=True)[0]['data']
+        assert_true(isinstance(data, np.memmap))
+        assert_true(np.all(data == self.data))
@@ -0,0 +1,185 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.components import Gaussian
+
+
+def create_model(centres):
+    x = np.arange(100.)
+    data = 10 * np.exp(-(x - centres[..., np.newaxis]) ** 2 / 
+                       (2 * 5. ** 2))
+    m = Model(Spectrum({'data' : data}))
+    g = Gaussian()
+    g.name = 'Gaussian'
+    g.A.value = 50
+    g.centre.value = 50
+    g.sigma.value = 4
+    m.append(g)
+    return m
+
+def count_fits(m):
+    """Replace the fit method of the model by one that counts the
+    navigation indices at which it is called."""
+    fit = m.fit
+    m.fitted_indices = []
+    def counting_fit(*args, **kwargs):
+        m.fitted_indices.append(m.axes_manager.indices)
+        return fit(*args, **kwargs)
+    m.fit = counting_fit
+
+
+class TestSaveParameters2HDF5:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'parameters.hdf5')
+        self.centres = np.linspace(40, 60, 12).reshape((4, 3))
+        self.m = create_model(self.centres)
+        self.m.multifit()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        self.m.save_parameters2hdf5(self.filename)
+        m = create_model(self.centres)
+        m.load_parameters_from_hdf5(self.filename)
+        for p1, p2 in zip(self.m[0].parameters, m[0].parameters):
+            for field in ('values', 'std', 'is_set'):
+                assert_true(np.all(p1.map[field] == p2.map[field]))
+        # The current parameters values are charged
+        assert_equal(m[0].centre.value, m[0].centre.map['values'][0, 0])
+
+    def test_file_layout(self):
+        self.m.save_parameters2hdf5(self.filename)
+        with h5py.File(self.filename, 'r') as f:
+            assert_equal(sorted(f['parameters'].keys()),
+                         ['0_gaussian.a', '0_gaussian.centre',
+                          '0_gaussian.sigma'])
+            assert_equal(sorted(f['parameters/0_gaussian.centre'].keys()),
+                         ['is_set', 'std', 'values'])
+
+    def test_only_the_region_of_the_indices_is_written(self):
+        self.m.save_parameters2hdf5(self.filename)
+        centre = self.m[0].centre
+        centre.map['values'] = 0
+        self.m.save_parameters2hdf5(self.filename, [(1, 1), (2, 1)])
+        with h5py.File(self.filename, 'r') as f:
+            values = f['parameters/0_gaussian.centre/values'][...]
+        assert_true(np.all(values[1:3, 1] == 0))
+        assert_true(np.allclose(values[0], self.centres[0]))
+        assert_true(np.allclose(values[:, 0], self.centres[:, 0]))
+
+    @raises(IOError)
+    def test_wrong_shape(self):
+        self.m.save_parameters2hdf5(self.filename)
+        m = create_model(self.centres[:2])
+        m.save_parameters2hdf5(self.filename)
+
+    @raises(IOError)
+    def test_missing_parameter(self):
+        self.m.save_parameters2hdf5(self.filename)
+        m = create_model(self.centres)
+        m.append(Gaussian())
+        m.load_parameters_from_hdf5(self.filename)
+
+
+class TestResume:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'autosave.hdf5')
+        self.centres = np.linspace(40, 60, 12).reshape((4, 3))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_autosave_to_file(self):
+        m = create_model(self.centres)
+        m.multifit(autosave=self.filename, autosave_every=5)
+        # The file is kept and the last spectra are saved too
+        assert_true(os.path.exists(self.filename))
+        with h5py.File(self.filename, 'r') as f:
+            is_set = f['parameters/0_gaussian.centre/is_set'][...]
+            values = f['parameters/0_gaussian.centre/values'][...]
+        assert_true(np.all(is_set))
+        assert_true(np.allclose(values, self.centres))
+
+    def test_temporary_autosave_file_is_deleted(self):
+        cwd = os.getcwd()
+        os.chdir(self.folder)
+        try:
+            m = create_model(self.centres)
+            m.multifit(autosave=True, autosave_every=5)
+            assert_equal(os.listdir(self.folder), [])
+        finally:
+            os.chdir(cwd)
+
+    def test_resume_after_masked_run(self):
+        # Simulate an interrupted fit masking the last rows
+        mask = np.zeros((4, 3), dtype='bool')
+        mask[2:] = True
+        m = create_model(self.centres)
+        m.multifit(mask=mask, autosave=self.filename, autosave_every=4)
+        assert_false(np.any(m[0].centre.map['is_set'][2:]))
+        m = create_model(self.centres)
+        count_fits(m)
+        m.multifit(resume=self.filename, autosave=True)
+        # Only the spectra that were masked are fitted
+        assert_equal(sorted(m.fitted_indices),
+                     [(2, 0), (2, 1), (2, 2), (3, 0), (3, 1), (3, 2)])
+        assert_true(np.all(m[0].centre.map['is_set']))
+        assert_true(np.allclose(m[0].centre.map['values'], self.centres))
+        # autosave=True saves to the resumed file
+        with h5py.File(self.filename, 'r') as f:
+            assert_true(np.all(f['parameters/0_gaussian.centre/is_set']))
+
+    def test_resume_with_mask(self):
+        mask = np.zeros((4, 3), dtype='bool')
+        mask[2:] = True
+        m = create_model(self.centres)
+        m.multifit(mask=mask, autosave=self.filename)
+        m = create_model(self.centres)
+        count_fits(m)
+        mask = np.zeros((4, 3), dtype='bool')
+        mask[3] = True
+        m.multifit(resume=self.filename, mask=mask)
+        assert_equal(sorted(m.fitted_indices), [(2, 0), (2, 1), (2, 2)])
+        assert_false(np.any(m[0].centre.map['is_set'][3]))
+        assert_true(np.allclose(m[0].centre.map['values'][:3],
+                                self.centres[:3]))
+
+    def test_nothing_left_to_fit(self):
+        m = create_model(self.centres)
+        m.multifit(autosave=self.filename)
+        m = create_model(self.centres)
+        count_fits(m)
+        m.multifit(resume=self.filename)
+        assert_equal(m.fitted_indices, [])
+        assert_true(np.allclose(m[0].centre.map['values'], self.centres))
@@ -0,0 +1,172 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model, _batch_lm_messages
+from hyperspy.components import Gaussian
+
+
+def create_model():
+    x = np.arange(100.)
+    centres = np.array([[45., 48., 50.], [52., 55., 53.]])
+    data = 10 * np.exp(-(x - centres[..., np.newaxis]) ** 2 / 
+                       (2 * 5. ** 2))
+    np.random.seed(0)
+    data += np.random.normal(scale=0.1, size=data.shape)
+    m = Model(Spectrum({'data' : data}))
+    g = Gaussian()
+    g.name = 'Gaussian'
+    g.A.value = 100
+    g.centre.value = 50
+    g.sigma.value = 4
+    m.append(g)
+    return m
+
+
+class TestBatchLM:
+    def setUp(self):
+        self.m = create_model()
+        self.reference = create_model()
+        self.reference.multifit(fitter='leastsq')
+
+    def check_maps(self, m, reference, decimal=4):
+        for parameter, expected in zip(m[0].parameters, 
+                                       reference[0].parameters):
+            assert_true(np.all(parameter.map['is_set']))
+            np.testing.assert_almost_equal(parameter.map['values'],
+                                           expected.map['values'],
+                                           decimal=decimal)
+
+    def test_same_as_leastsq(self):
+        self.m.multifit(fitter='batch_lm')
+        self.check_maps(self.m, self.reference)
+        np.testing.assert_almost_equal(self.m[0].centre.map['std'],
+                                       self.reference[0].centre.map['std'],
+                                       decimal=3)
+
+    def test_grad(self):
+        self.m.multifit(fitter='batch_lm', grad=True)
+        self.check_maps(self.m, self.reference)
+
+    def test_batch_size(self):
+        # The last block is shorter than the others
+        self.m.multifit(fitter='batch_lm', batch_size=4)
+        self.check_maps(self.m, self.reference)
+        assert_equal(self.m.get_fit_profile()['fits'], 6)
+
+    def test_fit(self):
+        self.m.axes_manager.indices = (1, 2)
+        self.m.fit(fitter='batch_lm')
+        is_set = self.m[0].centre.map['is_set']
+        assert_equal(is_set.sum(), 1)
+        assert_true(is_set[1, 2])
+        assert_true(abs(self.m[0].centre.value - 53) < 0.1)
+
+    def test_mask(self):
+        mask = np.zeros((2, 3), dtype=bool)
+        mask[0, 1] = True
+        self.m.multifit(fitter='batch_lm', mask=mask)
+        assert_true(np.all(self.m[0].centre.map['is_set'] == ~mask))
+
+    def test_bounded(self):
+        self.m[0].centre.bmax = 49.
+        self.m.multifit(fitter='batch_lm', bounded=True)
+        centres = self.m[0].centre.map['values']
+        assert_true(np.all(centres <= 49. + 1e-8))
+        assert_true(abs(centres[0, 0] - 45) < 0.1)
+
+    def test_weights(self):
+        variance = np.abs(self.m.spectrum.data) + 1
+        self.m.spectrum.variance = variance
+        self.reference.spectrum.variance = variance
+        self.m.multifit(fitter='batch_lm', weights=True)
+        self.reference.multifit(fitter='leastsq', weights=True)
+        self.check_maps(self.m, self.reference)
+
+    def test_diagnostics(self):
+        self.m.multifit(fitter='batch_lm')
+        diagnostics = self.m.diagnostics_map
+        assert_true(np.all(diagnostics['is_set']))
+        assert_true(np.all(diagnostics['nfev'] > 0))
+        for status, message in zip(diagnostics['status'].flat,
+                                   diagnostics['message'].flat):
+            assert_true(status in (1, 2, 3, 4))
+            assert_equal(message, _batch_lm_messages[status][:80])
+
+    def test_twinned_parameter_maps(self):
+        g = Gaussian()
+        g.name = 'Twin'
+        g.A.value = 10
+        g.sigma.value = 4
+        g.centre.twin = self.m[0].centre
+        g.centre.twin_function = lambda x: x + 20
+        g.centre.twin_inverse_function = lambda x: x - 20
+        g.A.free = False
+        g.sigma.free = False
+        self.m.append(g)
+        self.m.multifit(fitter='batch_lm')
+        assert_true(np.all(g.centre.map['is_set']))
+        np.testing.assert_almost_equal(g.centre.map['values'],
+                                       self.m[0].centre.map['values'] + 20)
+        # The fixed parameters are also written
+        assert_true(np.all(g.A.map['values'] == 10))
+        s = g.centre.as_signal()
+        assert_true(np.all(s.data == g.centre.map['values']))
+
+    @raises(ValueError)
+    def test_method_ml(self):
+        self.m.fit(fitter='batch_lm', method='ml')
+
+    @raises(ValueError)
+    def test_multifit_method_ml(self):
+        self.m.multifit(fitter='batch_lm', method='ml')
+
+    @raises(ValueError)
+    def test_ext_bounding(self):
+        self.m.fit(fitter='batch_lm', ext_bounding=True)
+
+    @raises(ValueError)
+    def test_warm_start(self):
+        self.m.multifit(fitter='batch_lm', warm_start='mean')
+
+    @raises(TypeError)
+    def test_unknown_argument(self):
+        self.m.fit(fitter='batch_lm', maxfev=10)
+
+    @raises(TypeError)
+    def test_multifit_unknown_argument(self):
+        self.m.multifit(fitter='batch_lm', maxfev=10)
+
+    @raises(ValueError)
+    def test_convolved(self):
+        self.m.low_loss = self.m.spectrum.deepcopy()
+        self.m.fit(fitter='batch_lm')
+
+    def test_nothing_fitted_after_error(self):
+        try:
+            self.m.multifit(fitter='batch_lm', method='ml')
+        except ValueError:
+            pass
+        assert_false(np.any(self.m[0].centre.map['is_set']))
@@ -0,0 +1,97 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from nose.tools import assert_true, assert_equal
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.components import Gaussian, Offset
+
+
+class TestComponentCache:
+    def setUp(self):
+        x = np.arange(100.)
+        self.centres = np.array([40., 45., 50., 55.])
+        self.offsets = np.array([1., 1., 2., 2.])
+        data = 10 * np.exp(-(x - self.centres[:, np.newaxis]) ** 2 / 
+                           (2 * 5. ** 2)) + self.offsets[:, np.newaxis]
+        m = Model(Spectrum({'data' : data}))
+        g = Gaussian()
+        g.A.value = 50
+        g.centre.value = 50
+        g.sigma.value = 4
+        offset = Offset()
+        offset.offset.free = False
+        m.append(g)
+        m.append(offset)
+        self.m = m
+
+    def set_offset_map(self, values):
+        parameter = self.m[1].offset
+        parameter.map['values'] = values
+        parameter.map['is_set'] = True
+        self.m.charge()
+
+    def test_constant_fixed_component(self):
+        self.set_offset_map(1.5)
+        self.m.multifit()
+        # The fixed component is evaluated once for all the fits
+        assert_equal(self.m.get_component_cache_info(),
+                     {'hits' : 3, 'misses' : 1, 'size' : 1})
+
+    def test_fixed_parameter_changes_between_pixels(self):
+        self.set_offset_map(self.offsets)
+        self.m.multifit()
+        assert_equal(self.m.get_component_cache_info(),
+                     {'hits' : 2, 'misses' : 2, 'size' : 1})
+        # The baseline of every pixel uses its own offset
+        assert_true(np.allclose(self.m[0].centre.map['values'],
+                                self.centres))
+        assert_true(np.allclose(self.m[0].A.map['values'],
+                                10 * 5 * np.sqrt(2 * np.pi)))
+
+    def test_multifit_clears_the_cache(self):
+        self.set_offset_map(1.5)
+        self.m.multifit()
+        self.m.multifit()
+        assert_equal(self.m.get_component_cache_info()['misses'], 1)
+
+    def test_fit_clears_the_cache(self):
+        self.set_offset_map(1.5)
+        self.m.fit()
+        self.m.fit()
+        assert_equal(self.m.get_component_cache_info(),
+                     {'hits' : 0, 'misses' : 1, 'size' : 1})
+
+    def test_signal_range_invalidates(self):
+        self.set_offset_map(1.5)
+        self.m.fit()
+        self.m._keep_component_cache = True
+        self.m.set_signal_range(10, 90)
+        self.m.fit()
+        self.m.fit()
+        self.m._keep_component_cache = False
+        assert_equal(self.m.get_component_cache_info(),
+                     {'hits' : 1, 'misses' : 2, 'size' : 1})
+
+    def test_clear_component_cache(self):
+        self.m.fit()
+        self.m.clear_component_cache()
+        assert_equal(self.m.get_component_cache_info(),
+                     {'hits' : 0, 'misses' : 0, 'size' : 0})
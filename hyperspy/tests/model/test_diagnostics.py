@@ -0,0 +1,183 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        assert_almost_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model, _batch_lm_messages
+from hyperspy.components import Gaussian
+
+
+def create_model():
+    x = np.arange(100.)
+    centres = np.array([45., 50., 55.])
+    data = 10 * np.exp(-(x - centres[:, np.newaxis]) ** 2 / 
+                       (2 * 5. ** 2))
+    np.random.seed(0)
+    data += np.random.normal(scale=0.1, size=data.shape)
+    m = Model(Spectrum({'data' : data}))
+    g = Gaussian()
+    g.name = 'Gaussian'
+    g.A.value = 100
+    g.centre.value = 48
+    g.sigma.value = 4
+    m.append(g)
+    return m
+
+
+class TestFitterDiagnostics:
+    def setUp(self):
+        self.m = create_model()
+
+    def check_chisq(self, diagnostics):
+        m = self.m
+        residuals = (m.spectrum()[m.channel_switches] - 
+                     m.__call__(onlyactive=True))
+        chisq = np.sum(residuals ** 2)
+        assert_almost_equal(diagnostics['chisq'], chisq, places=5)
+        assert_almost_equal(diagnostics['red_chisq'], chisq / (100 - 3),
+                            places=5)
+        assert_true(diagnostics['is_set'])
+        assert_true(diagnostics['time'] >= 0)
+        assert_true(diagnostics['nfev'] > 0)
+
+    def test_leastsq(self):
+        self.m.fit(fitter='leastsq')
+        diagnostics = self.m.diagnostics_map[0]
+        self.check_chisq(diagnostics)
+        assert_true(diagnostics['status'] in (1, 2, 3, 4))
+        assert_equal(diagnostics['message'], self.m.fit_output[3][:80])
+        # The model evaluations include those of leastsq
+        assert_true(diagnostics['nfev'] >= self.m.fit_output[2]['nfev'])
+
+    def test_mpfit(self):
+        self.m.fit(fitter='mpfit')
+        diagnostics = self.m.diagnostics_map[0]
+        self.check_chisq(diagnostics)
+        assert_equal(diagnostics['status'], self.m.fit_output.status)
+        assert_true(diagnostics['status'] > 0)
+        assert_equal(diagnostics['message'], self.m.fit_output.errmsg)
+
+    def test_odr(self):
+        self.m.fit(fitter='odr')
+        diagnostics = self.m.diagnostics_map[0]
+        self.check_chisq(diagnostics)
+        assert_equal(diagnostics['status'], self.m.fit_output.info)
+        assert_equal(diagnostics['message'],
+                     '; '.join(self.m.fit_output.stopreason)[:80])
+
+    def test_fmin(self):
+        self.m.fit(fitter='fmin', disp=False)
+        diagnostics = self.m.diagnostics_map[0]
+        self.check_chisq(diagnostics)
+        assert_equal(diagnostics['status'], -1)
+        assert_equal(diagnostics['message'], '')
+
+    def test_batch_lm(self):
+        self.m.fit(fitter='batch_lm')
+        diagnostics = self.m.diagnostics_map[0]
+        self.check_chisq(diagnostics)
+        assert_true(diagnostics['status'] in (1, 2, 3, 4))
+        assert_equal(diagnostics['message'],
+                     _batch_lm_messages[diagnostics['status']][:80])
+
+    def test_only_the_current_position(self):
+        self.m.axes_manager.indices = (1,)
+        self.m.fit()
+        is_set = self.m.diagnostics_map['is_set']
+        assert_true(np.all(is_set == (False, True, False)))
+        assert_true(np.isnan(self.m.diagnostics_map['chisq'][0]))
+
+    def test_multifit(self):
+        self.m.multifit()
+        assert_true(np.all(self.m.diagnostics_map['is_set']))
+        assert_true(np.all(self.m.diagnostics_map['nfev'] > 0))
+        profile = self.m.get_fit_profile()
+        assert_equal(profile['fits'], 3)
+        assert_equal(profile['nfev'], self.m.diagnostics_map['nfev'].sum())
+
+    def test_diagnostics_as_signal(self):
+        self.m.multifit()
+        s = self.m.diagnostics_as_signal('nfev')
+        assert_true(np.all(s.data == self.m.diagnostics_map['nfev']))
+        assert_equal(s.mapped_parameters.title, 'nfev')
+
+    @raises(ValueError)
+    def test_diagnostics_as_signal_message(self):
+        self.m.diagnostics_as_signal('message')
+
+
+class TestDiagnosticsFiles:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.m = create_model()
+        self.m.axes_manager.indices = (1,)
+        self.m.fit()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_equal(self, diagnostics_map):
+        for field in diagnostics_map.dtype.names:
+            expected = self.m.diagnostics_map[field]
+            if expected.dtype.kind == 'f':
+                # The positions that have not been fitted are NaN
+                assert_true(np.all(np.isnan(diagnostics_map[field]) ==
+                                   np.isnan(expected)))
+                expected = np.nan_to_num(expected)
+                diagnostics_map = diagnostics_map.copy()
+                diagnostics_map[field] = np.nan_to_num(
+                    diagnostics_map[field])
+            assert_true(np.all(diagnostics_map[field] == expected))
+
+    def test_hdf5(self):
+        filename = os.path.join(self.folder, 'parameters.hdf5')
+        self.m.save_parameters2hdf5(filename)
+        m = create_model()
+        m.load_parameters_from_hdf5(filename)
+        self.check_equal(m.diagnostics_map)
+        assert_equal(m.diagnostics_map['message'][1],
+                     self.m.diagnostics_map['message'][1])
+
+    def test_hdf5_without_diagnostics(self):
+        filename = os.path.join(self.folder, 'parameters.hdf5')
+        self.m.save_parameters2hdf5(filename)
+        with h5py.File(filename, 'a') as f:
+            del f['diagnostics']
+        m = create_model()
+        m.load_parameters_from_hdf5(filename)
+        assert_false(np.any(m.diagnostics_map['is_set']))
+        assert_true(np.allclose(m[0].centre.map['values'],
+                                self.m[0].centre.map['values']))
+
+    def test_npz(self):
+        filename = os.path.join(self.folder, 'parameters')
+        self.m.save_parameters2file(filename)
+        m = create_model()
+        m.load_parameters_from_file(filename + '.npz')
+        self.check_equal(m.diagnostics_map)
@@ -0,0 +1,189 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.component import Component
+from hyperspy.components import Gaussian, Offset
+
+
+class ScalarLine(Component):
+    """A line whose function does not accept arrays of parameter 
+    values.
+
+    """
+    def __init__(self):
+        Component.__init__(self, ('a', 'b'))
+
+    def function(self, x):
+        return float(self.a.value) * x + float(self.b.value)
+
+    def grad_a(self, x):
+        return x
+
+    def grad_b(self, x):
+        return np.ones(len(x))
+
+
+class Quadratic(Component):
+    """A quadratic whose coefficients are a single parameter."""
+    def __init__(self):
+        Component.__init__(self, ('coefficients',))
+        self.coefficients._number_of_elements = 3
+        self.coefficients.value = (0., 0., 0.)
+
+    def function(self, x):
+        a, b, c = self.coefficients.value
+        return a * x ** 2 + b * x + c
+
+
+def create_model(*components):
+    x = np.arange(100.)
+    data = 10 * np.exp(-(x - 50) ** 2 / (2 * 5. ** 2)) + 2
+    m = Model(Spectrum({'data' : data}))
+    for component in components:
+        m.append(component)
+    return m
+
+
+def create_gaussian():
+    g = Gaussian()
+    g.A.value = 100
+    g.centre.value = 48
+    g.sigma.value = 4
+    return g
+
+
+class TestFDJacobian:
+    def setUp(self):
+        self.g = create_gaussian()
+        self.offset = Offset()
+        self.offset.offset.value = 1
+        self.m = create_model(self.g, self.offset)
+
+    def check_jacobian(self, weights=None):
+        m = self.m
+        m._set_p0()
+        y = m.spectrum()[m.channel_switches]
+        p0 = m.p0.copy()
+        expected = m._jacobian(p0, y, weights)
+        fd = m._jacobian_fd(p0, y, weights)
+        assert_equal(fd.shape, expected.shape)
+        np.testing.assert_allclose(fd, expected, rtol=1e-5, 
+                                   atol=1e-6 * np.abs(expected).max())
+        # The parameters are not left perturbed
+        assert_true(np.all(m._free_parameters_vector == p0))
+
+    def test_same_as_analytic(self):
+        self.check_jacobian()
+        # The function of the components broadcasts
+        assert_equal(self.m._scalar_components, set())
+
+    def test_weights(self):
+        self.check_jacobian(weights=np.linspace(0.5, 2, 100))
+
+    def test_signal_range(self):
+        self.m.set_signal_range(10, 90)
+        self.check_jacobian()
+
+    def test_fixed_parameter(self):
+        self.g.centre.free = False
+        self.check_jacobian()
+
+    def test_twinned_parameter(self):
+        g = create_gaussian()
+        g.A.value = 30
+        g.centre.twin = self.g.centre
+        g.sigma.twin = self.g.sigma
+        self.m.append(g)
+        self.check_jacobian()
+
+    def test_scalar_fallback(self):
+        line = ScalarLine()
+        line.a.value = 0.1
+        line.b.value = 2
+        self.m.append(line)
+        self.check_jacobian()
+        assert_true(line in self.m._scalar_components)
+        assert_false(self.g in self.m._scalar_components)
+        # The fallback is remembered until the cache is cleared
+        self.check_jacobian()
+        assert_true(line in self.m._scalar_components)
+        self.m.clear_component_cache()
+        assert_equal(self.m._scalar_components, set())
+
+    def test_several_elements(self):
+        quadratic = Quadratic()
+        quadratic.coefficients.value = (0.001, 0.1, 1.)
+        m = create_model(quadratic)
+        m._set_p0()
+        y = m.spectrum()[m.channel_switches]
+        fd = m._jacobian_fd(m.p0.copy(), y)
+        x = m.axis.axis
+        expected = np.array([x ** 2, x, np.ones(len(x))])
+        np.testing.assert_allclose(fd, expected, rtol=1e-5, atol=1e-5)
+        assert_equal(m._scalar_components, set())
+
+    def test_fit(self):
+        reference = create_model(create_gaussian(), Offset())
+        reference.fit(fitter='leastsq', grad=True)
+        self.m.fit(fitter='leastsq')
+        assert_true(self.m.get_fit_profile()['njev'] > 0)
+        for component, expected in zip(self.m, reference):
+            for parameter, expected_parameter in zip(
+                    component.parameters, expected.parameters):
+                assert_true(abs(parameter.value - 
+                                expected_parameter.value) < 1e-5)
+
+
+class TestMpfitJacobianWeights:
+    def setUp(self):
+        self.g = create_gaussian()
+        self.m = create_model(self.g)
+        self.weights = np.linspace(0.5, 2, 100)
+
+    def test_fjac_is_weighted(self):
+        m = self.m
+        m._set_p0()
+        y = m.spectrum()[m.channel_switches]
+        p0 = m.p0.copy()
+        status, fjac = m._errfunc4mpfit(p0, fjac=1, y=y, 
+                                        weights=self.weights,
+                                        jacobian=m._jacobian)
+        assert_equal(status, 0)
+        np.testing.assert_allclose(
+            fjac, (m._jacobian(p0, y) * self.weights).T)
+
+    def test_fit_with_weights(self):
+        variance = 1. / self.weights ** 2 * np.ones((100,))
+        self.m.spectrum.variance = variance
+        reference = create_model(create_gaussian())
+        reference.spectrum.variance = variance
+        reference.fit(fitter='leastsq', grad=True, weights=True)
+        self.m.fit(fitter='mpfit', grad=True, weights=True)
+        for parameter, expected in zip(self.g.parameters,
+                                       reference[0].parameters):
+            assert_true(abs(parameter.value / expected.value - 1) < 1e-4)
+        # The weights are not symmetric, so they move the centre
+        assert_true(abs(self.g.centre.value - 50) > 1e-3)
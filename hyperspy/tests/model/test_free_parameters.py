@@ -0,0 +1,151 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.components import Gaussian, Offset
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+
+
+class TestFreeParametersVector:
+    def setUp(self):
+        m = Model(Spectrum({'data' : np.zeros(10)}))
+        self.g = Gaussian()
+        self.g.A.value, self.g.sigma.value, self.g.centre.value = 1, 2, 3
+        self.g.centre.free = False
+        self.offset = Offset()
+        self.offset.offset.value = 4
+        self.inactive = Gaussian()
+        self.inactive.active = False
+        for component in (self.g, self.offset, self.inactive):
+            m.append(component)
+        self.m = m
+
+    def vector(self, A, sigma, offset):
+        # The free parameters of a component are stored in a set, so
+        # their order in the vector is not fixed
+        values = {self.g.A : A, self.g.sigma : sigma, 
+                  self.offset.offset : offset}
+        return np.array([values[parameter] 
+                         for parameter in self.m._free_parameters], 
+                        dtype='float')
+
+    def test_set_p0(self):
+        self.m._set_p0()
+        free = self.m._free_parameters
+        assert_equal(set(free[:2]), set((self.g.A, self.g.sigma)))
+        assert_equal(free[2], self.offset.offset)
+        assert_true(np.all(self.m._free_parameters_vector == 
+                           self.vector(1, 2, 4)))
+        assert_true(np.all(self.m.p0 == self.vector(1, 2, 4)))
+        # p0 is a copy
+        self.m.p0[:] = 10
+        assert_equal(self.g.A.value, 1)
+        assert_true(self.g.centre._vector is None)
+        assert_true(self.inactive.A._vector is None)
+
+    def test_charge_free_parameters(self):
+        self.m._set_p0()
+        self.m._charge_free_parameters(self.vector(5, 6, 7))
+        assert_equal((self.g.A.value, self.g.sigma.value,
+                      self.offset.offset.value), (5, 6, 7))
+        assert_equal(self.g.centre.value, 3)
+
+    def test_connected_functions_are_called_once(self):
+        counter = Counter()
+        self.g.A.connect(counter)
+        self.g.sigma.connect(counter)
+        self.m._set_p0()
+        self.m._charge_free_parameters(self.vector(5, 6, 4))
+        assert_equal(counter.calls, 1)
+        # Only the parameters that change are notified
+        self.m._charge_free_parameters(self.vector(5, 6, 8))
+        assert_equal(counter.calls, 1)
+
+    def test_ext_bounded_uses_the_setter(self):
+        self.g.A.bmax = 2
+        self.g.A.ext_bounded = True
+        self.m._set_p0()
+        assert_false(self.m._fast_charge)
+        self.m._charge_free_parameters(self.vector(5, 6, 7))
+        assert_equal(self.g.A.value, 2)
+        assert_equal(self.g.sigma.value, 6)
+
+    def test_unbind(self):
+        self.m._set_p0()
+        self.m._charge_free_parameters(self.vector(5, 6, 7))
+        vector = self.m._free_parameters_vector
+        self.m._unbind_free_parameters()
+        assert_true(self.m._free_parameters_vector is None)
+        vector[:] = 0
+        assert_equal((self.g.A.value, self.g.sigma.value,
+                      self.offset.offset.value), (5, 6, 7))
+
+    def test_set_p0_again(self):
+        self.m._set_p0()
+        old_vector = self.m._free_parameters_vector
+        self.g.centre.free = True
+        self.m._set_p0()
+        old_vector[:] = 0
+        assert_equal(len(self.m.p0), 4)
+        assert_equal(self.g.A.value, 1)
+        assert_equal(self.g.centre.value, 3)
+
+
+class TestModelNotificationBatch:
+    def setUp(self):
+        m = Model(Spectrum({'data' : np.zeros(10)}))
+        self.counter = Counter()
+        for i in xrange(3):
+            g = Gaussian()
+            for parameter in g.parameters:
+                parameter.connect(self.counter)
+            m.append(g)
+        self.m = m
+
+    def test_charge_p0(self):
+        self.m._set_p0()
+        self.m.p0 = self.m.p0 + 1
+        self.m._charge_p0()
+        assert_equal(self.counter.calls, 1)
+
+    def test_charge_components(self):
+        with self.m.batch_notifications():
+            for component in self.m:
+                component.charge((2., 3., 4.))
+            assert_equal(self.counter.calls, 0)
+        assert_equal(self.counter.calls, 1)
+
+    def test_charge_with_the_setters(self):
+        self.m[0].A.ext_bounded = True
+        self.m._set_p0()
+        assert_false(self.m._fast_charge)
+        self.m._charge_free_parameters(self.m.p0 + 1)
+        assert_equal(self.counter.calls, 1)
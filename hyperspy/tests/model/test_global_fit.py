@@ -0,0 +1,102 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        assert_almost_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.components import Gaussian
+
+
+class TestGlobalFit:
+    def setUp(self):
+        x = np.arange(100.)
+        self.centres = np.linspace(40, 60, 12).reshape((3, 4))
+        self.heights = np.linspace(5, 10, 12).reshape((3, 4))
+        data = self.heights[..., np.newaxis] * np.exp(
+            -(x - self.centres[..., np.newaxis]) ** 2 / (2 * 5. ** 2))
+        np.random.seed(1)
+        data += np.random.normal(scale=0.1, size=data.shape)
+        m = Model(Spectrum({'data' : data}))
+        g = Gaussian()
+        g.A.value = 50
+        g.centre.value = 50
+        g.sigma.value = 3
+        m.append(g)
+        m.axes_manager.indices = (1, 2)
+        self.m = m
+        self.g = g
+
+    def test_shared_sigma(self):
+        self.m.global_fit([self.g.sigma])
+        sigma = self.g.sigma.map['values']
+        assert_true(np.all(sigma == sigma[0, 0]))
+        assert_almost_equal(sigma[0, 0], 5., places=1)
+        assert_true(np.all(self.g.sigma.map['is_set']))
+        assert_true(np.allclose(self.g.centre.map['values'], self.centres,
+                                atol=0.1))
+        assert_true(np.allclose(self.g.A.map['values'], 
+                                self.heights * 5 * np.sqrt(2 * np.pi),
+                                rtol=0.02))
+        assert_equal(self.m.axes_manager.indices, (1, 2))
+        assert_true(self.m._free_parameters_vector is None)
+        assert_equal(sorted(self.m.fit_output.keys()),
+                     ['chisq', 'iterations', 'message', 'nfev'])
+
+    def test_shared_sigma_is_better_than_multifit(self):
+        self.m.global_fit([self.g.sigma])
+        global_error = np.abs(self.g.sigma.map['values'] - 5).max()
+        self.m.multifit()
+        assert_true(global_error < 
+                    np.abs(self.g.sigma.map['values'] - 5).max())
+
+    def test_grad(self):
+        self.m.global_fit([self.g.sigma], grad=True)
+        values = self.g.sigma.map['values'].copy()
+        nfev = self.m.fit_output['nfev']
+        self.g.sigma.map['is_set'] = False
+        self.g.sigma.value = 3
+        self.m.global_fit([self.g.sigma])
+        assert_true(np.allclose(values, self.g.sigma.map['values']))
+        # The jacobian is not estimated by finite differences
+        assert_true(nfev < self.m.fit_output['nfev'])
+
+    def test_mask(self):
+        mask = np.zeros((3, 4), dtype='bool')
+        mask[0] = True
+        mask[2, 3] = True
+        self.m.global_fit([self.g.sigma], mask=mask)
+        is_set = self.g.centre.map['is_set']
+        assert_false(np.any(is_set[mask]))
+        assert_true(np.all(is_set[~mask]))
+        assert_true(np.all(self.g.sigma.map['values'][mask] == 0))
+        assert_almost_equal(self.g.sigma.map['values'][1, 0], 5., places=1)
+
+    @raises(ValueError)
+    def test_fixed_shared_parameter(self):
+        self.g.sigma.free = False
+        self.m.global_fit([self.g.sigma])
+
+    @raises(ValueError)
+    def test_wrong_mask_shape(self):
+        self.m.global_fit([self.g.sigma], mask=np.zeros((4, 3), 'bool'))
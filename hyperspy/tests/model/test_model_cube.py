@@ -0,0 +1,114 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model, ModelCube
+from hyperspy.components import Gaussian
+
+
+class TestModelCube:
+    def setUp(self):
+        x = np.arange(100.)
+        centres = np.linspace(40, 60, 12).reshape((4, 3))
+        self.data = 10 * np.exp(-(x - centres[..., np.newaxis]) ** 2 / 
+                                (2 * 5. ** 2))
+        m = Model(Spectrum({'data' : self.data}))
+        g = Gaussian()
+        g.A.value = 50
+        g.centre.value = 50
+        g.sigma.value = 4
+        m.append(g)
+        m.set_signal_range(10, 90)
+        m.multifit()
+        m.axes_manager.indices = (1, 2)
+        self.m = m
+        # The model is evaluated in the fitting range only
+        self.expected = self.data.copy()
+        self.expected[..., :10] = np.nan
+        self.expected[..., 90:] = np.nan
+
+    def check_equal(self, result, expected):
+        assert_equal(result.shape, expected.shape)
+        nans = np.isnan(expected)
+        assert_true(np.all(np.isnan(result) == nans))
+        assert_true(np.allclose(result[~nans], expected[~nans],
+                                atol=1e-4))
+
+    def test_lazy(self):
+        assert_true(isinstance(self.m.model_cube, ModelCube))
+        assert_equal(self.m.model_cube.shape, (4, 3, 100))
+        assert_equal(len(self.m.model_cube), 4)
+
+    def test_indexing(self):
+        cube = self.m.model_cube
+        for key in ((2, 1), (2, 1, 50), (Ellipsis, 50), (slice(1, 3),),
+                    (slice(None, None, 2), -1, slice(20, 30)),
+                    (Ellipsis, slice(5, 15)), (0, Ellipsis), (3,)):
+            self.check_equal(cube[key], self.expected[key])
+
+    @raises(IndexError)
+    def test_too_many_indices(self):
+        self.m.model_cube[0, 0, 0, 0]
+
+    def test_position_is_restored(self):
+        value = self.m[0].centre.value
+        self.m.model_cube[:, 0]
+        assert_equal(self.m.axes_manager.indices, (1, 2))
+        assert_equal(self.m[0].centre.value, value)
+
+    def test_array(self):
+        self.check_equal(np.asarray(self.m.model_cube), self.expected)
+        data = np.array(self.m.model_cube, dtype='float32')
+        assert_equal(data.dtype, np.dtype('float32'))
+
+    def test_generate_data_from_model(self):
+        self.m.generate_data_from_model()
+        assert_false(isinstance(self.m.model_cube, ModelCube))
+        self.check_equal(self.m.model_cube, self.expected)
+
+    def test_generate_data_from_model_mmap(self):
+        self.m.generate_data_from_model(mmap=True, dtype='float32',
+                                        out_of_range_to_nan=False)
+        cube = self.m.model_cube
+        assert_true(isinstance(cube, np.memmap))
+        assert_equal(cube.dtype, np.dtype('float32'))
+        expected = self.expected.copy()
+        expected[np.isnan(expected)] = 0
+        self.check_equal(cube, expected.astype('float32'))
+
+    def test_generate_data_from_model_integer(self):
+        self.m.generate_data_from_model(dtype='int16',
+                                        out_of_range_to_nan=False)
+        assert_equal(self.m.model_cube.dtype, np.dtype('int16'))
+        assert_equal(self.m.model_cube[1, 1, 0], 0)
+
+    @raises(ValueError)
+    def test_integer_dtype_with_nan(self):
+        self.m.generate_data_from_model(dtype='int16')
+
+    def test_setting_model_cube(self):
+        self.m.model_cube = np.zeros((4, 3, 100))
+        assert_true(np.all(self.m.model_cube == 0))
+        self.m.model_cube = None
+        assert_true(isinstance(self.m.model_cube, ModelCube))
@@ -25,7 +25,7 @@ from nose.tools import (assert_true,
                         assert_equal,
                         assert_not_equal,
                         raises)
-from hyperspy.component import Parameter
+from hyperspy.component import Parameter, batch_notifications
 
 class Dummy:
     def __init__(self):
@@ -273,3 +273,128 @@ class TestParameterTwin:
         assert_equal(dummy.value, 3)
         self.p2.value = 10
         assert_equal(dummy.value, 4)
+
+
+class TestNotificationBatch:
+    def setUp(self):
+        self.p1 = Parameter()
+        self.p2 = Parameter()
+        self.dummy = Dummy()
+        self.p1.connect(self.dummy.add_one)
+        self.p2.connect(self.dummy.add_one)
+
+    def test_call_once(self):
+        with batch_notifications([self.p1, self.p2]):
+            self.p1.value = 2
+            self.p2.value = 3
+            self.p1.value = 4
+            assert_equal(self.dummy.value, 1)
+        assert_equal(self.dummy.value, 2)
+        # The batch has ended
+        self.p1.value = 5
+        assert_equal(self.dummy.value, 3)
+
+    def test_no_change(self):
+        with batch_notifications([self.p1, self.p2]):
+            self.p1.value = 0
+        assert_equal(self.dummy.value, 1)
+
+    def test_nested(self):
+        with batch_notifications([self.p1, self.p2]):
+            with batch_notifications([self.p1]):
+                self.p1.value = 2
+            # The enclosing batch calls the function
+            assert_equal(self.dummy.value, 1)
+            self.p2.value = 2
+        assert_equal(self.dummy.value, 2)
+
+    def test_nested_outside_the_enclosing_batch(self):
+        with batch_notifications([self.p1]):
+            with batch_notifications([self.p2]):
+                self.p2.value = 2
+            assert_equal(self.dummy.value, 2)
+        assert_equal(self.dummy.value, 2)
+
+
+class TestParameterVector:
+    def setUp(self):
+        self.par = Parameter()
+        self.par.value = 2.
+        self.vector = np.zeros(4)
+
+    def test_bind(self):
+        self.par._bind_to_vector(self.vector, 1)
+        assert_equal(self.vector[1], 2.)
+        # Writing the vector changes the value without the setter
+        self.vector[1] = 3.
+        assert_equal(self.par.value, 3.)
+
+    def test_set_value_while_bound(self):
+        dummy = Dummy()
+        self.par.connect(dummy.add_one)
+        self.par._bind_to_vector(self.vector, 1)
+        self.par.value = 5.
+        assert_equal(self.vector[1], 5.)
+        assert_equal(self.par.value, 5.)
+        assert_equal(dummy.value, 2)
+        # The old value is read from the vector
+        self.vector[1] = 6.
+        self.par.value = 6.
+        assert_equal(dummy.value, 2)
+
+    def test_ext_bounded_while_bound(self):
+        self.par.bmax = 4.
+        self.par.ext_bounded = True
+        self.par._bind_to_vector(self.vector, 0)
+        self.par.value = 10.
+        assert_equal(self.vector[0], 4.)
+
+    def test_unbind(self):
+        self.par._bind_to_vector(self.vector, 1)
+        self.vector[1] = 3.
+        self.par._unbind_from_vector()
+        self.vector[1] = 4.
+        assert_equal(self.par.value, 3.)
+        self.par.value = 1.
+        assert_equal(self.vector[1], 4.)
+        # Unbinding twice does nothing
+        self.par._unbind_from_vector()
+        assert_equal(self.par.value, 1.)
+
+    def test_twin_reads_the_vector(self):
+        twin = Parameter()
+        twin.twin_function = lambda x: 2 * x
+        twin.twin = self.par
+        self.par._bind_to_vector(self.vector, 2)
+        self.vector[2] = 3.
+        assert_equal(twin.value, 6.)
+
+
+class TestParameterVectorLen2:
+    def setUp(self):
+        self.par = Parameter()
+        self.par._number_of_elements = 2
+        self.par.value = (1., 2.)
+        self.vector = np.zeros(5)
+        self.par._bind_to_vector(self.vector, 2)
+
+    def test_value_round_trip(self):
+        assert_true(np.all(self.vector[2:4] == (1., 2.)))
+        self.vector[2:4] = (3., 4.)
+        assert_equal(self.par.value, (3., 4.))
+        self.par.value = (5., 6.)
+        assert_true(np.all(self.vector == (0, 0, 5., 6., 0)))
+        assert_true(isinstance(self.par.value, tuple))
+
+    def test_change_number_of_elements_unbinds(self):
+        self.par._number_of_elements = 3
+        assert_true(self.par._vector is None)
+        assert_equal(self.par.value, (0, 0, 0))
+        self.par.value = (7., 8., 9.)
+        # The old vector is not modified
+        assert_true(np.all(self.vector == (0, 0, 1., 2., 0)))
+
+    def test_same_number_of_elements_keeps_binding(self):
+        self.par._number_of_elements = 2
+        self.vector[2] = 10.
+        assert_equal(self.par.value, (10., 2.))
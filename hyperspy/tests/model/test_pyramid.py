@@ -0,0 +1,100 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from nose.tools import (assert_true,
+                        assert_false,
+                        assert_equal,
+                        raises)
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.model import Model
+from hyperspy.components import Gaussian
+
+
+class TestPyramidOddShape:
+    def setUp(self):
+        # An odd, non-square map
+        x = np.arange(100.)
+        iy, ix = np.indices((17, 5))
+        self.centres = 40 + iy + 2. * ix
+        self.data = 10 * np.exp(-(x - self.centres[..., np.newaxis]) ** 2 /
+                                (2 * 5. ** 2))
+        self.spectrum = Spectrum({'data' : self.data.copy()})
+        m = Model(self.spectrum)
+        g = Gaussian()
+        g.A.value = 100
+        g.centre.value = 40
+        g.sigma.value = 4
+        m.append(g)
+        self.m = m
+        self.axes_manager = m.axes_manager
+        self.navigation_shape = list(m.axes_manager.navigation_shape)
+        self.maps = [parameter.map for parameter in g.parameters]
+        self.diagnostics_map = m.diagnostics_map
+
+    def check_restored(self):
+        m = self.m
+        assert_true(m.spectrum is self.spectrum)
+        assert_true(np.all(m.spectrum.data == self.data))
+        assert_true(m.axes_manager is self.axes_manager)
+        assert_true(m.spectrum.axes_manager is self.axes_manager)
+        assert_equal(list(m.axes_manager.navigation_shape),
+                     self.navigation_shape)
+        assert_true(m.diagnostics_map is self.diagnostics_map)
+        for parameter, map_ in zip(m[0].parameters, self.maps):
+            assert_true(parameter.map is map_)
+            assert_equal(parameter.map.shape, (17, 5))
+        assert_true(m._initial_values is None)
+
+    def test_default_levels(self):
+        self.m.multifit(strategy='pyramid')
+        self.check_restored()
+        assert_true(np.all(self.m[0].centre.map['is_set']))
+        assert_true(np.allclose(self.m[0].centre.map['values'],
+                                self.centres))
+        assert_equal(self.m.diagnostics_map.shape, (17, 5))
+
+    def test_three_levels(self):
+        # The second axis is binned to a single position
+        self.m.multifit(strategy='pyramid', levels=3, iterpath='serpentine')
+        self.check_restored()
+        assert_true(np.allclose(self.m[0].centre.map['values'],
+                                self.centres))
+
+    def test_mask(self):
+        mask = np.zeros((17, 5), dtype='bool')
+        mask[3, 4] = True
+        self.m.multifit(strategy='pyramid', mask=mask)
+        self.check_restored()
+        is_set = self.m[0].centre.map['is_set']
+        assert_false(is_set[3, 4])
+        assert_equal(is_set.sum(), 17 * 5 - 1)
+
+    @raises(ValueError)
+    def test_restored_after_error(self):
+        fit = self.m.fit
+        def failing_fit(**kwargs):
+            if self.m.spectrum is not self.spectrum:
+                raise ValueError
+            fit(**kwargs)
+        self.m.fit = failing_fit
+        try:
+            self.m.multifit(strategy='pyramid')
+        finally:
+            self.check_restored()
@@ -0,0 +1,100 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import (
+    assert_true,
+    assert_equal,
+    raises)
+
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.signals.image import Image
+
+def multiply(spectrum, factor=1):
+    return spectrum * factor
+
+class TestMapSpectrum:
+    def setUp(self):
+        self.spectrum = Spectrum({'data' : np.random.random((4, 5, 20))})
+        self.data = self.spectrum.data.copy()
+        
+    def test_same_shape(self):
+        s = self.spectrum.map(multiply, factor=2)
+        assert_true(isinstance(s, Spectrum))
+        assert_true(np.allclose(s.data, self.data * 2))
+        # The original data must not change
+        assert_true(np.allclose(self.spectrum.data, self.data))
+        
+    def test_scalar_output(self):
+        s = self.spectrum.map(np.max)
+        assert_equal(s.data.shape, (4, 5))
+        assert_true(np.allclose(s.data, self.data.max(-1)))
+        
+    def test_different_shape(self):
+        s = self.spectrum.map(lambda x: x[::2])
+        assert_equal(s.data.shape, (4, 5, 10))
+        assert_equal(s.axes_manager.signal_axes[0].size, 10)
+        
+    def test_vectorized(self):
+        s = self.spectrum.map(np.max, vectorized=True, axis=-1,
+                              chunk_size=3)
+        assert_true(np.allclose(s.data, self.data.max(-1)))
+        
+    def test_inplace(self):
+        self.spectrum.map(multiply, factor=2, inplace=True)
+        assert_true(np.allclose(self.spectrum.data, self.data * 2))
+        
+    @raises(ValueError)
+    def test_inplace_wrong_shape(self):
+        self.spectrum.map(np.max, inplace=True)
+        
+    def test_iterated_signal_argument(self):
+        factor = Spectrum({'data' : np.arange(20.).reshape((4, 5, 1))})
+        s = self.spectrum.map(multiply, factor=factor)
+        assert_true(np.allclose(s.data,
+            self.data * np.arange(20.).reshape((4, 5, 1))))
+        
+    def test_threads(self):
+        s = self.spectrum.map(multiply, factor=2, parallel='threads',
+                              chunk_size=2)
+        assert_true(np.allclose(s.data, self.data * 2))
+        
+    def test_processes(self):
+        s = self.spectrum.map(multiply, factor=2, parallel='processes',
+                              max_workers=2)
+        assert_true(np.allclose(s.data, self.data * 2))
+        
+    def test_mmap(self):
+        s = self.spectrum.map(multiply, factor=2, mmap=True)
+        assert_true(isinstance(s.data, np.memmap))
+        assert_true(np.allclose(s.data, self.data * 2))
+        
+class TestMapImage:
+    def setUp(self):
+        self.image = Image({'data' : np.random.random((3, 6, 7))})
+        self.data = self.image.data.copy()
+        
+    def test_same_shape(self):
+        s = self.image.map(multiply, factor=2)
+        assert_true(isinstance(s, Image))
+        assert_true(np.allclose(s.data, self.data * 2))
+        
+    def test_scalar_output(self):
+        s = self.image.map(np.sum)
+        assert_true(np.allclose(s.data, self.data.sum(-1).sum(-1)))
+        
@@ -0,0 +1,70 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import (
+    assert_true,
+    assert_equal,
+    raises)
+
+from hyperspy.signals.spectrum import Spectrum
+
+class TestRebin:
+    def setUp(self):
+        s = Spectrum({'data' : np.random.random((6, 4, 100))})
+        eaxis = s.axes_manager.signal_axes[0]
+        eaxis.scale = 0.5
+        eaxis.offset = 10
+        self.spectrum = s
+        self.data = s.data.copy()
+        
+    def test_integer_factors(self):
+        s = self.spectrum
+        s.rebin((3, 2, 50))
+        assert_equal(s.data.shape, (3, 2, 50))
+        assert_true(np.allclose(s.data,
+            self.data.reshape((3, 2, 2, 2, 50, 2)).sum(5).sum(3).sum(1)))
+            
+    def test_non_integer_factor(self):
+        s = self.spectrum
+        s.rebin(scale=(1, 1, 2.5))
+        assert_equal(s.data.shape, (6, 4, 40))
+        assert_true(np.allclose(s.data.sum(-1), self.data.sum(-1)))
+        assert_true(np.allclose(s.data[..., 0],
+            self.data[..., :2].sum(-1) + self.data[..., 2] / 2.))
+            
+    def test_calibration(self):
+        s = self.spectrum
+        s.rebin(scale=(1, 1, 2.5))
+        eaxis = s.axes_manager.signal_axes[0]
+        assert_equal(eaxis.scale, 1.25)
+        assert_equal(eaxis.offset, 10.375)
+        assert_equal(eaxis.size, 40)
+        
+    def test_mmap(self):
+        s = self.spectrum
+        s.rebin(scale=(2, 1, 3), mmap=True)
+        assert_true(isinstance(s.data, np.memmap))
+        assert_equal(s.data.shape, (3, 4, 33))
+        assert_true(np.allclose(s.data.sum(),
+                                self.data[..., :99].sum()))
+    
+    @raises(ValueError)
+    def test_no_shape_no_scale(self):
+        self.spectrum.rebin()
+        
@@ -0,0 +1,90 @@
+# Copyright 2007-2012 The Hyperspy developers
+#
+# This file is part of Hyperspy.
+#
+# Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Hyperspy. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import cPickle
+
+import numpy as np
+from nose.tools import assert_true, assert_false
+
+from hyperspy.io import load
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.misc.shared_memory import is_shared
+
+
+class TestShared:
+    def setUp(self):
+        self.spectrum = Spectrum({'data' : np.arange(60.).reshape(3, 4, 5)})
+        self.data = self.spectrum.data.copy()
+        self.spectrum.to_shared()
+
+    def test_to_shared(self):
+        assert_true(self.spectrum.is_shared)
+        assert_true(np.all(self.spectrum.data == self.data))
+
+    def test_pickled_view_shares_memory(self):
+        view = self.spectrum.data[1, ::-1, 2:]
+        attached = cPickle.loads(cPickle.dumps(view, 2))
+        assert_true(is_shared(attached))
+        attached[0, 0] = -1
+        assert_true(self.spectrum.data[1, 3, 2] == -1)
+
+    def test_from_shared(self):
+        filename = self.spectrum.data.filename
+        self.spectrum.from_shared()
+        assert_false(self.spectrum.is_shared)
+        assert_true(np.all(self.spectrum.data == self.data))
+        assert_false(os.path.exists(filename))
+
+    def test_learning_results(self):
+        self.spectrum.learning_results.factors = np.ones((5, 2))
+        self.spectrum.to_shared()
+        assert_true(is_shared(self.spectrum.learning_results.factors))
+
+
+class TestSharedLazyLearningResults:
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        filename = os.path.join(self.folder, 'test.hdf5')
+        s = Spectrum({'data' : np.arange(60.).reshape(3, 4, 5)})
+        s.learning_results.factors = np.ones((5, 2))
+        s.learning_results.loadings = np.ones((12, 2))
+        s.save(filename)
+        self.spectrum = load(filename)
+
+    def tearDown(self):
+        del self.spectrum
+        shutil.rmtree(self.folder)
+
+    def test_lazy_arrays_are_not_read(self):
+        learning_results = self.spectrum.learning_results
+        self.spectrum.to_shared()
+        assert_true(self.spectrum.is_shared)
+        assert_true(learning_results.is_lazy('factors'))
+        assert_true(learning_results.is_lazy('loadings'))
+        self.spectrum.from_shared()
+        assert_true(learning_results.is_lazy('factors'))
+
+    def test_load_lazy_arrays_to_share_them(self):
+        learning_results = self.spectrum.learning_results
+        learning_results.load_lazy_arrays()
+        self.spectrum.to_shared()
+        assert_true(is_shared(learning_results.factors))
+        assert_true(is_shared(learning_results.loadings))